@@ -1,28 +1,51 @@
 from fastapi import APIRouter, Query, Depends, Request
 from fastapi.responses import JSONResponse
 from shapely.geometry import Point
+from sqlalchemy.orm import Session
 from typing import Optional
 from ....core.overpass_client import (
-    build_query, fetch_overpass, BUSINESS_TAGS, POI_TAGS_COMMON, TRANSIT_TAGS,
+    fetch_overpass, fetch_overpass_columns, BUSINESS_TAGS, POI_TAGS_COMMON, TRANSIT_TAGS,
     WALKABILITY_TAGS, CYCLABILITY_TAGS, GREEN_TAGS, PARKING_TAGS, LIGHTING_TAGS
 )
 from ....core.auth import get_current_user, User
 from ....core.rate_limit import enforce_quota, inc_overpass_count
-from ....core.features import (
-    to_geodf, walkability_score, green_score, bike_infrastructure,
-    parking_availability, safety_infrastructure, building_density,
-    street_connectivity, amenity_diversity, lighting_score
-)
+from ....core.db import SessionLocal
+from ....core.tile_cache import fetch_tiled, fetch_tiled_many
+from ....core.osm_columns import OSMColumns
+from ....core.tag_index import tag_columns
+from ....core.features import FeatureContext, compute_features
+from ....core.point_set import PointSet
+from ....core.street_network import fetch_street_network
 import asyncio
+import math
+import numpy as np
 
 router = APIRouter()
 
+# Conectividade e street_network são calculadas a 500 m; o esqueleto cobre esse
+# raio com folga, senão cruzamentos da borda somem e ways cortadas viram becos
+STREET_STATS_RADIUS_M = 500
+STREET_MARGIN_M = 150
+
+def street_bbox(lon: float, lat: float, radius_m: float):
+    """bbox (S, W, N, E) que contém o círculo de max(radius_m, 500 m) + margem em volta do ponto."""
+    r = max(radius_m, STREET_STATS_RADIUS_M) + STREET_MARGIN_M
+    dlat = r / 111000
+    dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+    return (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+
+def get_db():
+    db = SessionLocal()
+    try: yield db
+    finally: db.close()
+
 @router.post("/advanced")
 async def advanced_analysis(
     request: Request,
     lon: float = Query(...),
     lat: float = Query(...),
     radius: int = Query(default=1000),
+    db: Session = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
     """
@@ -39,21 +62,33 @@ async def advanced_analysis(
     
     # Buscar dados básicos que já funcionam
     queries = {
-        "pois": build_query(bbox, POI_TAGS_COMMON),
-        "transit": build_query(bbox, TRANSIT_TAGS),
+        "pois": POI_TAGS_COMMON,
+        "transit": TRANSIT_TAGS,
     }
     
-    async def fetch_data(name, query):
+    async def run(q):
         inc_overpass_count(user.sub)
-        try:
-            return name, await fetch_overpass(query)
-        except Exception as e:
-            import logging
-            logging.warning(f"Erro ao buscar {name}: {e}")
-            return name, {"elements": []}
+        return await fetch_overpass_columns(q)
     
-    results = await asyncio.gather(*[fetch_data(n, q) for n, q in queries.items()])
-    data = {name: to_geodf(result) for name, result in results}
+    async def run_json(q):
+        inc_overpass_count(user.sub)
+        return await fetch_overpass(q)
+
+    try:
+        results = await fetch_tiled_many(bbox, queries, db=db, fetch=run)
+    except Exception as e:
+        import logging
+        logging.warning(f"Erro ao buscar {', '.join(queries)}: {e}")
+        results = {name: OSMColumns.empty() for name in queries}
+
+    # Malha viária (esqueleto de ways) para conectividade; sem ela, usa a aproximação por tags
+    try:
+        streets = await fetch_street_network(street_bbox(lon, lat, radius), db=db, fetch=run_json)
+    except Exception as e:
+        import logging
+        logging.warning(f"Erro ao buscar malha viária: {e}")
+        streets = None
+    data = {name: PointSet.from_columns(result) for name, result in results.items()}
     
     # Criar GDFs vazios para as outras camadas (para não quebrar o código)
     data["walkability"] = data["pois"]  # Usar POIs como proxy
@@ -62,74 +97,79 @@ async def advanced_analysis(
     data["parking"] = data["pois"]
     data["lighting"] = data["pois"]
     
-    # Combinar todos os GeoDataFrames para análises gerais
-    import pandas as pd
-    import geopandas as gpd
-    all_data = gpd.GeoDataFrame(pd.concat([gdf for gdf in data.values() if not gdf.empty], ignore_index=True))
+    # Combinar todos os conjuntos para análises gerais
+    all_data = PointSet.concat(list(data.values()))
     
-    # Calcular todos os scores
+    # Calcular todos os scores sobre um único contexto (índice e máscaras compartilhados)
+    ctx = FeatureContext(all_data, point, streets=streets)
+    values = compute_features(
+        ctx,
+        ["walkability", "cyclability", "green_spaces", "parking", "safety",
+         "lighting", "building_density", "street_connectivity", "amenity_diversity"],
+        radii={name: radius for name in ("walkability", "cyclability", "green_spaces", "safety", "amenity_diversity")},
+    )
     analysis = {
         "location": {"lon": lon, "lat": lat},
         "radius": radius,
         "scores": {
             "walkability": {
-                "value": round(walkability_score(all_data, point, radius), 2),
+                "value": round(values["walkability"], 2),
                 "max": 1.0,
                 "description": "Índice de caminhabilidade (calçadas, POIs, áreas verdes)",
                 "emoji": "🚶",
                 "category": "Mobilidade"
             },
             "cyclability": {
-                "value": bike_infrastructure(all_data, point, radius),
+                "value": values["cyclability"],
                 "max": 50,
                 "description": "Infraestrutura para bicicletas (ciclovias, estacionamentos)",
                 "emoji": "🚴",
                 "category": "Mobilidade"
             },
             "green_spaces": {
-                "value": green_score(all_data, point, radius),
+                "value": values["green_spaces"],
                 "max": 20,
                 "description": "Áreas verdes (parques, jardins, florestas)",
                 "emoji": "🌳",
                 "category": "Qualidade de Vida"
             },
             "parking": {
-                "value": parking_availability(all_data, point, 500),
+                "value": values["parking"],
                 "max": 30,
                 "description": "Disponibilidade de estacionamento",
                 "emoji": "🅿️",
                 "category": "Acesso"
             },
             "safety": {
-                "value": round(safety_infrastructure(all_data, point, radius), 2),
+                "value": round(values["safety"], 2),
                 "max": 100,
                 "description": "Infraestrutura de segurança (polícia, iluminação)",
                 "emoji": "🔒",
                 "category": "Segurança"
             },
             "lighting": {
-                "value": round(lighting_score(all_data, point, 500), 2),
+                "value": round(values["lighting"], 2),
                 "max": 100,
                 "description": "Iluminação pública (postes e vias iluminadas)",
                 "emoji": "💡",
                 "category": "Segurança"
             },
             "building_density": {
-                "value": round(building_density(all_data, point, 500), 2),
+                "value": round(values["building_density"], 2),
                 "max": 1000,
                 "description": "Densidade de edificações por km²",
                 "emoji": "🏢",
                 "category": "Contexto Urbano"
             },
             "street_connectivity": {
-                "value": round(street_connectivity(all_data, point, 500), 2),
-                "max": 500,
+                "value": round(values["street_connectivity"], 2),
+                "max": 250,
                 "description": "Conectividade da malha viária (cruzamentos)",
                 "emoji": "🛣️",
                 "category": "Contexto Urbano"
             },
             "amenity_diversity": {
-                "value": round(amenity_diversity(all_data, point, radius), 2),
+                "value": round(values["amenity_diversity"], 2),
                 "max": 1.0,
                 "description": "Diversidade de tipos de comércio/serviços",
                 "emoji": "🎯",
@@ -148,6 +188,11 @@ async def advanced_analysis(
         "pois": len(data["pois"]) if not data["pois"].empty else 0,
         "transit_stops": len(data["transit"]) if not data["transit"].empty else 0,
     }
+
+    # Métricas da malha viária no raio (cruzamentos, becos, quadras)
+    if streets is not None:
+        analysis["street_network"] = {k: round(v, 3) if isinstance(v, float) else v
+                                      for k, v in streets.stats(lon, lat, STREET_STATS_RADIUS_M).items()}
     
     # Calcular score geral normalizado
     total_normalized = 0
@@ -207,6 +252,7 @@ async def demographics_analysis(
     lon: float = Query(...),
     lat: float = Query(...),
     radius: int = Query(default=1000),
+    db: Session = Depends(get_db),
     user: User = Depends(get_current_user)
 ):
     """
@@ -220,44 +266,37 @@ async def demographics_analysis(
     bbox = (lat - delta, lon - delta, lat + delta, lon + delta)
     
     # Buscar POIs genéricos e categorizar manualmente
-    inc_overpass_count(user.sub)
+    async def run(q):
+        inc_overpass_count(user.sub)
+        return await fetch_overpass_columns(q)
+    
     try:
-        poi_query = build_query(bbox, POI_TAGS_COMMON)
-        poi_result = await fetch_overpass(poi_query)
-        pois = poi_result.get("elements", [])
+        poi_result = await fetch_tiled(bbox, POI_TAGS_COMMON, db=db, fetch=run)
     except Exception as e:
         import logging
         logging.warning(f"Erro ao buscar POIs para demographics: {e}")
-        pois = []
+        poi_result = OSMColumns.empty()
     
-    # Categorizar POIs baseado nas tags
-    counts = {
-        "offices": 0,
-        "schools": 0,
-        "culture": 0,
-        "retail": 0,
-        "health": 0,
-        "financial": 0,
-    }
+    # Categorizar POIs baseado nas tags (primeira regra que casar, vetorizado)
+    tag_cols = tag_columns(poi_result, ("amenity", "shop", "office"))
+    def values_of(key):
+        col = tag_cols.get(key)
+        if col is None:
+            return np.full(len(poi_result), "", dtype=object)
+        return np.where(col.codes >= 0, np.asarray(col, dtype=object), "")
+    amenity, shop, office = values_of("amenity"), values_of("shop"), values_of("office")
     
-    for poi in pois:
-        tags = poi.get("tags", {})
-        amenity = tags.get("amenity", "")
-        shop = tags.get("shop", "")
-        office = tags.get("office", "")
-        
-        if office or amenity == "coworking_space":
-            counts["offices"] += 1
-        elif amenity in ["school", "university", "college", "kindergarten"]:
-            counts["schools"] += 1
-        elif amenity in ["library", "theatre", "cinema", "museum", "arts_centre"]:
-            counts["culture"] += 1
-        elif shop:
-            counts["retail"] += 1
-        elif amenity in ["hospital", "clinic", "pharmacy", "doctors", "dentist"]:
-            counts["health"] += 1
-        elif amenity in ["bank", "atm"]:
-            counts["financial"] += 1
+    rules = [
+        ("offices", (office != "") | (amenity == "coworking_space")),
+        ("schools", np.isin(amenity, ["school", "university", "college", "kindergarten"])),
+        ("culture", np.isin(amenity, ["library", "theatre", "cinema", "museum", "arts_centre"])),
+        ("retail", shop != ""),
+        ("health", np.isin(amenity, ["hospital", "clinic", "pharmacy", "doctors", "dentist"])),
+        ("financial", np.isin(amenity, ["bank", "atm"])),
+    ]
+    category = np.select([mask for _, mask in rules], np.arange(len(rules)), default=-1)
+    per_category = np.bincount(category[category >= 0], minlength=len(rules))
+    counts = {name: int(n) for (name, _), n in zip(rules, per_category)}
     
     total = sum(counts.values()) or 1
     
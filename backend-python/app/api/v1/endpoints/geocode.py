@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Query
 from fastapi.responses import JSONResponse
-import httpx
 from ....core.cache import get_cache, set_cache
+from ....core.http_clients import get_client
 
 router = APIRouter()
 
@@ -13,10 +13,10 @@ async def geocode(q: str = Query(min_length=3, max_length=200), limit: int = 5):
     url = "https://nominatim.openstreetmap.org/search"
     params = {"q": q, "format": "json", "limit": limit, "addressdetails": 1}
     headers = {"User-Agent": "SiteScoreAI/0.2 (admin@example.com)"}
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params, headers=headers)
-        r.raise_for_status()
-        data = r.json()
+    client = get_client("nominatim")
+    r = await client.get(url, params=params, headers=headers)
+    r.raise_for_status()
+    data = r.json()
     results = [{
         "display_name": d.get("display_name"),
         "lat": float(d.get("lat")), "lon": float(d.get("lon")),
@@ -1,14 +1,23 @@
 from fastapi import APIRouter
 from ....core.config import settings
 from ....core.gtfs import get_gtfs_status
+from ....core.hex_store import get_hex_store, get_hex_store_status
+from ....core.osm_backend import get_backend_status
+from ....core.overpass_client import get_mirror_pool
+from ....ml.registry import get_model_registry
 
 router = APIRouter()
 
 @router.get("/health")
 def health():
     gtfs_status = get_gtfs_status()
+    get_hex_store()
     return {
         "status": "ok", 
         "overpass_url": settings.OVERPASS_URL,
-        "gtfs": gtfs_status
+        "overpass_mirrors": get_mirror_pool().status(),
+        "gtfs": gtfs_status,
+        "osm": get_backend_status(),
+        "hex_store": get_hex_store_status(),
+        "ml_models": get_model_registry().status()
     }
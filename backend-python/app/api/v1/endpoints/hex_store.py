@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import JSONResponse
+from ....core.overpass_client import BUSINESS_TAGS
+from ....core.hex_store import get_hex_store, get_hex_store_status
+
+router = APIRouter()
+
+@router.get("/status")
+def hex_store_status():
+    get_hex_store()
+    return JSONResponse(get_hex_store_status())
+
+@router.get("/lookup")
+def hex_store_lookup(lon: float = Query(ge=-180, le=180), lat: float = Query(ge=-90, le=90),
+                     business_type: str = Query(...), resolution: int | None = None):
+    if business_type not in BUSINESS_TAGS:
+        raise HTTPException(status_code=400, detail=f"business_type '{business_type}' inválido")
+    store = get_hex_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Hex store não configurado ou indisponível")
+    if resolution is not None and resolution not in store.sizes:
+        raise HTTPException(status_code=400, detail=f"Resolução inválida. Disponíveis: {store.sizes}")
+    found = store.lookup(lon, lat, business_type, resolution)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Ponto fora da cobertura do hex store")
+    return JSONResponse({**found, "stale": store.is_stale()})
@@ -1,15 +1,18 @@
 from fastapi import APIRouter, Query, Depends, Request, HTTPException
-from fastapi.responses import JSONResponse
-from shapely.geometry import Point
-from typing import Optional
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy.orm import Session
+from typing import Literal, Optional
 from ....core.overpass_client import (
-    build_query, BUSINESS_TAGS, POI_TAGS_COMMON, TRANSIT_TAGS, fetch_overpass,
+    BUSINESS_TAGS, POI_TAGS_COMMON, TRANSIT_TAGS, fetch_overpass, fetch_overpass_columns,
     WALKABILITY_TAGS, CYCLABILITY_TAGS, GREEN_TAGS, PARKING_TAGS, LIGHTING_TAGS,
     OverpassError, OverpassRateLimitError
 )
 from ....core.auth import get_current_user, User
 from ....core.rate_limit import enforce_quota, inc_overpass_count
-from ....core.features import to_geodf, kde_value
+from ....core.raster_kde import density_grid
+from ....core.db import SessionLocal
+from ....core.tile_cache import fetch_tiled, fetch_tiled_many
+from ....core.osm_columns import OSMColumns, KIND_NAMES
 import asyncio
 import logging
 
@@ -17,12 +20,21 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def get_db():
+    db = SessionLocal()
+    try: yield db
+    finally: db.close()
+
 @router.get("/{layer_name}")
 async def get_layer(layer_name: str,
                     request: Request,
+                    db: Session = Depends(get_db),
                     user: User = Depends(get_current_user),
                     business_type: Optional[str] = Query(default="restaurante"),
-                    bbox: Optional[str] = Query(default=None)):
+                    bbox: Optional[str] = Query(default=None),
+                    format: Literal["geojson", "raster", "png"] = Query(default="geojson"),
+                    resolution: int = Query(default=50, ge=4, le=1024),
+                    min_value: float = Query(default=0.0, ge=0)):
     enforce_quota(user.sub, limit_per_minute=120)
     
     # Validar business_type
@@ -33,32 +45,35 @@ async def get_layer(layer_name: str,
         )
     
     if bbox:
-        W, S, E, N = [float(x) for x in bbox.split(",")]
+        try:
+            W, S, E, N = [float(x) for x in bbox.split(",")]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="bbox deve ser 'oeste,sul,leste,norte'")
+        if not (N > S and E > W):
+            raise HTTPException(status_code=400, detail="bbox vazio ou invertido")
         bbox_tuple = (S, W, N, E)
     else:
         bbox_tuple = (-23.7, -46.8, -23.5, -46.6)
 
+    async def run(q):
+        inc_overpass_count(user.sub)
+        return await fetch_overpass_columns(q)
+
     if layer_name == "competition":
-        q = build_query(bbox_tuple, BUSINESS_TAGS[business_type])
+        tags = BUSINESS_TAGS[business_type]
     elif layer_name == "pois":
-        q = build_query(bbox_tuple, POI_TAGS_COMMON)
+        tags = POI_TAGS_COMMON
     elif layer_name == "transit":
-        q = build_query(bbox_tuple, TRANSIT_TAGS)
+        tags = TRANSIT_TAGS
     elif layer_name == "flow":
-        q1 = build_query(bbox_tuple, POI_TAGS_COMMON)
-        q2 = build_query(bbox_tuple, TRANSIT_TAGS)
-        async def run(q):
-            inc_overpass_count(user.sub)
-            try:
-                return await fetch_overpass(q)
-            except (OverpassError, OverpassRateLimitError) as e:
-                logger.warning(f"Erro ao buscar dados para flow: {e}")
-                return {"elements": []}
-        
-        poi, tr = await asyncio.gather(run(q1), run(q2))
-        poi_gdf = to_geodf(poi); tr_gdf = to_geodf(tr)
+        try:
+            sets = await fetch_tiled_many(bbox_tuple, {"pois": POI_TAGS_COMMON, "transit": TRANSIT_TAGS}, db=db, fetch=run)
+            poi, tr = sets["pois"], sets["transit"]
+        except (OverpassError, OverpassRateLimitError) as e:
+            logger.warning(f"Erro ao buscar dados para flow: {e}")
+            poi, tr = OSMColumns.empty(), OSMColumns.empty()
         
-        if poi_gdf.empty and tr_gdf.empty:
+        if len(poi) == 0 and len(tr) == 0:
             return JSONResponse({ 
                 "type": "FeatureCollection", 
                 "features": [],
@@ -66,18 +81,18 @@ async def get_layer(layer_name: str,
                 "message": "Limite de requisições atingido. Aguarde alguns segundos e tente novamente."
             })
         
-        minx, miny, maxx, maxy = (bbox_tuple[1], bbox_tuple[0], bbox_tuple[3], bbox_tuple[2])
-        step = max((maxx-minx), (maxy-miny)) / 50.0
-        feats = []
-        y = miny
-        while y <= maxy:
-            x = minx
-            while x <= maxx:
-                val = kde_value(Point(x, y), [poi_gdf, tr_gdf], 200)
-                feats.append({ "type": "Feature", "geometry": { "type": "Point", "coordinates": [x, y] }, "properties": { "value": val } })
-                x += step
-            y += step
-        return JSONResponse({ "type": "FeatureCollection", "features": feats })
+        # KDE em grade (histograma + convolução gaussiana separável)
+        try:
+            grid = density_grid([(poi.lon, poi.lat, None), (tr.lon, tr.lat, None)], bbox_tuple,
+                                bandwidth_m=200, resolution=resolution)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if format == "png":
+            return Response(grid.to_png(), media_type="image/png",
+                            headers={"X-Raster-Transform": ",".join(f"{v:.8f}" for v in grid.transform)})
+        if format == "raster":
+            return JSONResponse(grid.to_raster_payload())
+        return JSONResponse(grid.to_geojson(min_value=min_value))
     elif layer_name == "buildings":
         # Query personalizada para buildings (pega todos os ways com tag building)
         S, W, N, E = bbox_tuple
@@ -128,22 +143,20 @@ async def get_layer(layer_name: str,
         return JSONResponse({ "type": "FeatureCollection", "features": features })
     
     elif layer_name == "walkability":
-        q = build_query(bbox_tuple, WALKABILITY_TAGS)
+        tags = WALKABILITY_TAGS
     elif layer_name == "cyclability":
-        q = build_query(bbox_tuple, CYCLABILITY_TAGS)
+        tags = CYCLABILITY_TAGS
     elif layer_name == "green_spaces":
-        q = build_query(bbox_tuple, GREEN_TAGS)
+        tags = GREEN_TAGS
     elif layer_name == "parking":
-        q = build_query(bbox_tuple, PARKING_TAGS)
+        tags = PARKING_TAGS
     elif layer_name == "lighting":
-        q = build_query(bbox_tuple, LIGHTING_TAGS)
+        tags = LIGHTING_TAGS
     else:
         return JSONResponse({ "type": "FeatureCollection", "features": [] })
 
-    inc_overpass_count(user.sub)
-    
     try:
-        data = await fetch_overpass(q)
+        data = await fetch_tiled(bbox_tuple, tags, db=db, fetch=run)
     except (OverpassError, OverpassRateLimitError) as e:
         logger.warning(f"Erro ao buscar layer {layer_name}: {e}")
         # Retornar GeoJSON vazio ao invés de erro 500
@@ -155,32 +168,25 @@ async def get_layer(layer_name: str,
         })
     
     # Processar elementos preservando todas as informações
+    # (nós usam lat/lon diretos, ways/relations o centro)
     features = []
-    for el in data.get("elements", []):
-        # Obter coordenadas
-        lat = el.get("lat")
-        lon = el.get("lon")
-        
-        # Se não tiver coordenadas diretas, tentar obter do centro (para ways)
-        if lat is None or lon is None:
-            if "center" in el:
-                lat = el["center"]["lat"]
-                lon = el["center"]["lon"]
-            else:
-                continue  # Skip se não tiver coordenadas
+    lons, lats, ids = data.lon.tolist(), data.lat.tolist(), data.ids.tolist()
+    for i in range(len(data)):
+        lon, lat = lons[i], lats[i]
+        tags = data.tags_at(i)
         
         # Montar properties com todas as informações
         properties = {
-            "id": el.get("id"),
-            "type": el.get("type"),
+            "id": ids[i],
+            "type": KIND_NAMES.get(int(data.kind[i]), "other"),
             "lat": lat,
             "lon": lon,
-            "tags": el.get("tags", {})
+            "tags": tags
         }
         
         # Adicionar nome se existir
-        if "tags" in el and "name" in el["tags"]:
-            properties["name"] = el["tags"]["name"]
+        if "name" in tags:
+            properties["name"] = tags["name"]
         
         features.append({
             "type": "Feature",
@@ -1,17 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from ....core.db import SessionLocal
-from ....schemas import ScoreRequest, ScoreResponse
-from ....core.overpass_client import build_query, BUSINESS_TAGS, POI_TAGS_COMMON, TRANSIT_TAGS, POI_TAGS_OFFICES, POI_TAGS_SCHOOLS, POI_TAGS_PARKS, fetch_overpass
-from ....core.features import to_geodf, nearest_distance_meters, count_within_radius, kde_value, entropy_mix, filter_by_tag
+from ....schemas import BatchScoreRequest, BestBusinessRequest, ScoreRequest, ScoreResponse, SiteSearchRequest
+from ....core.overpass_client import BUSINESS_TAGS, POI_TAGS_COMMON, TRANSIT_TAGS, POI_TAGS_OFFICES, POI_TAGS_SCHOOLS, POI_TAGS_PARKS, business_tags_union, fetch_overpass_columns
+from ....core.features import all_competition_feature_matrix, base_feature_matrix, competition_feature_matrix, ring_features
+from ....core.hex_store import lookup_score_features, padded_bbox
+from ....core.scoring_model import score_matrix, score_rows
+from ....ml.registry import get_model_registry, valid_segment
+from ....core.point_set import PointSet
+from ....core.polygon_clip import PolygonClip
+from ....core.config import settings
 from ....core.centrality import street_centrality_value
 from ....core.gtfs import GTFS, is_gtfs_available
 from ....core.auth import get_current_user, User
-from ....core.rate_limit import enforce_quota, inc_overpass_count
+from ....core.rate_limit import current_usage, enforce_quota, flush_overpass_usage, inc_overpass_count
 from ....core.audit import log_overpass_audit
+from ....core.tile_cache import fetch_tiled_many
+from ....core.site_search import search_sites
+from ....core.batch_scoring import BatchSite, fetch_group_layers, group_bbox, group_raw_features, group_sites
 from shapely.geometry import shape, Point
-import asyncio, os, joblib
+import asyncio, json, logging, math
+import numpy as np
 
 router = APIRouter()
 
@@ -20,120 +30,143 @@ def get_db():
     try: yield db
     finally: db.close()
 
-def bbox_from_geom(geom):
+def bbox_from_geom(geom, radius_m: float = None):
     if geom.geom_type == "Point":
+        if radius_m:
+            # Cobre o maior anel em volta do ponto
+            dlat = radius_m / 111000
+            dlon = dlat / max(math.cos(math.radians(geom.y)), 1e-6)
+            return (geom.y - dlat, geom.x - dlon, geom.y + dlat, geom.x + dlon)
         delta = 0.003
         return (geom.y - delta, geom.x - delta, geom.y + delta, geom.x + delta)
     else:
         xs, ys = zip(*list(geom.envelope.exterior.coords))
         return (min(ys), min(xs), max(ys), max(xs))
 
-def _maybe_ml_predict(business_type: str, raw_features: dict, segment: str | None):
-    models_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models_store")
-    fname = f"{business_type}.joblib" if not segment else f"{business_type}_{segment}.joblib"
-    path = os.path.join(models_dir, fname)
-    if not os.path.exists(path): return None
-    try:
-        model = joblib.load(path)
-        feats = ['competition','offices','schools','parks','transit','flow_kde','mix','street_centrality']
-        X = [[ raw_features.get(k, 0.0) for k in feats ]]
-        pred = float(model.predict(X)[0])
-        return max(0.0, min(100.0, pred))
-    except Exception:
-        return None
+def segment_param(request: Request) -> str | None:
+    """Segmento do modelo ML (?segment=); só letras, números, _ e -."""
+    segment = request.query_params.get("segment")
+    if not valid_segment(segment):
+        raise HTTPException(status_code=400, detail="segment inválido: use apenas letras, números, '_' ou '-'")
+    return segment
 
-@router.post("", response_model=ScoreResponse)
-async def score_location(req: ScoreRequest, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    enforce_quota(user.sub, limit_per_minute=60)
-    
-    # Validar business_type
-    if req.business_type not in BUSINESS_TAGS:
-        valid_types = list(BUSINESS_TAGS.keys())
-        raise HTTPException(
-            status_code=400, 
-            detail=f"business_type '{req.business_type}' inválido. Tipos válidos: {', '.join(valid_types)}"
-        )
-    
-    geom = shape(req.geometry.model_dump())
-    if geom.geom_type not in ("Point", "Polygon", "MultiPolygon"):
-        raise HTTPException(status_code=400, detail="Geometry deve ser Point ou (Multi)Polygon")
-    center_pt = geom if geom.geom_type == "Point" else geom.centroid
-    bbox = bbox_from_geom(geom)
+def feature_rings():
+    return [int(r) for r in settings.FEATURE_RINGS.split(",") if r.strip()]
+
+def score_features_many(business_type: str, rows: list, segment: str | None, explain: bool = True) -> list:
+    """
+    (score, contribuições, explicação) de vários locais do mesmo tipo: uma
+    chamada ao modelo ML do segmento (registro em memória), se houver, senão o
+    modelo de pesos vetorizado. A explicação só é gerada com explain=True.
+    """
+    ml_scores = get_model_registry().predict(business_type, rows, segment)
+    if ml_scores is None:
+        batch = score_rows(business_type, rows)
+        return [(batch.scores[i].item(), batch.contribution_dicts(i), batch.explanation(i, raw) if explain else None)
+                for i, raw in enumerate(rows)]
+    return [(float(score),
+             [{"name": k, "value": v, "weight": 0.0, "contribution": 0.0, "description": "ML model"} for k,v in raw.items()],
+             "Score gerado por modelo treinado (ML)." if explain else None)
+            for score, raw in zip(ml_scores, rows)]
 
-    q_comp = build_query(bbox, BUSINESS_TAGS[req.business_type])
-    q_pois = build_query(bbox, POI_TAGS_COMMON + POI_TAGS_OFFICES + POI_TAGS_SCHOOLS + POI_TAGS_PARKS)
-    q_tran = build_query(bbox, TRANSIT_TAGS)
+def score_features(business_type: str, raw_features: dict, segment: str | None, explain: bool = True):
+    return score_features_many(business_type, [raw_features], segment, explain)[0]
 
+def audited_fetch(db: Session, user: User, bbox):
+    """fetch do Overpass que conta a cota do usuário e grava a auditoria."""
     async def run(q):
         inc_overpass_count(user.sub)
         try:
-            data = await fetch_overpass(q)
+            data = await fetch_overpass_columns(q)
             log_overpass_audit(db, user.sub, q, str(bbox), status="success")
             return data
         except Exception:
             log_overpass_audit(db, user.sub, q, str(bbox), status="error")
             raise
+    return run
 
-    comp_json, poi_json, transit_json = await asyncio.gather(run(q_comp), run(q_pois), run(q_tran))
-    comp_gdf = to_geodf(comp_json)
-    poi_gdf = to_geodf(poi_json)
-    transit_gdf = to_geodf(transit_json)
+async def live_raw_features(business_type: str, geom, center_pt, bbox, rings, db: Session, user: User) -> dict:
+    """Features brutas do /score calculadas a partir do Overpass (cache de tiles) e do GTFS."""
+    tags_comp = BUSINESS_TAGS[business_type]
+    tags_pois = POI_TAGS_COMMON + POI_TAGS_OFFICES + POI_TAGS_SCHOOLS + POI_TAGS_PARKS
+
+    # Uma única ida ao Overpass (query multi-conjunto) para os tiles faltantes
+    data = await fetch_tiled_many(
+        bbox, {"competition": tags_comp, "pois": tags_pois, "transit": TRANSIT_TAGS}, db=db, fetch=audited_fetch(db, user, bbox)
+    )
+    comp_gdf = PointSet.from_columns(data["competition"])
+    poi_gdf = PointSet.from_columns(data["pois"])
+    transit_gdf = PointSet.from_columns(data["transit"])
 
     # Usar GTFS se disponível, senão usa dados do Overpass
     if is_gtfs_available():
-        transit_gdf = GTFS['stops'][['geometry','trips_per_hour']].copy()
+        transit_gdf = GTFS['points']
         # Log para debugging
         import logging
         logging.getLogger(__name__).info(f"✅ Usando dados GTFS: {len(transit_gdf)} paradas")
 
     if geom.geom_type != "Point":
-        comp_gdf = comp_gdf[comp_gdf.within(geom)]
-        poi_gdf = poi_gdf[poi_gdf.within(geom)]
-        if hasattr(transit_gdf, 'within'):
-            transit_gdf = transit_gdf[transit_gdf.within(geom)]
-
-    offices_gdf = filter_by_tag(poi_gdf, 'office')
-    schools_gdf = filter_by_tag(poi_gdf, 'amenity', ['school','university'])
-    parks_gdf   = filter_by_tag(poi_gdf, 'leisure', ['park'])
-
-    comp_500   = count_within_radius(comp_gdf, center_pt, 500)
-    offices_500= count_within_radius(offices_gdf, center_pt, 500)
-    schools_500= count_within_radius(schools_gdf, center_pt, 500)
-    parks_500  = count_within_radius(parks_gdf, center_pt, 500)
-    transit_300= count_within_radius(transit_gdf, center_pt, 300) if hasattr(transit_gdf, 'geometry') else 0
-    dist_transit = nearest_distance_meters(transit_gdf, center_pt) if hasattr(transit_gdf, 'geometry') else float('inf')
-    flow = kde_value(center_pt, [transit_gdf, offices_gdf, comp_gdf], bandwidth_m=200)
-
-    street_centrality = street_centrality_value(bbox, center_pt.x, center_pt.y)
-    mix = entropy_mix({"offices":offices_500, "schools":schools_500, "parks":parks_500, "comp":comp_500})
-
-    raw_features = {
-        "competition": comp_500,
-        "offices": offices_500,
-        "schools": schools_500,
-        "parks": parks_500,
-        "transit": transit_300,
-        "flow_kde": flow,
-        "mix": mix,
-        "dist_transit_m": dist_transit,
-        "street_centrality": street_centrality
-    }
+        # Polígono preparado uma vez; pré-filtro por bbox + ponto-em-polígono vetorizado
+        clip = PolygonClip(geom)
+        comp_gdf = clip.clip(comp_gdf)
+        poi_gdf = clip.clip(poi_gdf)
+        transit_gdf = clip.clip(transit_gdf)
 
-    segment = request.query_params.get("segment")
-    ml_score = _maybe_ml_predict(req.business_type, raw_features, segment)
-    if ml_score is None:
-        from ....core.scoring_model import compute_score
-        score, contributions, explanation = compute_score(req.business_type, raw_features)
+    base, layers, flow_base = base_feature_matrix(poi_gdf, transit_gdf, center_pt.x, center_pt.y)
+    feats = {**base, **competition_feature_matrix(comp_gdf, base, flow_base, center_pt.x, center_pt.y)}
+    raw_features = {k: v[0].item() for k, v in feats.items()}
+    raw_features["street_centrality"] = street_centrality_value(bbox, center_pt.x, center_pt.y)
+    if rings:
+        raw_features.update(ring_features({"competition": comp_gdf, **layers}, center_pt, rings))
+    return raw_features
+
+@router.post("", response_model=ScoreResponse)
+async def score_location(req: ScoreRequest, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    enforce_quota(user.sub, limit_per_minute=60)
+    
+    # Validar business_type
+    if req.business_type not in BUSINESS_TAGS:
+        valid_types = list(BUSINESS_TAGS.keys())
+        raise HTTPException(
+            status_code=400, 
+            detail=f"business_type '{req.business_type}' inválido. Tipos válidos: {', '.join(valid_types)}"
+        )
+    
+    geom = shape(req.geometry.model_dump())
+    if geom.geom_type not in ("Point", "Polygon", "MultiPolygon"):
+        raise HTTPException(status_code=400, detail="Geometry deve ser Point ou (Multi)Polygon")
+    center_pt = geom if geom.geom_type == "Point" else geom.centroid
+    segment = segment_param(request)
+    # features=rings: contagens/somas com decaimento em todos os anéis de FEATURE_RINGS
+    rings = feature_rings() if request.query_params.get("features") == "rings" else None
+    # Modelo treinado com anéis (--rings): calcula os anéis dele sempre (o hex store não os tem)
+    model = get_model_registry().get(req.business_type, segment)
+    if model is not None and model.rings:
+        rings = sorted(set(rings or []) | set(model.rings))
+    bbox = bbox_from_geom(geom, max(rings) if rings else None)
+
+    # Caminho rápido: features pré-calculadas no hex store (live=true força o cálculo ao vivo)
+    stored = None
+    if geom.geom_type == "Point" and not rings and request.query_params.get("live") != "true":
+        stored = lookup_score_features(center_pt.x, center_pt.y, req.business_type)
+    if stored is not None:
+        raw_features = dict(stored["features"])
+        raw_features["street_centrality"] = street_centrality_value(bbox, center_pt.x, center_pt.y)
+        feature_source = {"source": "hex_store", "resolution_m": stored["resolution_m"], "built_at": stored["built_at"]}
     else:
-        score = ml_score
-        contributions = [{"name": k, "value": v, "weight": 0.0, "contribution": 0.0, "description": "ML model"} for k,v in raw_features.items()]
-        explanation = "Score gerado por modelo treinado (ML)."
+        raw_features = await live_raw_features(req.business_type, geom, center_pt, bbox, rings, db, user)
+        feature_source = {"source": "live"}
+
+    # explain=false dispensa o texto da explicação
+    score, contributions, explanation = score_features(req.business_type, raw_features, segment,
+                                                       explain=request.query_params.get("explain") != "false")
 
     return JSONResponse({
         "score": score,
         "features": contributions,
         "explanation": explanation,
         "center": [center_pt.x, center_pt.y],
+        "feature_source": feature_source,
         "layer_refs": {
             "competition": "/api/v1/layers/competition",
             "pois": "/api/v1/layers/pois",
@@ -141,3 +174,211 @@ async def score_location(req: ScoreRequest, request: Request, db: Session = Depe
             "flow": "/api/v1/layers/flow"
         }
     })
+
+def _batch_results(entries: list, segment: str | None, explain: bool) -> list:
+    """Resultados de (local, features brutas, origem): um predict/score por tipo de negócio."""
+    for site, raw_features, _ in entries:
+        raw_features["street_centrality"] = street_centrality_value(bbox_from_geom(site.geom), site.center.x, site.center.y)
+    by_type = {}
+    for entry in entries:
+        by_type.setdefault(entry[0].business_type, []).append(entry)
+    out = []
+    for business_type, group in by_type.items():
+        scored = score_features_many(business_type, [raw for _, raw, _ in group], segment, explain)
+        for (site, _, source), (score, contributions, explanation) in zip(group, scored):
+            out.append({
+                "index": site.index,
+                "name": site.name,
+                "business_type": site.business_type,
+                "score": score,
+                "features": contributions,
+                "explanation": explanation,
+                "center": [site.center.x, site.center.y],
+                "feature_source": source,
+            })
+    return out
+
+async def iter_batch_results(sites: list, user: User, live: bool, segment: str | None, explain: bool = False):
+    """
+    Resultados do lote na ordem de entrada. Locais cobertos pelo hex store saem
+    direto; os demais são buscados por grupo (uma ida ao cache de tiles por
+    grupo) e emitidos assim que todos os anteriores estiverem prontos.
+    """
+    db = SessionLocal()
+    ready, next_index = {}, 0
+    try:
+        pending, from_store = [], []
+        for site in sites:
+            stored = None
+            if site.is_point and not live:
+                stored = lookup_score_features(site.center.x, site.center.y, site.business_type)
+            if stored is not None:
+                source = {"source": "hex_store", "resolution_m": stored["resolution_m"], "built_at": stored["built_at"]}
+                from_store.append((site, dict(stored["features"]), source))
+            else:
+                pending.append(site)
+        for result in _batch_results(from_store, segment, explain):
+            ready[result["index"]] = result
+
+        while next_index in ready:
+            yield ready.pop(next_index)
+            next_index += 1
+
+        transit = GTFS['points'] if is_gtfs_available() else None
+        for group in group_sites(pending):
+            try:
+                comp_sets, poi, transit_set = await fetch_group_layers(
+                    group, db=db, fetch=audited_fetch(db, user, group_bbox(group)), transit=transit)
+                feats = group_raw_features(group, comp_sets, poi, transit_set)
+                for result in _batch_results([(site, f, {"source": "live"}) for site, f in zip(group, feats)], segment, explain):
+                    ready[result["index"]] = result
+            except Exception as e:
+                logging.getLogger(__name__).warning(f"Erro no lote ({len(group)} locais): {e}")
+                for site in group:
+                    ready[site.index] = {"index": site.index, "name": site.name,
+                                         "business_type": site.business_type, "error": "Falha ao calcular o score do local"}
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
+    finally:
+        db.close()
+        # Em streaming o middleware já gravou a cota antes do corpo ser gerado
+        usage = current_usage()
+        if usage is not None:
+            flush_overpass_usage(usage)
+
+@router.post("/batch")
+async def score_batch(req: BatchScoreRequest, request: Request, user: User = Depends(get_current_user)):
+    enforce_quota(user.sub, limit_per_minute=60)
+    if len(req.sites) > settings.BATCH_MAX_SITES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {settings.BATCH_MAX_SITES} locais por lote")
+
+    sites = []
+    for i, item in enumerate(req.sites):
+        if item.business_type not in BUSINESS_TAGS:
+            raise HTTPException(status_code=400, detail=f"sites[{i}]: business_type '{item.business_type}' inválido")
+        geom = shape(item.geometry.model_dump())
+        if geom.geom_type not in ("Point", "Polygon", "MultiPolygon"):
+            raise HTTPException(status_code=400, detail=f"sites[{i}]: Geometry deve ser Point ou (Multi)Polygon")
+        sites.append(BatchSite(i, item.business_type, geom, item.name))
+
+    live = request.query_params.get("live") == "true"
+    segment = segment_param(request)
+    # Explicações em texto só com explain=true
+    results = iter_batch_results(sites, user, live, segment, explain=request.query_params.get("explain") == "true")
+
+    # Listas longas (ou stream=true): uma linha JSON por local, na ordem de entrada
+    if request.query_params.get("stream") == "true" or len(sites) > settings.BATCH_STREAM_THRESHOLD:
+        async def ndjson():
+            async for result in results:
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+    return JSONResponse({"count": len(sites), "results": [r async for r in results]})
+
+async def all_types_raw_features(business_types: list, geom, center_pt, bbox, db: Session, user: User) -> dict:
+    """
+    Features brutas de vários tipos de negócio: uma busca com a união das tags
+    de concorrência e uma passada de vizinhança para todos os tipos.
+
+    Returns:
+        {feature: array (1,) comum ou (1, n_tipos) por tipo}
+    """
+    tags_pois = POI_TAGS_COMMON + POI_TAGS_OFFICES + POI_TAGS_SCHOOLS + POI_TAGS_PARKS
+    data = await fetch_tiled_many(
+        bbox, {"competition": business_tags_union(business_types), "pois": tags_pois, "transit": TRANSIT_TAGS},
+        db=db, fetch=audited_fetch(db, user, bbox)
+    )
+    comp_gdf = PointSet.from_columns(data["competition"])
+    poi_gdf = PointSet.from_columns(data["pois"])
+    transit_gdf = GTFS['points'] if is_gtfs_available() else PointSet.from_columns(data["transit"])
+    if geom.geom_type != "Point":
+        clip = PolygonClip(geom)
+        comp_gdf, poi_gdf, transit_gdf = clip.clip(comp_gdf), clip.clip(poi_gdf), clip.clip(transit_gdf)
+    base, _, flow_base = base_feature_matrix(poi_gdf, transit_gdf, center_pt.x, center_pt.y)
+    return {**base, **all_competition_feature_matrix(comp_gdf, business_types, base, flow_base, center_pt.x, center_pt.y)}
+
+def _stored_all_types(business_types: list, lon: float, lat: float):
+    """Mesmas features do hex store, se ele cobrir o ponto para todos os tipos."""
+    found = [lookup_score_features(lon, lat, b) for b in business_types]
+    if any(f is None for f in found):
+        return None, None
+    feats = {k: np.array([found[0]["features"][k]]) for k in ("offices", "schools", "parks", "transit", "dist_transit_m")}
+    for k in ("competition", "flow_kde", "mix"):
+        feats[k] = np.array([[f["features"][k] for f in found]])
+    return feats, {"source": "hex_store", "resolution_m": found[0]["resolution_m"], "built_at": found[0]["built_at"]}
+
+@router.post("/best")
+async def best_business(req: BestBusinessRequest, request: Request, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    """Ranking dos tipos de negócio para um local (modelo de pesos, todos os tipos num único produto)."""
+    enforce_quota(user.sub, limit_per_minute=60)
+    business_types = req.business_types or list(BUSINESS_TAGS)
+    invalid = [b for b in business_types if b not in BUSINESS_TAGS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"business_types inválidos: {', '.join(invalid)}")
+    business_types = list(dict.fromkeys(business_types))
+
+    geom = shape(req.geometry.model_dump())
+    if geom.geom_type not in ("Point", "Polygon", "MultiPolygon"):
+        raise HTTPException(status_code=400, detail="Geometry deve ser Point ou (Multi)Polygon")
+    center_pt = geom if geom.geom_type == "Point" else geom.centroid
+    bbox = bbox_from_geom(geom)
+
+    feats, feature_source = None, None
+    if geom.geom_type == "Point" and request.query_params.get("live") != "true":
+        feats, feature_source = _stored_all_types(business_types, center_pt.x, center_pt.y)
+    if feats is None:
+        feats = await all_types_raw_features(business_types, geom, center_pt, bbox, db, user)
+        feature_source = {"source": "live"}
+
+    scores = score_matrix(business_types, feats)[0]
+    order = np.argsort(-scores, kind="stable")[:req.top or len(business_types)]
+    ranking = [{
+        "rank": r + 1,
+        "business_type": business_types[t],
+        "score": float(scores[t]),
+        "competition": int(feats["competition"][0, t]),
+        "flow_kde": float(feats["flow_kde"][0, t]),
+        "mix": float(feats["mix"][0, t]),
+    } for r, t in enumerate(order)]
+    shared = {k: float(feats[k][0]) for k in ("offices", "schools", "parks", "transit", "dist_transit_m")}
+    return JSONResponse({
+        "ranking": ranking,
+        "shared_features": {k: (v if math.isfinite(v) else None) for k, v in shared.items()},
+        "center": [center_pt.x, center_pt.y],
+        "model": "weights",
+        "feature_source": feature_source,
+    })
+
+@router.post("/search")
+async def search_locations(req: SiteSearchRequest, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    """Top-k pontos de um polígono para o tipo de negócio (grade grossa, refinamento e espaçamento mínimo)."""
+    enforce_quota(user.sub, limit_per_minute=60)
+    if req.business_type not in BUSINESS_TAGS:
+        raise HTTPException(status_code=400, detail=f"business_type '{req.business_type}' inválido")
+    geom = shape(req.geometry.model_dump())
+    if geom.geom_type not in ("Polygon", "MultiPolygon"):
+        raise HTTPException(status_code=400, detail="Geometry deve ser Polygon ou MultiPolygon")
+    W, S, E, N = geom.bounds
+    area_km2 = geom.area * (111.0 ** 2) * math.cos(math.radians((S + N) / 2))
+    if area_km2 > settings.SEARCH_MAX_AREA_KM2:
+        raise HTTPException(status_code=400, detail=f"Área de {area_km2:.1f} km² acima do máximo ({settings.SEARCH_MAX_AREA_KM2:g} km²)")
+
+    # Dados com margem em volta do polígono: cada ponto enxerga a vizinhança completa
+    bbox = padded_bbox((S, W, N, E))
+    tags_pois = POI_TAGS_COMMON + POI_TAGS_OFFICES + POI_TAGS_SCHOOLS + POI_TAGS_PARKS
+    data = await fetch_tiled_many(
+        bbox, {"competition": BUSINESS_TAGS[req.business_type], "pois": tags_pois, "transit": TRANSIT_TAGS},
+        db=db, fetch=audited_fetch(db, user, bbox)
+    )
+    comp = PointSet.from_columns(data["competition"])
+    poi = PointSet.from_columns(data["pois"])
+    transit = GTFS['points'] if is_gtfs_available() else PointSet.from_columns(data["transit"])
+
+    result = await asyncio.to_thread(search_sites, geom, req.business_type, comp, poi, transit, k=req.k,
+                                     grid_m=req.grid_m or settings.SEARCH_GRID_M, min_spacing_m=req.min_spacing_m)
+    return JSONResponse({
+        "business_type": req.business_type,
+        "area_km2": area_km2,
+        "model": "weights",
+        **result,
+    })
@@ -1,8 +1,9 @@
 from typing import Optional
-import httpx, time
+import time
 from jose import jwt
 from fastapi import Depends, HTTPException, status, Request
 import os
+from .http_clients import get_client
 
 AUTH_JWKS_URL = os.getenv("AUTH_JWKS_URL", "")
 AUTH_AUDIENCE = os.getenv("AUTH_AUDIENCE", "")
@@ -18,12 +19,11 @@ async def get_jwks():
     now = int(time.time())
     if _jwks_cache["jwks"] and now < _jwks_cache["exp"]:
         return _jwks_cache["jwks"]
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(AUTH_JWKS_URL)
-        r.raise_for_status()
-        _jwks_cache["jwks"] = r.json()
-        _jwks_cache["exp"] = now + 3600
-        return _jwks_cache["jwks"]
+    r = await get_client("jwks").get(AUTH_JWKS_URL)
+    r.raise_for_status()
+    _jwks_cache["jwks"] = r.json()
+    _jwks_cache["exp"] = now + 3600
+    return _jwks_cache["jwks"]
 
 async def get_current_user(request: Request) -> User:
     authz = request.headers.get("Authorization", "")
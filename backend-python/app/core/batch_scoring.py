@@ -0,0 +1,119 @@
+"""
+Score em lote: muitos locais candidatos (e tipos de negócio) com uma busca
+de dados compartilhada.
+
+Os locais são agrupados por proximidade (células de BATCH_GROUP_DEG graus).
+Cada grupo faz uma única ida ao cache de tiles (fetch_tiled_many) cobrindo o
+envelope dos seus locais, com um conjunto de concorrência por tipo de negócio
+presente no grupo. As features dos pontos saem de uma única passada
+vetorizada sobre os índices espaciais compartilhados; polígonos recortam as
+camadas com PolygonClip, como no /score.
+
+Cada ponto busca dados até BUILD_PADDING_M em volta (raio das contagens +
+corte do KDE), então o resultado de um local não depende dos outros locais
+do lote e coincide com o do hex store.
+"""
+import math
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .features import base_feature_matrix, competition_feature_matrix, score_feature_matrix
+from .hex_store import padded_bbox
+from .osm_columns import OSMColumns
+from .overpass_client import BUSINESS_TAGS, POI_TAGS_COMMON, POI_TAGS_OFFICES, POI_TAGS_PARKS, POI_TAGS_SCHOOLS, \
+    TRANSIT_TAGS, fetch_overpass_columns
+from .point_set import PointSet
+from .polygon_clip import PolygonClip
+from .tile_cache import fetch_tiled_many
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+
+class BatchSite:
+    """Um local do lote: posição na entrada, tipo de negócio e geometria."""
+
+    __slots__ = ("index", "business_type", "geom", "center", "name")
+
+    def __init__(self, index: int, business_type: str, geom, name: Optional[str] = None):
+        self.index = index
+        self.business_type = business_type
+        self.geom = geom
+        self.center = geom if geom.geom_type == "Point" else geom.centroid
+        self.name = name
+
+    @property
+    def is_point(self) -> bool:
+        return self.geom.geom_type == "Point"
+
+    def data_bbox(self) -> BBox:
+        """bbox dos dados necessários ao local (ponto com margem; polígono pelo envelope)."""
+        W, S, E, N = self.geom.bounds
+        return padded_bbox((S, W, N, E)) if self.is_point else (S, W, N, E)
+
+
+def group_sites(sites: List[BatchSite], group_deg: float = None) -> List[List[BatchSite]]:
+    """Agrupa os locais por célula de `group_deg` graus do centro, na ordem da primeira ocorrência."""
+    group_deg = group_deg or settings.BATCH_GROUP_DEG
+    groups: Dict[Tuple[int, int], List[BatchSite]] = {}
+    for site in sites:
+        cell = (math.floor(site.center.x / group_deg), math.floor(site.center.y / group_deg))
+        groups.setdefault(cell, []).append(site)
+    return list(groups.values())
+
+
+def group_bbox(sites: List[BatchSite]) -> BBox:
+    boxes = np.array([s.data_bbox() for s in sites])
+    return (boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max())
+
+
+async def fetch_group_layers(sites: List[BatchSite], db: Optional[Session] = None,
+                             fetch: Callable[[str], Awaitable[OSMColumns]] = fetch_overpass_columns,
+                             transit: Optional[PointSet] = None) -> Tuple[Dict[str, PointSet], PointSet, PointSet]:
+    """
+    Camadas do grupo numa única ida ao cache de tiles.
+
+    Returns:
+        ({tipo de negócio: concorrência}, POIs, transporte)
+    """
+    business_types = sorted({s.business_type for s in sites})
+    sets = {"pois": POI_TAGS_COMMON + POI_TAGS_OFFICES + POI_TAGS_SCHOOLS + POI_TAGS_PARKS, "transit": TRANSIT_TAGS}
+    for b in business_types:
+        sets[f"competition_{b}"] = BUSINESS_TAGS[b]
+    data = await fetch_tiled_many(group_bbox(sites), sets, db=db, fetch=fetch)
+    comp_sets = {b: PointSet.from_columns(data[f"competition_{b}"]) for b in business_types}
+    poi = PointSet.from_columns(data["pois"])
+    transit = transit if transit is not None else PointSet.from_columns(data["transit"])
+    return comp_sets, poi, transit
+
+
+def group_raw_features(sites: List[BatchSite], comp_sets: Dict[str, PointSet], poi: PointSet,
+                       transit: PointSet) -> List[Dict[str, float]]:
+    """Features brutas do /score (sem centralidade) de cada local, na ordem de `sites`."""
+    out: List[Optional[Dict[str, float]]] = [None] * len(sites)
+
+    points = [i for i, s in enumerate(sites) if s.is_point]
+    if points:
+        lons = np.array([sites[i].center.x for i in points])
+        lats = np.array([sites[i].center.y for i in points])
+        base, _, flow_base = base_feature_matrix(poi, transit, lons, lats)
+        types = np.array([sites[i].business_type for i in points])
+        for b in np.unique(types):
+            sel = np.flatnonzero(types == b)
+            comp = competition_feature_matrix(comp_sets[b], {k: v[sel] for k, v in base.items()},
+                                              flow_base[sel], lons[sel], lats[sel])
+            for j, row in enumerate(sel):
+                feats = {k: v[row].item() for k, v in base.items()}
+                feats.update({k: v[j].item() for k, v in comp.items()})
+                out[points[row]] = feats
+
+    for i, site in enumerate(sites):
+        if site.is_point:
+            continue
+        clip = PolygonClip(site.geom)
+        feats = score_feature_matrix(clip.clip(comp_sets[site.business_type]), clip.clip(poi), clip.clip(transit),
+                                     site.center.x, site.center.y)
+        out[i] = {k: v[0].item() for k, v in feats.items()}
+    return out
@@ -1,9 +1,30 @@
-import hashlib, json, datetime
+import hashlib, json, datetime, zlib
 import redis
 from .config import settings
+from .osm_columns import OSMColumns, BINARY_MAGIC
 
 r = redis.from_url(settings.REDIS_URL)
 
+# Prefixo de JSON comprimido; entradas antigas (JSON puro) continuam legíveis
+JSON_Z_MAGIC = b"JSZ\x01"
+COMPRESS_MIN_BYTES = 1024
+
+def encode_value(data) -> bytes:
+    """OSMColumns vira o formato binário colunar; o resto, JSON (zlib acima de 1 KB)."""
+    if isinstance(data, OSMColumns):
+        return data.to_bytes()
+    raw = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return raw
+    return JSON_Z_MAGIC + zlib.compress(raw, 6)
+
+def decode_value(val: bytes):
+    if val.startswith(BINARY_MAGIC):
+        return OSMColumns.from_bytes(val)
+    if val.startswith(JSON_Z_MAGIC):
+        return json.loads(zlib.decompress(val[len(JSON_Z_MAGIC):]))
+    return json.loads(val)
+
 def make_cache_key(namespace: str, query: dict) -> str:
     payload = json.dumps(query, sort_keys=True, ensure_ascii=False)
     h = hashlib.sha1(payload.encode("utf-8")).hexdigest()
@@ -13,10 +34,10 @@ def get_cache(namespace: str, query: dict):
     key = make_cache_key(namespace, query)
     val = r.get(key)
     if val:
-        return json.loads(val)
+        return decode_value(val)
     return None
 
 def set_cache(namespace: str, query: dict, data, ttl_seconds: int = 604800):
     key = make_cache_key(namespace, query)
-    r.setex(key, ttl_seconds, json.dumps(data, ensure_ascii=False))
+    r.setex(key, ttl_seconds, encode_value(data))
     return key
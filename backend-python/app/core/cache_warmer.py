@@ -0,0 +1,177 @@
+"""
+Pré-aquecimento do cache de tiles do Overpass.
+
+Áreas são ranqueadas pela demanda recente: centróides dos projetos salvos
+(`projects`) e bboxes consultados no cache de tiles (demand, com acertos e
+faltas, decaindo pela idade). Para cada área, na ordem do ranking, os conjuntos de competição, POIs
+e transporte são buscados via fetch_tiled_many, que só vai ao Overpass para
+tiles ausentes ou expirados. A execução para quando o orçamento de queries
+upstream acaba. Opcionalmente também aquece a centralidade de ruas (OSMnx).
+
+Uso: app/scripts/warm_cache.py (CLI) ou WARM_INTERVAL_SECONDS > 0 (tarefa de
+fundo no startup, um worker por vez via lock no Redis).
+"""
+import asyncio
+import datetime
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ..models.project import Project
+from .audit import log_overpass_audit
+from .config import settings
+from .demand import load_recent_demand
+from .overpass_client import BUSINESS_TAGS, POI_TAGS_COMMON, POI_TAGS_OFFICES, POI_TAGS_PARKS, POI_TAGS_SCHOOLS, \
+    TRANSIT_TAGS, fetch_overpass_columns
+from .tile_cache import fetch_tiled_many
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+WARMER_USER = "cache-warmer"
+# Mesmo bbox que /score usa para um ponto (bbox_from_geom)
+POINT_DELTA = 0.003
+# Meia-vida (horas) do peso de uma consulta recente
+DEMAND_HALF_LIFE_H = 24.0
+PROJECT_WEIGHT = 1.0
+
+TAGS_POIS = POI_TAGS_COMMON + POI_TAGS_OFFICES + POI_TAGS_SCHOOLS + POI_TAGS_PARKS
+
+
+def point_bbox(lon: float, lat: float) -> BBox:
+    return (lat - POINT_DELTA, lon - POINT_DELTA, lat + POINT_DELTA, lon + POINT_DELTA)
+
+
+def rank_demand(projects: Iterable[Tuple[float, float, str]],
+                demand: Iterable[Tuple[BBox, List[str], float, datetime.datetime]],
+                now: datetime.datetime, max_areas: int = 200, top_business: int = 3) -> List[Dict]:
+    """
+    Ordena áreas por demanda.
+
+    Args:
+        projects: (lon, lat, business_type) dos projetos salvos
+        demand: (bbox, tipos de negócio, contagem, quando) das consultas recentes
+            (demand.load_recent_demand)
+        now: referência para o decaimento das consultas
+
+    Returns:
+        [{"bbox", "weight", "business_types"}] do mais para o menos demandado.
+        Áreas sem tipo de negócio conhecido recebem os mais comuns nos projetos.
+    """
+    areas: Dict[BBox, Dict] = {}
+
+    def add(bbox: BBox, weight: float, business_types: Iterable[str] = ()):
+        key = tuple(round(v, 4) for v in bbox)
+        area = areas.setdefault(key, {"bbox": key, "weight": 0.0, "business_types": set()})
+        area["weight"] += weight
+        area["business_types"].update(b for b in business_types if b)
+
+    popular = Counter()
+    for lon, lat, business_type in projects:
+        add(point_bbox(lon, lat), PROJECT_WEIGHT, [business_type])
+        popular[business_type] += 1
+
+    for bbox, business_types, count, seen_at in demand:
+        age_h = max((now - seen_at).total_seconds() / 3600.0, 0.0)
+        add(bbox, count * 0.5 ** (age_h / DEMAND_HALF_LIFE_H), business_types)
+
+    default_types = [b for b, _ in popular.most_common(top_business)]
+    ranked = sorted(areas.values(), key=lambda a: -a["weight"])[:max_areas]
+    for area in ranked:
+        types = area["business_types"] or set(default_types)
+        area["business_types"] = sorted(t for t in types if t in BUSINESS_TAGS)
+    return ranked
+
+
+def load_demand(db: Session, lookback_days: int, max_areas: int) -> List[Dict]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    projects = db.execute(
+        select(func.ST_X(Project.centroid), func.ST_Y(Project.centroid), Project.business_type)
+    ).all()
+    return rank_demand(projects, load_recent_demand(lookback_days, now), now, max_areas=max_areas)
+
+
+async def warm_areas(areas: List[Dict], db: Optional[Session], budget: int,
+                     fetch=fetch_overpass_columns, features: bool = False) -> Dict[str, int]:
+    """Aquece as áreas em ordem até esgotar `budget` queries upstream."""
+    stats = {"areas": 0, "upstream": 0, "skipped": 0, "errors": 0, "features": 0}
+
+    async def run(q):
+        stats["upstream"] += 1
+        try:
+            data = await fetch(q)
+            log_overpass_audit(db, WARMER_USER, q, "warm", status="success")
+            return data
+        except Exception:
+            log_overpass_audit(db, WARMER_USER, q, "warm", status="error")
+            raise
+
+    for area in areas:
+        if stats["upstream"] >= budget:
+            stats["skipped"] += 1
+            continue
+        sets = {"pois": TAGS_POIS, "transit": TRANSIT_TAGS}
+        for business_type in area["business_types"]:
+            sets[f"competition_{business_type}"] = BUSINESS_TAGS[business_type]
+        try:
+            await fetch_tiled_many(area["bbox"], sets, db=db, fetch=run, track_demand=False)
+            stats["areas"] += 1
+        except Exception as e:
+            logger.warning(f"Erro ao aquecer área {area['bbox']}: {e}")
+            stats["errors"] += 1
+            continue
+        if features and stats["upstream"] < budget and await _warm_centrality(area["bbox"]):
+            stats["features"] += 1
+            stats["upstream"] += 1
+    return stats
+
+
+async def _warm_centrality(bbox: BBox) -> bool:
+    """Calcula a centralidade de ruas da área se ainda não estiver no cache."""
+    from . import centrality
+    if not centrality.ENABLE or centrality.r is None:
+        return False
+    S, W, N, E = bbox
+    lon, lat = (W + E) / 2, (S + N) / 2
+    try:
+        if centrality.r.get(centrality._make_cache_key(bbox, lon, lat)) is not None:
+            return False
+    except redis.RedisError:
+        return False
+    await asyncio.to_thread(centrality.street_centrality_value, bbox, lon, lat)
+    return True
+
+
+async def warm_cache(db: Session, budget: int = None, lookback_days: int = None,
+                     max_areas: int = None, features: bool = False) -> Dict[str, int]:
+    budget = budget if budget is not None else settings.WARM_UPSTREAM_BUDGET
+    lookback_days = lookback_days or settings.WARM_LOOKBACK_DAYS
+    max_areas = max_areas or settings.WARM_MAX_AREAS
+    areas = load_demand(db, lookback_days, max_areas)
+    stats = await warm_areas(areas, db, budget, features=features)
+    logger.info(f"Cache warmer: {len(areas)} áreas ranqueadas, {stats}")
+    return stats
+
+
+async def warm_loop(interval_seconds: float):
+    """Tarefa de fundo: um worker por intervalo aquece o cache (lock no Redis)."""
+    from .db import SessionLocal
+    lock = redis.from_url(settings.REDIS_URL)
+    while True:
+        try:
+            if lock.set("warm:lock", "1", nx=True, ex=max(int(interval_seconds), 1)):
+                db = SessionLocal()
+                try:
+                    await warm_cache(db, features=settings.WARM_FEATURES)
+                finally:
+                    db.close()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Erro no cache warmer: {e}")
+        await asyncio.sleep(interval_seconds)
@@ -5,7 +5,49 @@ class Settings(BaseModel):
     DATABASE_URL: str = os.getenv("DATABASE_URL", "postgresql+psycopg2://sitescore:sitescore@db:5432/sitescore")
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
     OVERPASS_URL: str = os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter")
+    # Mirrors Overpass (lista separada por vírgulas; vazio = só OVERPASS_URL)
+    OVERPASS_URLS: str = os.getenv("OVERPASS_URLS", "")
+    OVERPASS_HEDGE_AFTER: float = float(os.getenv("OVERPASS_HEDGE_AFTER", "10"))
+    OVERPASS_MIRROR_SLOTS: int = int(os.getenv("OVERPASS_MIRROR_SLOTS", "2"))
+    OVERPASS_BREAKER_COOLDOWN: float = float(os.getenv("OVERPASS_BREAKER_COOLDOWN", "30"))
+    # Novas tentativas (com backoff) quando há um único mirror configurado
+    OVERPASS_RETRIES: int = int(os.getenv("OVERPASS_RETRIES", "2"))
     CORS_ORIGINS: str = os.getenv("CORS_ORIGINS", "http://localhost:3000")
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Cache de tiles do Overpass (tabela overpass_cache)
+    OVERPASS_TILE_DEG: float = float(os.getenv("OVERPASS_TILE_DEG", "0.01"))
+    OVERPASS_TILE_TTL: int = int(os.getenv("OVERPASS_TILE_TTL", "604800"))
+    # Clientes HTTP compartilhados
+    HTTP2_ENABLED: bool = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+    HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    OVERPASS_MAX_CONNECTIONS: int = int(os.getenv("OVERPASS_MAX_CONNECTIONS", "8"))
+    NOMINATIM_MAX_CONNECTIONS: int = int(os.getenv("NOMINATIM_MAX_CONNECTIONS", "4"))
+    # Coalescência de queries idênticas entre workers (via Redis)
+    SINGLEFLIGHT_REDIS: bool = os.getenv("SINGLEFLIGHT_REDIS", "true").lower() == "true"
+    # Backend OSM: "overpass" (público) ou "local" (extrato em OSM_EXTRACT_PATH)
+    OSM_BACKEND: str = os.getenv("OSM_BACKEND", "overpass")
+    OSM_EXTRACT_PATH: str = os.getenv("OSM_EXTRACT_PATH", "")
+    # Pré-aquecimento do cache (0 = tarefa de fundo desligada; CLI sempre disponível)
+    WARM_INTERVAL_SECONDS: float = float(os.getenv("WARM_INTERVAL_SECONDS", "0"))
+    WARM_UPSTREAM_BUDGET: int = int(os.getenv("WARM_UPSTREAM_BUDGET", "50"))
+    WARM_LOOKBACK_DAYS: int = int(os.getenv("WARM_LOOKBACK_DAYS", "7"))
+    WARM_MAX_AREAS: int = int(os.getenv("WARM_MAX_AREAS", "200"))
+    WARM_FEATURES: bool = os.getenv("WARM_FEATURES", "false").lower() == "true"
+    # Anéis (m) do modo de features multi-raio (/score?features=rings)
+    FEATURE_RINGS: str = os.getenv("FEATURE_RINGS", "100,250,500,1000,2000")
+    # Store de features em hexágonos (app/scripts/build_hex_store.py); vazio = sempre ao vivo
+    HEX_STORE_PATH: str = os.getenv("HEX_STORE_PATH", "")
+    HEX_STORE_MAX_AGE_HOURS: float = float(os.getenv("HEX_STORE_MAX_AGE_HOURS", "168"))
+    HEX_STORE_SIZES: str = os.getenv("HEX_STORE_SIZES", "100,250,500")
+    # Score em lote (/score/batch): máximo de locais, resposta NDJSON acima do limiar, célula de agrupamento (graus)
+    BATCH_MAX_SITES: int = int(os.getenv("BATCH_MAX_SITES", "500"))
+    BATCH_STREAM_THRESHOLD: int = int(os.getenv("BATCH_STREAM_THRESHOLD", "50"))
+    BATCH_GROUP_DEG: float = float(os.getenv("BATCH_GROUP_DEG", "0.05"))
+    # Modelos de ML do /score (vazio = app/models_store); intervalo (s) entre checagens de mtime
+    ML_MODELS_DIR: str = os.getenv("ML_MODELS_DIR", "")
+    ML_RELOAD_INTERVAL: float = float(os.getenv("ML_RELOAD_INTERVAL", "2"))
+    # Busca de locais (/score/search): área máxima do polígono (km²) e passo da grade grossa (m)
+    SEARCH_MAX_AREA_KM2: float = float(os.getenv("SEARCH_MAX_AREA_KM2", "25"))
+    SEARCH_GRID_M: float = float(os.getenv("SEARCH_GRID_M", "100"))
 
 settings = Settings()
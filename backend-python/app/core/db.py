@@ -12,3 +12,8 @@ def init_db():
         conn.commit()
     from ..models.base import Base as ModelsBase
     ModelsBase.metadata.create_all(bind=engine)
+    # Migração do cache de tiles para o formato binário (tabelas já existentes)
+    with engine.connect() as conn:
+        conn.execute(text("ALTER TABLE overpass_cache ADD COLUMN IF NOT EXISTS blob BYTEA"))
+        conn.execute(text("ALTER TABLE overpass_cache ALTER COLUMN payload DROP NOT NULL"))
+        conn.commit()
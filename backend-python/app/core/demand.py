@@ -0,0 +1,86 @@
+"""
+Demanda recente por área, usada no ranking do pré-aquecimento (cache_warmer).
+
+Cada busca no cache de tiles — acerto ou não — incrementa, num sorted set por
+hora no Redis, o bbox pedido junto com os tipos de negócio dos conjuntos de
+concorrência. O audit do Overpass só registra as idas upstream; contando
+também os acertos, uma área mantida quente pelo warmer continua no ranking.
+"""
+import datetime
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+import redis
+
+from . import cache
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+DEMAND_PREFIX = "warm:demand"
+
+
+def bucket_key(ts: datetime.datetime) -> str:
+    return f"{DEMAND_PREFIX}:{ts:%Y%m%d%H}"
+
+
+def demand_member(bbox: BBox, business_types: Iterable[str] = ()) -> str:
+    return ",".join(f"{v:.4f}" for v in bbox) + "|" + ",".join(sorted(set(business_types)))
+
+
+def parse_member(member) -> Optional[Tuple[BBox, List[str]]]:
+    """(bbox, tipos de negócio) de um membro gravado por record_demand; None se inválido."""
+    if isinstance(member, bytes):
+        member = member.decode("utf-8", "replace")
+    text, _, types = member.partition("|")
+    try:
+        S, W, N, E = (float(v) for v in text.split(","))
+    except ValueError:
+        return None
+    if not (S < N and W < E):
+        return None
+    return (S, W, N, E), [t for t in types.split(",") if t]
+
+
+def record_demand(bbox: BBox, business_types: Iterable[str] = (), now: datetime.datetime = None,
+                  client: redis.Redis = None) -> None:
+    """Conta uma consulta ao bbox na hora corrente; erros do Redis são ignorados."""
+    client = client or cache.r
+    key = bucket_key(now or datetime.datetime.now(datetime.timezone.utc))
+    try:
+        pipe = client.pipeline()
+        pipe.zincrby(key, 1, demand_member(bbox, business_types))
+        pipe.expire(key, settings.WARM_LOOKBACK_DAYS * 86400 + 3600)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.debug(f"Erro ao registrar demanda: {e}")
+
+
+def load_recent_demand(lookback_days: int, now: datetime.datetime = None,
+                       client: redis.Redis = None) -> List[Tuple[BBox, List[str], float, datetime.datetime]]:
+    """
+    Demanda das últimas `lookback_days`.
+
+    Returns:
+        [(bbox, tipos de negócio, contagem, início da hora)]
+    """
+    client = client or cache.r
+    now = (now or datetime.datetime.now(datetime.timezone.utc)).replace(minute=0, second=0, microsecond=0)
+    hours = [now - datetime.timedelta(hours=h) for h in range(lookback_days * 24 + 1)]
+    try:
+        pipe = client.pipeline()
+        for hour in hours:
+            pipe.zrange(bucket_key(hour), 0, -1, withscores=True)
+        buckets = pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Erro ao ler demanda recente: {e}")
+        return []
+    out = []
+    for hour, members in zip(hours, buckets):
+        for member, count in members:
+            parsed = parse_member(member)
+            if parsed is not None:
+                out.append((parsed[0], parsed[1], float(count), hour))
+    return out
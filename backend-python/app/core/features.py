@@ -1,25 +1,16 @@
 from typing import Dict, List
 import math
 import geopandas as gpd
-import pandas as pd
 from shapely.geometry import Point
 import numpy as np
-
-def _elements_to_points(elements) -> List[Point]:
-    pts = []
-    for el in elements:
-        if el.get('type') == 'node':
-            lat = el.get('lat')
-            lon = el.get('lon')
-            if lat is not None and lon is not None:
-                pts.append(Point(lon, lat))
-        else:
-            center = el.get('center')
-            if center:
-                pts.append(Point(center['lon'], center['lat']))
-    return pts
+from .osm_columns import OSMColumns, KIND_OTHER
+from .overpass_client import BUSINESS_TAGS
+from .points_engine import index_for
+from .tag_index import tag_columns, tag_columns_from_dicts, tag_mask, tag_values
 
 def to_geodf(overpass_json) -> gpd.GeoDataFrame:
+    if isinstance(overpass_json, OSMColumns):
+        return _columns_to_geodf(overpass_json)
     els = overpass_json.get('elements', [])
     geoms, tags = [], []
     for el in els:
@@ -33,40 +24,84 @@ def to_geodf(overpass_json) -> gpd.GeoDataFrame:
             if center:
                 geoms.append(Point(center['lon'], center['lat'])); tags.append(t)
     if not geoms:
-        return gpd.GeoDataFrame(geometry=[], data={"tags":[]}, crs="EPSG:4326")
-    return gpd.GeoDataFrame(geometry=geoms, data={"tags": tags}, crs="EPSG:4326")
+        return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+    return gpd.GeoDataFrame(geometry=geoms, data=tag_columns_from_dicts(tags), crs="EPSG:4326")
+
+def _columns_to_geodf(cols: OSMColumns) -> gpd.GeoDataFrame:
+    if (cols.kind == KIND_OTHER).any():
+        cols = cols.take(cols.kind != KIND_OTHER)
+    if len(cols) == 0:
+        return gpd.GeoDataFrame(geometry=[], crs="EPSG:4326")
+    return gpd.GeoDataFrame(geometry=gpd.points_from_xy(cols.lon, cols.lat), data=tag_columns(cols), crs="EPSG:4326")
 
 def project_to_meters(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     if gdf.empty: return gdf
     return gdf.to_crs(3857)
 
-def ring_buffer(point: Point, meters: float):
-    p = gpd.GeoSeries([point], crs=4326).to_crs(3857).geometry.values[0]
-    buf = p.buffer(meters)
-    return gpd.GeoSeries([buf], crs=3857).to_crs(4326).geometry.values[0]
-
 def count_within_radius(gdf: gpd.GeoDataFrame, point: Point, meters: float) -> int:
     if gdf.empty: return 0
-    radius = ring_buffer(point, meters)
-    return int(gdf.within(radius).sum())
+    return int(index_for(gdf).count_within(point.x, point.y, [meters])[0, 0])
+
+def count_within_radii(gdf: gpd.GeoDataFrame, lons, lats, radii) -> np.ndarray:
+    """Contagens (n_pontos, n_raios) em metros reais, numa única chamada."""
+    return index_for(gdf).count_within(lons, lats, radii)
+
+# Anéis (m) das features multi-raio e escala (m) do decaimento exp(-d/escala)
+DEFAULT_RINGS = (100, 250, 500, 1000, 2000)
+RING_DECAY_M = 250.0
+
+def ring_feature_names(layers, rings=DEFAULT_RINGS) -> List[str]:
+    """Nomes '<camada>_r<raio>' (contagem) e '<camada>_r<raio>_decay' (soma com decaimento)."""
+    return [f"{name}_r{int(r)}{suffix}" for name in layers for r in rings for suffix in ("", "_decay")]
+
+def ring_feature_matrix(layers: Dict[str, gpd.GeoDataFrame], lons, lats, rings=DEFAULT_RINGS,
+                        decay_m: float = RING_DECAY_M) -> Dict[str, np.ndarray]:
+    """
+    Features multi-anel para vários pontos: uma consulta ao raio máximo por
+    camada (PointsIndex.ring_profile) cobre todos os anéis.
+    """
+    n = len(np.atleast_1d(lons))
+    out = {}
+    for name, gdf in layers.items():
+        if gdf is None or gdf.empty:
+            counts, decayed = np.zeros((n, len(rings))), np.zeros((n, len(rings)))
+        else:
+            counts, decayed = index_for(gdf).ring_profile(lons, lats, rings, decay_m)
+        for j, r in enumerate(rings):
+            out[f"{name}_r{int(r)}"] = counts[:, j]
+            out[f"{name}_r{int(r)}_decay"] = decayed[:, j]
+    return out
+
+def ring_features(layers: Dict[str, gpd.GeoDataFrame], point: Point, rings=DEFAULT_RINGS,
+                  decay_m: float = RING_DECAY_M) -> Dict[str, float]:
+    return {k: float(v[0]) for k, v in ring_feature_matrix(layers, point.x, point.y, rings, decay_m).items()}
+
+def within_radius(gdf: gpd.GeoDataFrame, point: Point, meters: float) -> gpd.GeoDataFrame:
+    if gdf.empty: return gdf
+    return gdf.take(index_for(gdf).indices_within(point.x, point.y, meters))
 
 def nearest_distance_meters(gdf: gpd.GeoDataFrame, point: Point) -> float:
     if gdf.empty: return float('inf')
-    gdf_m = project_to_meters(gdf)
-    p_m = gpd.GeoSeries([point], crs=4326).to_crs(3857).geometry.values[0]
-    dists = gdf_m.distance(p_m)
-    return float(dists.min())
-
-def kde_value(point: Point, sources: List[gpd.GeoDataFrame], bandwidth_m: float = 200) -> float:
-    p_m = gpd.GeoSeries([point], crs=4326).to_crs(3857).geometry.values[0]
-    val = 0.0; two_sigma2 = 2 * (bandwidth_m ** 2)
-    for gdf in sources:
+    return float(index_for(gdf).nearest(point.x, point.y)[0])
+
+def kde_values(lons, lats, sources: List[gpd.GeoDataFrame], bandwidth_m: float = 200,
+               weights=None, cutoff: float = 4.0) -> np.ndarray:
+    """
+    KDE gaussiano em vários pontos de consulta (metros reais, truncado em
+    cutoff·σ). `weights` tem um item por fonte: escalar, array por ponto ou
+    nome de coluna do frame (ex.: 'trips_per_hour').
+    """
+    total = np.zeros(len(np.atleast_1d(lons)))
+    for k, gdf in enumerate(sources):
         if gdf is None or gdf.empty: continue
-        gm = project_to_meters(gdf)
-        for geom in gm.geometry:
-            d = geom.distance(p_m)
-            val += math.exp(-(d**2) / two_sigma2)
-    return float(val)
+        w = weights[k] if weights is not None else None
+        if isinstance(w, str):
+            w = gdf[w].fillna(0).to_numpy(dtype=np.float64)
+        total += index_for(gdf).kde(lons, lats, bandwidth_m, weights=w, cutoff=cutoff)
+    return total
+
+def kde_value(point: Point, sources: List[gpd.GeoDataFrame], bandwidth_m: float = 200, weights=None) -> float:
+    return float(kde_values([point.x], [point.y], sources, bandwidth_m, weights=weights)[0])
 
 def normalize(x: float, cap: float) -> float:
     if not math.isfinite(x): return 0.0
@@ -84,163 +119,343 @@ def entropy_mix(counts: Dict[str, int]) -> float:
 
 def filter_by_tag(gdf: gpd.GeoDataFrame, key: str, values=None) -> gpd.GeoDataFrame:
     if gdf.empty: return gdf
-    if values is None:
-        mask = gdf['tags'].apply(lambda t: key in t)
+    return gdf[tag_mask(gdf, key, values)]
+
+def entropy_mix_matrix(counts: np.ndarray) -> np.ndarray:
+    """entropy_mix vetorizado: uma linha de contagens por ponto."""
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum(axis=1, keepdims=True)
+    p = counts / np.where(total > 0, total, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ent = np.where(p > 0, -p * np.log2(p), 0.0).sum(axis=1)
+    k = (counts > 0).sum(axis=1)
+    return ent / np.where(k > 1, np.log2(np.maximum(k, 2)), 1.0)
+
+
+# ============================================================================
+# FEATURES DO /score (vetorizadas para vários pontos)
+# ============================================================================
+
+def base_feature_matrix(poi_gdf, transit_gdf, lons, lats):
+    """
+    Features do /score que não dependem do tipo de negócio (escritórios,
+    escolas e parques a 500 m, transporte a 300 m, distância ao transporte).
+
+    Returns:
+        (features {nome: array}, camadas {nome: frame}, parte do KDE de fluxo
+        vinda de transporte + escritórios)
+    """
+    lons, lats = np.atleast_1d(lons), np.atleast_1d(lats)
+    layers = {
+        "offices": filter_by_tag(poi_gdf, 'office'),
+        "schools": filter_by_tag(poi_gdf, 'amenity', ['school', 'university']),
+        "parks": filter_by_tag(poi_gdf, 'leisure', ['park']),
+        "transit": transit_gdf,
+    }
+    feats = {}
+    for name in ("offices", "schools", "parks"):
+        feats[name] = _counts(layers[name], lons, lats, 500)
+    feats["transit"] = _counts(transit_gdf, lons, lats, 300)
+    feats["dist_transit_m"] = (index_for(transit_gdf).nearest(lons, lats) if not transit_gdf.empty
+                               else np.full(len(lons), np.inf))
+    flow_base = kde_values(lons, lats, [transit_gdf, layers["offices"]], bandwidth_m=200)
+    return feats, layers, flow_base
+
+def competition_feature_matrix(comp_gdf, base: Dict[str, np.ndarray], flow_base: np.ndarray, lons, lats) -> Dict[str, np.ndarray]:
+    """Features do /score que dependem da concorrência (contagem, fluxo e mix)."""
+    lons, lats = np.atleast_1d(lons), np.atleast_1d(lats)
+    comp = _counts(comp_gdf, lons, lats, 500)
+    return {
+        "competition": comp,
+        "flow_kde": flow_base + kde_values(lons, lats, [comp_gdf], bandwidth_m=200),
+        "mix": entropy_mix_matrix(np.column_stack([base["offices"], base["schools"], base["parks"], comp])),
+    }
+
+def score_feature_matrix(comp_gdf, poi_gdf, transit_gdf, lons, lats) -> Dict[str, np.ndarray]:
+    """Todas as features brutas do /score (exceto centralidade) para vários pontos."""
+    base, _, flow_base = base_feature_matrix(poi_gdf, transit_gdf, lons, lats)
+    return {**base, **competition_feature_matrix(comp_gdf, base, flow_base, lons, lats)}
+
+def competition_membership(comp_gdf, business_types: List[str]) -> np.ndarray:
+    """Matriz (elementos, tipos) com 1 onde o elemento conta como concorrente do tipo (BUSINESS_TAGS)."""
+    out = np.zeros((len(comp_gdf), len(business_types)))
+    if comp_gdf.empty: return out
+    for t, b in enumerate(business_types):
+        for key, value in BUSINESS_TAGS[b]:
+            out[:, t] = np.maximum(out[:, t], tag_mask(comp_gdf, key, None if value is None else [value]))
+    return out
+
+def all_competition_feature_matrix(comp_gdf, business_types: List[str], base: Dict[str, np.ndarray],
+                                   flow_base: np.ndarray, lons, lats) -> Dict[str, np.ndarray]:
+    """
+    competition_feature_matrix de vários tipos de negócio de uma vez, a partir
+    da união dos concorrentes: uma passada de vizinhança conta (500 m) e soma o
+    KDE (200 m) de todos os tipos pela matriz de pertinência.
+
+    Returns:
+        {feature: array (n_pontos, n_tipos)} na ordem de `business_types`
+    """
+    lons, lats = np.atleast_1d(lons), np.atleast_1d(lats)
+    if comp_gdf is None or comp_gdf.empty:
+        comp = np.zeros((len(lons), len(business_types)))
+        kde = np.zeros_like(comp)
     else:
-        if isinstance(values, str): values = [values]
-        values_set = set(values)
-        mask = gdf['tags'].apply(lambda t: t.get(key) in values_set)
-    return gdf[mask]
+        membership = competition_membership(comp_gdf, business_types)
+        index = index_for(comp_gdf)
+        comp = np.rint(index.column_sums(lons, lats, membership, radius=500))
+        kde = index.column_sums(lons, lats, membership, bandwidth_m=200)
+    shared = np.column_stack([base["offices"], base["schools"], base["parks"]])
+    mix = entropy_mix_matrix(np.column_stack([np.repeat(shared, len(business_types), axis=0), comp.ravel()]))
+    return {
+        "competition": comp.astype(np.int64),
+        "flow_kde": flow_base[:, None] + kde,
+        "mix": mix.reshape(comp.shape),
+    }
+
+def _counts(gdf, lons, lats, meters: float) -> np.ndarray:
+    if gdf is None or gdf.empty: return np.zeros(len(lons), dtype=np.int64)
+    return index_for(gdf).count_within(lons, lats, [meters])[:, 0]
 
 
 # ============================================================================
 # NOVAS FEATURES AVANÇADAS
 # ============================================================================
 
+class FeatureContext:
+    """
+    Estado compartilhado pelas features de um ponto sobre um mesmo frame:
+    índice espacial (via index_for), máscaras de tags e vizinhanças por raio
+    calculadas uma única vez e reutilizadas por todas as features. `streets`
+    (StreetNetwork, opcional) habilita as métricas da malha viária.
+    """
+
+    def __init__(self, gdf_all: gpd.GeoDataFrame, point: Point, streets=None):
+        self.gdf = gdf_all
+        self.point = point
+        self.streets = streets
+        self._masks: Dict = {}
+        self._near: Dict[float, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.gdf)
+
+    def mask(self, key: str, values=None) -> np.ndarray:
+        if isinstance(values, str): values = [values]
+        cache_key = (key, tuple(values) if values is not None else None)
+        if cache_key not in self._masks:
+            self._masks[cache_key] = tag_mask(self.gdf, key, values)
+        return self._masks[cache_key]
+
+    def near(self, radius_m: float) -> np.ndarray:
+        """Máscara dos elementos a até `radius_m` metros do ponto."""
+        if radius_m not in self._near:
+            near = np.zeros(len(self.gdf), dtype=bool)
+            if len(self.gdf):
+                near[index_for(self.gdf).indices_within(self.point.x, self.point.y, radius_m)] = True
+            self._near[radius_m] = near
+        return self._near[radius_m]
+
+    def count(self, mask: np.ndarray, radius_m: float) -> int:
+        return int((mask & self.near(radius_m)).sum())
+
+
+# nome -> (função(ctx, raio), raio padrão em metros)
+FEATURE_REGISTRY: Dict[str, tuple] = {}
+
+def register_feature(name: str, default_radius: float):
+    def decorator(fn):
+        FEATURE_REGISTRY[name] = (fn, default_radius)
+        return fn
+    return decorator
+
+def compute_features(ctx: FeatureContext, names: List[str] = None, radii: Dict[str, float] = None) -> Dict[str, float]:
+    """Calcula as features `names` (todas por padrão) no contexto, com raios opcionais por feature."""
+    radii = radii or {}
+    out = {}
+    for name in names or FEATURE_REGISTRY:
+        fn, default_radius = FEATURE_REGISTRY[name]
+        out[name] = fn(ctx, radii.get(name, default_radius))
+    return out
+
+def _area_km2(radius_m: float) -> float:
+    return (math.pi * (radius_m ** 2)) / 1_000_000
+
+
+@register_feature("residential_density", 1000)
+def _residential_density(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    return ctx.count(ctx.mask('building', 'residential'), radius_m) / _area_km2(radius_m)
+
+
+@register_feature("sidewalk_quality", 500)
+def _sidewalk_quality(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    roads_in_radius = ctx.mask('highway') & ctx.near(radius_m)
+    n_roads = int(roads_in_radius.sum())
+    if n_roads == 0: return 0.0
+    return int((roads_in_radius & ctx.mask('sidewalk', ['both', 'left', 'right', 'yes'])).sum()) / n_roads
+
+
+@register_feature("lighting", 500)
+def _lighting(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    count = ctx.count(ctx.mask('highway', 'street_lamp'), radius_m) + ctx.count(ctx.mask('lit', 'yes'), radius_m)
+    return count / _area_km2(radius_m)
+
+
+@register_feature("green_spaces", 1000)
+def _green(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    return (ctx.count(ctx.mask('leisure', ['park', 'garden', 'nature_reserve']), radius_m)
+            + ctx.count(ctx.mask('landuse', ['forest', 'grass', 'meadow']), radius_m))
+
+
+@register_feature("cyclability", 1000)
+def _bike(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    return (ctx.count(ctx.mask('highway', ['cycleway', 'path']), radius_m)
+            + ctx.count(ctx.mask('amenity', 'bicycle_parking'), radius_m))
+
+
+@register_feature("parking", 500)
+def _parking(ctx: FeatureContext, radius_m: float) -> int:
+    if not len(ctx): return 0
+    return ctx.count(ctx.mask('amenity', 'parking'), radius_m)
+
+
+@register_feature("walkability", 500)
+def _walkability(ctx: FeatureContext, radius_m: float) -> float:
+    sidewalk = _sidewalk_quality(ctx, radius_m)
+    pois = (int(ctx.near(radius_m).sum()) if len(ctx) else 0) / 100.0  # normalizado
+    green = _green(ctx, radius_m) / 10.0  # normalizado
+    return (sidewalk * 0.4 + pois * 0.4 + green * 0.2)
+
+
+@register_feature("safety", 1000)
+def _safety(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    police_count = ctx.count(ctx.mask('amenity', ['police', 'fire_station']), radius_m)
+    return (police_count * 5.0 + _lighting(ctx, radius_m) * 0.1)  # combinação ponderada
+
+
+@register_feature("building_density", 500)
+def _building_density(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    return ctx.count(ctx.mask('building'), radius_m) / _area_km2(radius_m)
+
+
+@register_feature("street_connectivity", 500)
+def _street_connectivity(ctx: FeatureContext, radius_m: float) -> float:
+    if ctx.streets is not None:
+        # Cruzamentos reais (nós de grau >= 3 da malha viária) por km²
+        return float(ctx.streets.intersection_density(ctx.point.x, ctx.point.y, radius_m)[0])
+    if not len(ctx): return 0.0
+    # Sem malha viária: aproximação pela densidade de elementos com tag highway
+    return ctx.count(ctx.mask('highway'), radius_m) / _area_km2(radius_m)
+
+
+@register_feature("public_space_ratio", 1000)
+def _public_space_ratio(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    public = ctx.mask('leisure', ['park', 'playground', 'garden']) | ctx.mask('amenity', 'community_centre')
+    return ctx.count(public, radius_m) / 10.0  # normalizado
+
+
+@register_feature("amenity_diversity", 1000)
+def _amenity_diversity(ctx: FeatureContext, radius_m: float) -> float:
+    if not len(ctx): return 0.0
+    near = ctx.near(radius_m)
+    if not near.any(): return 0.0
+    nearby = ctx.gdf[near]
+    amenity_type = tag_values(nearby, 'amenity')
+    for key in ('shop', 'leisure'):
+        amenity_type = amenity_type.where(amenity_type.astype(bool), tag_values(nearby, key))
+    type_counts = amenity_type.where(amenity_type.astype(bool), 'other').value_counts()
+    return entropy_mix(type_counts.to_dict())
+
+
+# Interface por função (um contexto por chamada); para várias features no mesmo
+# ponto, prefira FeatureContext + compute_features.
+
 def residential_density(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 1000) -> float:
     """
     Calcula densidade de edificações residenciais por km²
     """
-    if gdf_all.empty: return 0.0
-    residential = filter_by_tag(gdf_all, 'building', 'residential')
-    if residential.empty: return 0.0
-    count = count_within_radius(residential, point, radius_m)
-    area_km2 = (math.pi * (radius_m ** 2)) / 1_000_000
-    return count / area_km2 if area_km2 > 0 else 0.0
+    return _residential_density(FeatureContext(gdf_all, point), radius_m)
 
 
 def sidewalk_quality(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 500) -> float:
     """
     % de ruas com sidewalk tag (indicador de qualidade de calçadas)
     """
-    if gdf_all.empty: return 0.0
-    roads = filter_by_tag(gdf_all, 'highway')
-    if roads.empty: return 0.0
-    roads_in_radius = roads[roads.distance(point) * 111000 < radius_m]  # aprox lat/lon to meters
-    if len(roads_in_radius) == 0: return 0.0
-    with_sidewalk = roads_in_radius[roads_in_radius['tags'].apply(
-        lambda t: t.get('sidewalk') in ['both', 'left', 'right', 'yes']
-    )]
-    return len(with_sidewalk) / len(roads_in_radius)
+    return _sidewalk_quality(FeatureContext(gdf_all, point), radius_m)
 
 
 def lighting_score(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 500) -> float:
     """
     Densidade de iluminação pública (street_lamp + lit roads)
     """
-    if gdf_all.empty: return 0.0
-    lamps = filter_by_tag(gdf_all, 'highway', 'street_lamp')
-    lit_roads = gdf_all[gdf_all['tags'].apply(lambda t: t.get('lit') == 'yes')]
-    total = len(lamps) + len(lit_roads)
-    count = count_within_radius(lamps, point, radius_m) if not lamps.empty else 0
-    count += count_within_radius(lit_roads, point, radius_m) if not lit_roads.empty else 0
-    area_km2 = (math.pi * (radius_m ** 2)) / 1_000_000
-    return count / area_km2 if area_km2 > 0 else 0.0
+    return _lighting(FeatureContext(gdf_all, point), radius_m)
 
 
 def green_score(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 1000) -> float:
     """
     Score de áreas verdes (parques, jardins, florestas)
     """
-    if gdf_all.empty: return 0.0
-    parks = filter_by_tag(gdf_all, 'leisure', ['park', 'garden', 'nature_reserve'])
-    forests = filter_by_tag(gdf_all, 'landuse', ['forest', 'grass', 'meadow'])
-    greens = gpd.GeoDataFrame(pd.concat([parks, forests], ignore_index=True)) if not parks.empty and not forests.empty else (parks if not parks.empty else forests)
-    if greens.empty: return 0.0
-    return count_within_radius(greens, point, radius_m)
+    return _green(FeatureContext(gdf_all, point), radius_m)
 
 
 def bike_infrastructure(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 1000) -> float:
     """
     Contagem de infraestrutura para bicicletas (ciclovias, estacionamentos)
     """
-    if gdf_all.empty: return 0.0
-    cycleways = filter_by_tag(gdf_all, 'highway', ['cycleway', 'path'])
-    bike_parking = filter_by_tag(gdf_all, 'amenity', 'bicycle_parking')
-    total = gpd.GeoDataFrame(pd.concat([cycleways, bike_parking], ignore_index=True)) if not cycleways.empty and not bike_parking.empty else (cycleways if not cycleways.empty else bike_parking)
-    if total.empty: return 0.0
-    return count_within_radius(total, point, radius_m)
+    return _bike(FeatureContext(gdf_all, point), radius_m)
 
 
 def parking_availability(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 500) -> int:
     """
     Número de estacionamentos no raio
     """
-    if gdf_all.empty: return 0
-    parking = filter_by_tag(gdf_all, 'amenity', 'parking')
-    return count_within_radius(parking, point, radius_m) if not parking.empty else 0
+    return _parking(FeatureContext(gdf_all, point), radius_m)
 
 
 def walkability_score(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 500) -> float:
     """
     Índice de caminhabilidade combinando calçadas, POIs e verde
     """
-    sidewalk = sidewalk_quality(gdf_all, point, radius_m)
-    pois = count_within_radius(gdf_all, point, radius_m) / 100.0  # normalizado
-    green = green_score(gdf_all, point, radius_m) / 10.0  # normalizado
-    return (sidewalk * 0.4 + pois * 0.4 + green * 0.2)
+    return _walkability(FeatureContext(gdf_all, point), radius_m)
 
 
 def safety_infrastructure(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 1000) -> float:
     """
     Score de infraestrutura de segurança (polícia, iluminação, etc)
     """
-    if gdf_all.empty: return 0.0
-    police = filter_by_tag(gdf_all, 'amenity', ['police', 'fire_station'])
-    lighting = lighting_score(gdf_all, point, radius_m)
-    police_count = count_within_radius(police, point, radius_m) if not police.empty else 0
-    return (police_count * 5.0 + lighting * 0.1)  # combinação ponderada
+    return _safety(FeatureContext(gdf_all, point), radius_m)
 
 
 def building_density(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 500) -> float:
     """
     Densidade de edificações por km²
     """
-    if gdf_all.empty: return 0.0
-    buildings = filter_by_tag(gdf_all, 'building')
-    if buildings.empty: return 0.0
-    count = count_within_radius(buildings, point, radius_m)
-    area_km2 = (math.pi * (radius_m ** 2)) / 1_000_000
-    return count / area_km2 if area_km2 > 0 else 0.0
+    return _building_density(FeatureContext(gdf_all, point), radius_m)
 
 
-def street_connectivity(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 500) -> float:
+def street_connectivity(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 500, streets=None) -> float:
     """
     Densidade de cruzamentos de ruas (conectividade da malha viária)
     """
-    if gdf_all.empty: return 0.0
-    # Aproximação: contagem de nodes de highway que são intersecções
-    roads = filter_by_tag(gdf_all, 'highway')
-    if roads.empty: return 0.0
-    count = count_within_radius(roads, point, radius_m)
-    area_km2 = (math.pi * (radius_m ** 2)) / 1_000_000
-    return count / area_km2 if area_km2 > 0 else 0.0
+    return _street_connectivity(FeatureContext(gdf_all, point, streets=streets), radius_m)
 
 
 def public_space_ratio(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 1000) -> float:
     """
     Proporção de espaço público (praças, parques, áreas comunitárias)
     """
-    if gdf_all.empty: return 0.0
-    public_spaces = gdf_all[gdf_all['tags'].apply(
-        lambda t: t.get('leisure') in ['park', 'playground', 'garden'] or 
-                  t.get('amenity') == 'community_centre'
-    )]
-    if public_spaces.empty: return 0.0
-    return count_within_radius(public_spaces, point, radius_m) / 10.0  # normalizado
+    return _public_space_ratio(FeatureContext(gdf_all, point), radius_m)
 
 
 def amenity_diversity(gdf_all: gpd.GeoDataFrame, point: Point, radius_m: float = 1000) -> float:
     """
     Diversidade de tipos de amenidades (usa entropia)
     """
-    if gdf_all.empty: return 0.0
-    amenities_in_radius = gdf_all[gdf_all.distance(point) * 111000 < radius_m]
-    if amenities_in_radius.empty: return 0.0
-    
-    type_counts = {}
-    for tags in amenities_in_radius['tags']:
-        amenity_type = tags.get('amenity') or tags.get('shop') or tags.get('leisure') or 'other'
-        type_counts[amenity_type] = type_counts.get(amenity_type, 0) + 1
-    
-    return entropy_mix(type_counts)
+    return _amenity_diversity(FeatureContext(gdf_all, point), radius_m)
@@ -7,7 +7,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 # Estado global do GTFS
-GTFS = {"stops": None, "loaded": False, "error": None}
+GTFS = {"stops": None, "points": None, "loaded": False, "error": None}
 
 def load_gtfs(zip_path: str) -> bool:
     """
@@ -65,6 +65,9 @@ def load_gtfs(zip_path: str) -> bool:
             # Merge com contagem de trips
             GTFS['stops'] = gdf.merge(trips_per_stop, on='stop_id', how='left').fillna({'trips_per_day': 0})
             GTFS['stops']['trips_per_hour'] = GTFS['stops']['trips_per_day'] / 16.0
+            # Versão em arrays (índice espacial construído uma vez e reaproveitado entre requests)
+            from .point_set import PointSet
+            GTFS['points'] = PointSet.from_gdf(GTFS['stops'][['geometry', 'trips_per_hour']])
             GTFS['loaded'] = True
             GTFS['error'] = None
             
@@ -0,0 +1,371 @@
+"""
+Store de features pré-calculadas em células hexagonais.
+
+Um job offline (app/scripts/build_hex_store.py) cobre o bbox de uma cidade
+com grades hexagonais de alguns tamanhos e calcula, no centro de cada célula,
+todas as features brutas do /score (concorrência por tipo de negócio,
+escritórios, escolas, parques, transporte, flow_kde, mix). O resultado fica
+num diretório com arrays .npy (lidos com mmap) e um meta.json gravado por
+último.
+
+Cada build grava arrays com nomes próprios (res<tamanho>_<build>_*.npy) e o
+meta.json aponta para eles; a troca do meta.json (os.replace) é o único passo
+que publica o build, então um worker nunca mistura arquivos de builds
+diferentes. O build anterior fica no diretório até o próximo, para quem ainda
+o estiver abrindo. O /score usa o store quando o ponto está na cobertura e o
+build não expirou (HEX_STORE_MAX_AGE_HOURS); senão calcula ao vivo. Um novo
+build é recarregado automaticamente pelo mtime do meta.json.
+
+Grade: hexágonos "pointy-top" em coordenadas axiais (q, r), em metros na
+LocalMetric centrada no bbox; `size_m` é a distância do centro ao vértice.
+"""
+import asyncio
+import datetime
+import json
+import logging
+import math
+import os
+import re
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .features import base_feature_matrix, competition_feature_matrix
+from .osm_columns import OSMColumns
+from .overpass_client import BUSINESS_TAGS, POI_TAGS_COMMON, POI_TAGS_OFFICES, POI_TAGS_PARKS, POI_TAGS_SCHOOLS, \
+    TRANSIT_TAGS, fetch_overpass_columns
+from .point_set import PointSet
+from .points_engine import LocalMetric
+from .tile_cache import fetch_tiled_many
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+STORE_VERSION = 2
+META_FILE = "meta.json"
+BUILD_FILE = re.compile(r"^res\d+_(?P<build>[\w-]+)_(?:keys|values)\.npy$")
+# Features comuns a todos os tipos de negócio; as demais são "<feature>:<tipo>"
+BASE_FEATURES = ["offices", "schools", "parks", "transit", "dist_transit_m"]
+BUSINESS_FEATURES = ["competition", "flow_kde", "mix"]
+# Margem (m) buscada além do bbox: raio de 500 m e corte do KDE (4·200 m)
+BUILD_PADDING_M = 800
+SQRT3 = math.sqrt(3.0)
+
+
+class HexGrid:
+    """Grade hexagonal em metros locais; células identificadas por (q, r)."""
+
+    def __init__(self, lat0: float, lon0: float, size_m: float):
+        self.metric = LocalMetric(lat0, lon0)
+        self.size_m = float(size_m)
+
+    def cell_of(self, lon, lat) -> Tuple[np.ndarray, np.ndarray]:
+        xy = self.metric.project(np.atleast_1d(lon), np.atleast_1d(lat))
+        qf = (SQRT3 / 3 * xy[:, 0] - xy[:, 1] / 3) / self.size_m
+        rf = (2 / 3 * xy[:, 1]) / self.size_m
+        return _axial_round(qf, rf)
+
+    def center_xy(self, q, r) -> np.ndarray:
+        q, r = np.asarray(q, dtype=np.float64), np.asarray(r, dtype=np.float64)
+        return np.column_stack([self.size_m * SQRT3 * (q + r / 2), self.size_m * 1.5 * r])
+
+    def centers(self, q, r) -> Tuple[np.ndarray, np.ndarray]:
+        return self.metric.unproject(self.center_xy(q, r))
+
+    def cells_in_bbox(self, bbox: BBox) -> Tuple[np.ndarray, np.ndarray]:
+        """Células cujo centro está no bbox."""
+        S, W, N, E = bbox
+        corners = self.metric.project([W, E], [S, N])
+        (x0, y0), (x1, y1) = corners
+        r = np.arange(math.floor(y0 / (1.5 * self.size_m)) - 1, math.ceil(y1 / (1.5 * self.size_m)) + 2)
+        q_min = math.floor(x0 / (SQRT3 * self.size_m) - r.max() / 2) - 1
+        q_max = math.ceil(x1 / (SQRT3 * self.size_m) - r.min() / 2) + 1
+        qq, rr = np.meshgrid(np.arange(q_min, q_max + 1), r)
+        qq, rr = qq.ravel(), rr.ravel()
+        lon, lat = self.centers(qq, rr)
+        inside = (lon >= W) & (lon <= E) & (lat >= S) & (lat <= N)
+        return qq[inside].astype(np.int64), rr[inside].astype(np.int64)
+
+
+def _axial_round(qf: np.ndarray, rf: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    sf = -qf - rf
+    q, r, s = np.rint(qf), np.rint(rf), np.rint(sf)
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def cell_keys(q: np.ndarray, r: np.ndarray) -> np.ndarray:
+    """Chave int64 ordenável de (q, r)."""
+    return (np.asarray(q, dtype=np.int64) << 32) + (np.asarray(r, dtype=np.int64) + (1 << 31))
+
+
+def feature_columns(business_types: List[str]) -> List[str]:
+    return BASE_FEATURES + [f"{f}:{b}" for b in business_types for f in BUSINESS_FEATURES]
+
+
+class HexFeatureStore:
+    """Store carregado de um diretório: meta.json + os arrays do build que ele aponta (mmap)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != STORE_VERSION:
+            raise ValueError(f"Versão do hex store incompatível: {self.meta.get('version')}")
+        self.bbox = tuple(self.meta["bbox"])
+        self.columns = self.meta["columns"]
+        self.col_index = {c: i for i, c in enumerate(self.columns)}
+        self.business_types = self.meta["business_types"]
+        self.built_at = datetime.datetime.fromisoformat(self.meta["built_at"])
+        self.grids, self.keys, self.values = {}, {}, {}
+        for size in self.meta["sizes"]:
+            files = self.meta["files"][str(size)]
+            self.grids[size] = HexGrid(self.meta["lat0"], self.meta["lon0"], size)
+            self.keys[size] = np.load(os.path.join(path, files["keys"]), mmap_mode="r")
+            self.values[size] = np.load(os.path.join(path, files["values"]), mmap_mode="r")
+            if self.values[size].shape != (len(self.keys[size]), len(self.columns)):
+                raise ValueError(f"Hex store inconsistente para {size} m: {self.values[size].shape}")
+
+    @property
+    def sizes(self) -> List[int]:
+        return sorted(self.meta["sizes"])
+
+    def is_stale(self, now: datetime.datetime = None, max_age_hours: float = None) -> bool:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        max_age_hours = settings.HEX_STORE_MAX_AGE_HOURS if max_age_hours is None else max_age_hours
+        return (now - self.built_at).total_seconds() > max_age_hours * 3600
+
+    def lookup_many(self, lons, lats, business_type: str, size: int = None) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """
+        Features das células que contêm cada ponto.
+
+        Returns:
+            ({feature: array}, máscara dos pontos cobertos pelo store)
+        """
+        size = size or self.sizes[0]
+        lons, lats = np.atleast_1d(np.asarray(lons, dtype=np.float64)), np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        S, W, N, E = self.bbox
+        keys = cell_keys(*self.grids[size].cell_of(lons, lats))
+        stored = self.keys[size]
+        pos = np.minimum(np.searchsorted(stored, keys), max(len(stored) - 1, 0))
+        found = (len(stored) > 0) & (lons >= W) & (lons <= E) & (lats >= S) & (lats <= N)
+        if len(stored):
+            found &= np.asarray(stored[pos]) == keys
+        if business_type not in self.business_types:
+            found[:] = False
+        rows = np.asarray(self.values[size][pos[found]]) if found.any() else np.zeros((0, len(self.columns)))
+        out = {}
+        for name in BASE_FEATURES + BUSINESS_FEATURES:
+            col = name if name in self.col_index else f"{name}:{business_type}"
+            values = np.full(len(lons), np.nan)
+            if col in self.col_index:
+                values[found] = rows[:, self.col_index[col]]
+            out[name] = values
+        return out, found
+
+    def lookup(self, lon: float, lat: float, business_type: str, size: int = None) -> Optional[Dict]:
+        size = size or self.sizes[0]
+        feats, found = self.lookup_many([lon], [lat], business_type, size)
+        if not found[0]:
+            return None
+        q, r = self.grids[size].cell_of(lon, lat)
+        clon, clat = self.grids[size].centers(q, r)
+        features = {k: float(v[0]) for k, v in feats.items()}
+        for name in ("competition", "offices", "schools", "parks", "transit"):
+            features[name] = int(round(features[name]))
+        return {
+            "features": features,
+            "resolution_m": size,
+            "cell": [int(q[0]), int(r[0])],
+            "cell_center": [float(clon[0]), float(clat[0])],
+            "built_at": self.meta["built_at"],
+        }
+
+    def status(self) -> Dict:
+        return {
+            "path": self.path,
+            "bbox": list(self.bbox),
+            "sizes": self.sizes,
+            "build_id": self.meta["build_id"],
+            "cells": {str(s): int(len(self.keys[s])) for s in self.sizes},
+            "business_types": len(self.business_types),
+            "built_at": self.meta["built_at"],
+            "stale": self.is_stale(),
+        }
+
+
+def build_store_arrays(bbox: BBox, sizes: List[int], comp_sets: Dict[str, PointSet], poi: PointSet,
+                       transit: PointSet) -> Dict:
+    """Calcula, por tamanho de célula, as chaves ordenadas e a matriz de features (float32)."""
+    S, W, N, E = bbox
+    lat0, lon0 = (S + N) / 2, (W + E) / 2
+    business_types = sorted(comp_sets)
+    columns = feature_columns(business_types)
+    out = {"lat0": lat0, "lon0": lon0, "columns": columns, "business_types": business_types, "res": {}}
+    for size in sizes:
+        grid = HexGrid(lat0, lon0, size)
+        q, r = grid.cells_in_bbox(bbox)
+        lons, lats = grid.centers(q, r)
+        values = np.zeros((len(q), len(columns)), dtype=np.float32)
+        base, _, flow_base = base_feature_matrix(poi, transit, lons, lats)
+        for name in BASE_FEATURES:
+            values[:, columns.index(name)] = base[name]
+        for b in business_types:
+            feats = competition_feature_matrix(comp_sets[b], base, flow_base, lons, lats)
+            for name in BUSINESS_FEATURES:
+                values[:, columns.index(f"{name}:{b}")] = feats[name]
+        keys = cell_keys(q, r)
+        order = np.argsort(keys)
+        out["res"][size] = (keys[order], values[order])
+        logger.info(f"Hex store: {len(q)} células de {size} m")
+    return out
+
+
+def _current_build(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f).get("build_id")
+    except (OSError, ValueError):
+        return None
+
+
+def write_store(path: str, bbox: BBox, arrays: Dict, built_at: datetime.datetime = None) -> str:
+    """
+    Grava os arrays com o id do build no nome e publica o build trocando o
+    meta.json por último. Remove os arquivos de builds anteriores ao que
+    estava publicado.
+
+    Returns:
+        id do build
+    """
+    os.makedirs(path, exist_ok=True)
+    built_at = built_at or datetime.datetime.now(datetime.timezone.utc)
+    build_id = f"{built_at:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    previous = _current_build(path)
+
+    def save(name, array) -> str:
+        tmp = os.path.join(path, f".{name}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp, os.path.join(path, name))
+        return name
+
+    files = {}
+    for size, (keys, values) in arrays["res"].items():
+        files[str(size)] = {"keys": save(f"res{size}_{build_id}_keys.npy", keys),
+                            "values": save(f"res{size}_{build_id}_values.npy", values)}
+    meta = {
+        "version": STORE_VERSION,
+        "build_id": build_id,
+        "bbox": list(bbox),
+        "lat0": arrays["lat0"], "lon0": arrays["lon0"],
+        "sizes": sorted(arrays["res"]),
+        "files": files,
+        "columns": arrays["columns"],
+        "business_types": arrays["business_types"],
+        "built_at": built_at.isoformat(),
+    }
+    tmp = os.path.join(path, f".{META_FILE}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, META_FILE))
+
+    keep = {build_id, previous}
+    for name in os.listdir(path):
+        m = BUILD_FILE.match(name)
+        if m and m.group("build") not in keep:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError as e:
+                logger.warning(f"Erro ao remover arquivo antigo do hex store {name}: {e}")
+    return build_id
+
+
+async def fetch_city_layers(bbox: BBox, business_types: List[str], db: Optional[Session] = None,
+                            fetch=fetch_overpass_columns, chunk_deg: float = 0.05) -> Tuple[Dict[str, PointSet], PointSet, PointSet]:
+    """Camadas do /score para um bbox grande, em blocos (uma query multi-conjunto por bloco)."""
+    S, W, N, E = bbox
+    sets = {"pois": POI_TAGS_COMMON + POI_TAGS_OFFICES + POI_TAGS_SCHOOLS + POI_TAGS_PARKS, "transit": TRANSIT_TAGS}
+    for b in business_types:
+        sets[f"competition_{b}"] = BUSINESS_TAGS[b]
+    parts: Dict[str, List[OSMColumns]] = {name: [] for name in sets}
+    for lat in np.arange(S, N, chunk_deg):
+        for lon in np.arange(W, E, chunk_deg):
+            chunk = (float(lat), float(lon), float(min(lat + chunk_deg, N)), float(min(lon + chunk_deg, E)))
+            result = await fetch_tiled_many(chunk, sets, db=db, fetch=fetch, track_demand=False)
+            for name, cols in result.items():
+                parts[name].append(cols)
+    layers = {name: PointSet.from_columns(OSMColumns.concat(ps).unique()) for name, ps in parts.items()}
+    comp_sets = {b: layers[f"competition_{b}"] for b in business_types}
+    return comp_sets, layers["pois"], layers["transit"]
+
+
+def padded_bbox(bbox: BBox, pad_m: float = BUILD_PADDING_M) -> BBox:
+    S, W, N, E = bbox
+    dlat = pad_m / 111000
+    dlon = dlat / max(math.cos(math.radians((S + N) / 2)), 1e-6)
+    return (S - dlat, W - dlon, N + dlat, E + dlon)
+
+
+async def build_hex_store(path: str, bbox: BBox, sizes: List[int], business_types: List[str] = None,
+                          db: Optional[Session] = None, fetch=fetch_overpass_columns, transit: PointSet = None) -> Dict:
+    """Busca as camadas (com margem), calcula as features e grava o store em `path`."""
+    business_types = business_types or sorted(BUSINESS_TAGS)
+    comp_sets, poi, osm_transit = await fetch_city_layers(padded_bbox(bbox), business_types, db=db, fetch=fetch)
+    transit = transit if transit is not None else osm_transit
+    arrays = await asyncio.to_thread(build_store_arrays, bbox, sizes, comp_sets, poi, transit)
+    write_store(path, bbox, arrays)
+    return {str(size): len(keys) for size, (keys, _) in arrays["res"].items()}
+
+
+_STORE = {"store": None, "mtime": None, "error": None}
+
+
+def get_hex_store() -> Optional[HexFeatureStore]:
+    """Store configurado em HEX_STORE_PATH, recarregado quando o meta.json muda."""
+    if not settings.HEX_STORE_PATH:
+        return None
+    meta_path = os.path.join(settings.HEX_STORE_PATH, META_FILE)
+    try:
+        mtime = os.stat(meta_path).st_mtime_ns
+    except OSError:
+        _STORE.update(store=None, mtime=None, error=f"Hex store não encontrado: {meta_path}")
+        return None
+    if mtime != _STORE["mtime"]:
+        try:
+            _STORE.update(store=HexFeatureStore(settings.HEX_STORE_PATH), mtime=mtime, error=None)
+            logger.info(f"Hex store carregado: {_STORE['store'].status()}")
+        except Exception as e:
+            logger.warning(f"Erro ao carregar hex store: {e}")
+            _STORE.update(store=None, mtime=mtime, error=str(e))
+    return _STORE["store"]
+
+
+def lookup_score_features(lon: float, lat: float, business_type: str) -> Optional[Dict]:
+    """Features do /score no store, ou None (sem store, fora da cobertura ou expirado)."""
+    store = get_hex_store()
+    if store is None or store.is_stale():
+        return None
+    try:
+        return store.lookup(lon, lat, business_type)
+    except Exception as e:
+        logger.warning(f"Erro na consulta ao hex store: {e}")
+        return None
+
+
+def get_hex_store_status() -> Dict:
+    store = _STORE["store"] if settings.HEX_STORE_PATH else None
+    return {
+        "enabled": bool(settings.HEX_STORE_PATH),
+        "loaded": store is not None,
+        **(store.status() if store is not None else {}),
+        "error": _STORE["error"],
+    }
@@ -0,0 +1,144 @@
+"""
+Registro de clientes HTTP compartilhados por upstream (Overpass, Nominatim, JWKS).
+
+Cada upstream tem um httpx.AsyncClient por processo, com keep-alive, limite de
+conexões próprio e HTTP/2 opcional. Os clientes são criados sob demanda e
+fechados no shutdown da aplicação (close_clients); um cliente preso a outro
+event loop é fechado antes de ser substituído.
+
+pool_stats lê o pool do transporte do httpx quando disponível (atributos
+internos, acessados com getattr); sem eles, usa as requisições em andamento
+contadas pelos event hooks do próprio registro.
+"""
+import asyncio
+import importlib.util
+import logging
+from typing import Dict, Tuple
+
+import httpx
+from prometheus_client import Counter, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+UPSTREAMS = {
+    "overpass": {"timeout": 180, "max_connections": settings.OVERPASS_MAX_CONNECTIONS},
+    "nominatim": {"timeout": 15, "max_connections": settings.NOMINATIM_MAX_CONNECTIONS},
+    "jwks": {"timeout": 10, "max_connections": 2},
+}
+
+UPSTREAM_REQUESTS = Counter(
+    "sitescore_upstream_requests_total",
+    "Requisições HTTP enviadas a upstreams externos",
+    ["upstream"],
+)
+
+# nome -> (event loop, cliente); o cliente fica preso ao loop em que foi criado
+_clients: Dict[str, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+# nome -> requisições enviadas ainda sem resposta (fallback de pool_stats)
+_in_flight: Dict[str, int] = {}
+
+
+def _http2_available() -> bool:
+    if not settings.HTTP2_ENABLED:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP2_ENABLED=true mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+        return False
+    return True
+
+
+def _make_client(name: str) -> httpx.AsyncClient:
+    cfg = UPSTREAMS[name]
+
+    async def count_request(request: httpx.Request):
+        UPSTREAM_REQUESTS.labels(upstream=name).inc()
+        _in_flight[name] = _in_flight.get(name, 0) + 1
+
+    async def count_response(response: httpx.Response):
+        _in_flight[name] = max(_in_flight.get(name, 0) - 1, 0)
+
+    return httpx.AsyncClient(
+        timeout=cfg["timeout"],
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=cfg["max_connections"],
+            max_keepalive_connections=cfg["max_connections"],
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        ),
+        event_hooks={"request": [count_request], "response": [count_response]},
+    )
+
+
+def _log_close_error(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.debug(f"Erro ao fechar cliente HTTP antigo: {future.exception()}")
+
+
+def _close_stale(client_loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient):
+    """Fecha um cliente de outro loop: no próprio loop se ele ainda roda, senão no loop atual."""
+    if client.is_closed:
+        return
+    if client_loop.is_running() and not client_loop.is_closed():
+        asyncio.run_coroutine_threadsafe(client.aclose(), client_loop).add_done_callback(_log_close_error)
+    else:
+        asyncio.ensure_future(client.aclose()).add_done_callback(_log_close_error)
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Retorna o cliente compartilhado do upstream `name` (criado sob demanda)."""
+    loop = asyncio.get_running_loop()
+    entry = _clients.get(name)
+    if entry is None or entry[0] is not loop or entry[1].is_closed:
+        if entry is not None:
+            _close_stale(*entry)
+        _clients[name] = (loop, _make_client(name))
+        _in_flight[name] = 0
+    return _clients[name][1]
+
+
+async def close_clients():
+    """Fecha os clientes criados no loop atual (shutdown da aplicação)."""
+    loop = asyncio.get_running_loop()
+    for name, (client_loop, client) in list(_clients.items()):
+        if client_loop is loop:
+            await client.aclose()
+        _clients.pop(name, None)
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    """Conexões abertas/ociosas e requisições aguardando por upstream."""
+    stats = {}
+    for name, (_, client) in _clients.items():
+        limit = UPSTREAMS[name]["max_connections"]
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        try:
+            conns = list(pool.connections)
+            stats[name] = {
+                "open": len(conns),
+                "idle": sum(1 for c in conns if getattr(c, "is_idle", lambda: False)()),
+                "waiting": len(getattr(pool, "_requests", None) or []),
+                "max": limit,
+            }
+        except (AttributeError, TypeError):
+            # Internos do httpx/httpcore mudaram: estimativa pelas requisições em andamento
+            in_flight = _in_flight.get(name, 0)
+            stats[name] = {"open": min(in_flight, limit), "idle": 0, "waiting": max(in_flight - limit, 0), "max": limit}
+    return stats
+
+
+class _PoolCollector:
+    def collect(self):
+        gauges = {
+            key: GaugeMetricFamily(f"sitescore_http_pool_{key}", f"Pool HTTP por upstream: {key}", labels=["upstream"])
+            for key in ("open", "idle", "waiting", "max")
+        }
+        for name, values in pool_stats().items():
+            for key, value in values.items():
+                gauges[key].add_metric([name], value)
+        return list(gauges.values())
+
+
+REGISTRY.register(_PoolCollector())
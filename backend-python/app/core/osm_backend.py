@@ -0,0 +1,199 @@
+"""
+Backends que respondem às listas de tags (BUSINESS_TAGS, POI_TAGS_COMMON,
+TRANSIT_TAGS, ...) para um bbox.
+
+- RemoteOverpassBackend: monta a query (simples ou multi-conjunto) e envia ao
+  Overpass público (ou à função `fetch` do chamador, para auditoria/quota).
+- LocalExtractBackend: carrega um extrato local (.npz colunar gerado por
+  app/scripts/build_osm_extract.py, ou .osm.pbf via pyosmium) num índice de
+  grade em memória e responde as mesmas consultas sem rede.
+
+Configuração: OSM_BACKEND=overpass|local e OSM_EXTRACT_PATH (lista separada
+por vírgulas). Fora da área coberta pelos extratos, o Overpass é usado.
+"""
+import logging
+import math
+import os
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .osm_columns import OSMColumns
+from .overpass_client import build_query, build_multi_query, split_multi_columns, fetch_overpass_columns
+
+logger = logging.getLogger(__name__)
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+
+class OverpassBackend(ABC):
+    """Interface comum: conjuntos nomeados de tags -> OSMColumns por conjunto."""
+
+    name = "base"
+
+    @abstractmethod
+    async def query_sets(self, bbox: BBox, tag_sets: Dict[str, List]) -> Dict[str, OSMColumns]:
+        """OSMColumns de cada conjunto de `tag_sets` dentro do bbox."""
+
+    async def query(self, bbox: BBox, tags) -> OSMColumns:
+        return (await self.query_sets(bbox, {"data": tags}))["data"]
+
+
+class RemoteOverpassBackend(OverpassBackend):
+    name = "overpass"
+
+    def __init__(self, fetch: Callable[[str], Awaitable[OSMColumns]] = fetch_overpass_columns):
+        self.fetch = fetch
+
+    async def query_sets(self, bbox: BBox, tag_sets: Dict[str, List]) -> Dict[str, OSMColumns]:
+        if len(tag_sets) == 1:
+            (name, tags), = tag_sets.items()
+            return {name: await self.fetch(build_query(bbox, tags))}
+        return split_multi_columns(await self.fetch(build_multi_query(bbox, tag_sets)), tag_sets)
+
+
+class LocalExtractBackend(OverpassBackend):
+    """Extrato OSM em memória com índice de grade (células de `cell_deg` graus)."""
+
+    name = "local"
+
+    def __init__(self, cols: OSMColumns, bounds: Optional[List[BBox]] = None, cell_deg: float = 0.01):
+        cols = cols.take(np.isfinite(cols.lon) & np.isfinite(cols.lat))
+        self.cell_deg = cell_deg
+        ix = np.floor(cols.lon / cell_deg).astype(np.int64)
+        iy = np.floor(cols.lat / cell_deg).astype(np.int64)
+        self.ix0 = int(ix.min()) if len(ix) else 0
+        self.iy0 = int(iy.min()) if len(iy) else 0
+        self.nx = int(ix.max() - self.ix0 + 1) if len(ix) else 1
+        self.ny = int(iy.max() - self.iy0 + 1) if len(iy) else 1
+        cell = (iy - self.iy0) * self.nx + (ix - self.ix0)
+        order = np.argsort(cell, kind="stable")
+        self.cols = cols.take(order)
+        self.cell = cell[order]
+        if bounds is None and len(cols):
+            bounds = [(float(cols.lat.min()), float(cols.lon.min()), float(cols.lat.max()), float(cols.lon.max()))]
+        self.bounds = bounds or []
+        self._key_codes = {k: i for i, k in enumerate(self.cols.keys)}
+        self._value_codes = {v: i for i, v in enumerate(self.cols.values)}
+        self._masks: Dict[Tuple, np.ndarray] = {}
+
+    @classmethod
+    def load(cls, paths: List[str], cell_deg: float = 0.01) -> "LocalExtractBackend":
+        parts, bounds = [], []
+        for path in paths:
+            cols, b = load_extract(path)
+            parts.append(cols)
+            bounds.append(b or (float(cols.lat.min()), float(cols.lon.min()), float(cols.lat.max()), float(cols.lon.max())))
+            logger.info(f"Extrato OSM carregado: {path} ({len(cols)} elementos)")
+        return cls(OSMColumns.concat(parts), bounds=bounds, cell_deg=cell_deg)
+
+    def covers(self, bbox: BBox) -> bool:
+        S, W, N, E = bbox
+        return any(b[0] <= S and b[1] <= W and N <= b[2] and E <= b[3] for b in self.bounds)
+
+    def _rows_in_bbox(self, bbox: BBox) -> np.ndarray:
+        S, W, N, E = bbox
+        x0 = max(math.floor(W / self.cell_deg) - self.ix0, 0)
+        x1 = min(math.floor(E / self.cell_deg) - self.ix0, self.nx - 1)
+        y0 = max(math.floor(S / self.cell_deg) - self.iy0, 0)
+        y1 = min(math.floor(N / self.cell_deg) - self.iy0, self.ny - 1)
+        if x0 > x1 or y0 > y1:
+            return np.zeros(0, dtype=np.int64)
+        rows_y = np.arange(y0, y1 + 1, dtype=np.int64) * self.nx
+        lo = np.searchsorted(self.cell, rows_y + x0, side="left")
+        hi = np.searchsorted(self.cell, rows_y + x1, side="right")
+        if not len(lo) or (hi - lo).sum() == 0:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.concatenate([np.arange(a, b, dtype=np.int64) for a, b in zip(lo, hi) if b > a])
+        lon, lat = self.cols.lon[rows], self.cols.lat[rows]
+        return rows[(lon >= W) & (lon <= E) & (lat >= S) & (lat <= N)]
+
+    def _mask(self, tags) -> np.ndarray:
+        key = tuple(sorted((k, v or "") for k, v in tags))
+        if key not in self._masks:
+            self._masks[key] = self.cols.match(tags, self._key_codes, self._value_codes)
+        return self._masks[key]
+
+    async def query_sets(self, bbox: BBox, tag_sets: Dict[str, List]) -> Dict[str, OSMColumns]:
+        rows = self._rows_in_bbox(bbox)
+        return {name: self.cols.take(rows[self._mask(tags)[rows]]) for name, tags in tag_sets.items()}
+
+
+def load_extract(path: str):
+    """Lê um extrato .npz (colunar) ou .osm.pbf. Retorna (OSMColumns, bounds ou None)."""
+    if path.endswith(".npz"):
+        return OSMColumns.load_npz(path)
+    if path.endswith(".pbf"):
+        return read_pbf(path), None
+    raise ValueError(f"Formato de extrato não suportado: {path}")
+
+
+def read_pbf(path: str, keys=None) -> OSMColumns:
+    """
+    Lê um .osm.pbf com pyosmium (dependência opcional). Ways viram o centro
+    médio dos seus nós; relations são ignoradas. Com `keys`, mantém apenas
+    elementos que têm alguma dessas chaves.
+    """
+    try:
+        import osmium
+    except ImportError as e:
+        raise RuntimeError("Leitura de .osm.pbf requer o pacote 'osmium' (pip install osmium)") from e
+    from .osm_columns import OSMColumnsBuilder
+
+    builder = OSMColumnsBuilder()
+    keys = set(keys) if keys else None
+
+    def wanted(tags) -> bool:
+        return len(tags) > 0 and (keys is None or any(t.k in keys for t in tags))
+
+    class Handler(osmium.SimpleHandler):
+        def node(self, n):
+            if wanted(n.tags) and n.location.valid():
+                builder.add({"type": "node", "id": n.id, "lon": n.location.lon, "lat": n.location.lat,
+                             "tags": {t.k: t.v for t in n.tags}})
+
+        def way(self, w):
+            if not wanted(w.tags):
+                return
+            locs = [(nd.lon, nd.lat) for nd in w.nodes if nd.location.valid()]
+            if locs:
+                lon = sum(p[0] for p in locs) / len(locs)
+                lat = sum(p[1] for p in locs) / len(locs)
+                builder.add({"type": "way", "id": w.id, "center": {"lon": lon, "lat": lat},
+                             "tags": {t.k: t.v for t in w.tags}})
+
+    Handler().apply_file(path, locations=True)
+    return builder.finish()
+
+
+_LOCAL = {"backend": None, "error": None}
+
+
+def get_local_backend() -> Optional[LocalExtractBackend]:
+    """Backend local configurado (carregado uma vez por processo) ou None."""
+    if settings.OSM_BACKEND != "local" or not settings.OSM_EXTRACT_PATH or _LOCAL["error"]:
+        return None
+    if _LOCAL["backend"] is None:
+        paths = [p.strip() for p in settings.OSM_EXTRACT_PATH.split(",") if p.strip()]
+        try:
+            missing = [p for p in paths if not os.path.exists(p)]
+            if missing:
+                raise FileNotFoundError(f"Extrato OSM não encontrado: {', '.join(missing)}")
+            _LOCAL["backend"] = LocalExtractBackend.load(paths)
+        except Exception as e:
+            logger.warning(f"{e}. Usando Overpass.")
+            _LOCAL["error"] = str(e)
+            return None
+    return _LOCAL["backend"]
+
+
+def get_backend_status() -> dict:
+    backend = _LOCAL["backend"]
+    return {
+        "backend": settings.OSM_BACKEND,
+        "extract_loaded": backend is not None,
+        "extract_elements": len(backend.cols) if backend is not None else 0,
+        "error": _LOCAL["error"],
+    }
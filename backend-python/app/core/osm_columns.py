@@ -0,0 +1,392 @@
+"""
+Representação colunar de elementos OSM retornados pelo Overpass.
+
+Em vez de uma lista de dicts, cada resposta vira arrays NumPy: tipo do elemento,
+id OSM, lon/lat (nó ou centro) e as tags em formato CSR com dicionário de
+chaves/valores. OverpassStreamParser decodifica o JSON à medida que os bytes
+chegam, sem nunca materializar a lista completa de elementos.
+"""
+import codecs
+import json
+import re
+import struct
+import zlib
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+KIND_NODE, KIND_WAY, KIND_RELATION, KIND_OTHER = 0, 1, 2, 3
+KIND_CODES = {"node": KIND_NODE, "way": KIND_WAY, "relation": KIND_RELATION}
+KIND_NAMES = {v: k for k, v in KIND_CODES.items()}
+
+
+class OSMColumns:
+    """Elementos OSM em colunas. Tags em CSR: tag_offsets[i]:tag_offsets[i+1]."""
+
+    __slots__ = ("kind", "ids", "lon", "lat", "tag_offsets", "tag_keys", "tag_vals", "keys", "values")
+
+    def __init__(self, kind, ids, lon, lat, tag_offsets, tag_keys, tag_vals, keys, values):
+        self.kind = np.asarray(kind, dtype=np.int8)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.tag_offsets = np.asarray(tag_offsets, dtype=np.int64)
+        self.tag_keys = np.asarray(tag_keys, dtype=np.int32)
+        self.tag_vals = np.asarray(tag_vals, dtype=np.int32)
+        self.keys = list(keys)
+        self.values = list(values)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def empty(cls) -> "OSMColumns":
+        return cls([], [], [], [], [0], [], [], [], [])
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[Dict]) -> "OSMColumns":
+        builder = OSMColumnsBuilder()
+        for el in elements:
+            builder.add(el)
+        return builder.finish()
+
+    def tags_at(self, i: int) -> Dict[str, str]:
+        a, b = self.tag_offsets[i], self.tag_offsets[i + 1]
+        return {self.keys[k]: self.values[v] for k, v in zip(self.tag_keys[a:b], self.tag_vals[a:b])}
+
+    def iter_tags(self) -> Iterator[Dict[str, str]]:
+        for i in range(len(self)):
+            yield self.tags_at(i)
+
+    def to_elements(self) -> List[Dict]:
+        """Converte de volta para dicts no formato Overpass (compatibilidade)."""
+        out = []
+        for i in range(len(self)):
+            kind = KIND_NAMES.get(int(self.kind[i]), "other")
+            el = {"type": kind, "id": int(self.ids[i]), "tags": self.tags_at(i)}
+            if kind == "node":
+                el["lat"], el["lon"] = float(self.lat[i]), float(self.lon[i])
+            elif np.isfinite(self.lon[i]):
+                el["center"] = {"lat": float(self.lat[i]), "lon": float(self.lon[i])}
+            out.append(el)
+        return out
+
+    def take(self, selector) -> "OSMColumns":
+        """Subconjunto por máscara booleana ou índices; vocabulários são compartilhados."""
+        idx = np.flatnonzero(selector) if np.asarray(selector).dtype == bool else np.asarray(selector, dtype=np.int64)
+        starts = self.tag_offsets[idx]
+        counts = self.tag_offsets[idx + 1] - starts
+        offsets = np.zeros(len(idx) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        pos = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1], dtype=np.int64)
+        return OSMColumns(self.kind[idx], self.ids[idx], self.lon[idx], self.lat[idx], offsets,
+                          self.tag_keys[pos], self.tag_vals[pos], self.keys, self.values)
+
+    @classmethod
+    def concat(cls, parts: List["OSMColumns"]) -> "OSMColumns":
+        parts = [p for p in parts if p is not None and len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        key_index: Dict[str, int] = {}
+        val_index: Dict[str, int] = {}
+        tag_keys, tag_vals, offsets, base = [], [], [np.zeros(1, dtype=np.int64)], 0
+        for p in parts:
+            kmap = np.array([key_index.setdefault(k, len(key_index)) for k in p.keys], dtype=np.int32)
+            vmap = np.array([val_index.setdefault(v, len(val_index)) for v in p.values], dtype=np.int32)
+            tag_keys.append(kmap[p.tag_keys] if len(p.tag_keys) else p.tag_keys)
+            tag_vals.append(vmap[p.tag_vals] if len(p.tag_vals) else p.tag_vals)
+            offsets.append(p.tag_offsets[1:] + base)
+            base += int(p.tag_offsets[-1])
+        return cls(
+            np.concatenate([p.kind for p in parts]), np.concatenate([p.ids for p in parts]),
+            np.concatenate([p.lon for p in parts]), np.concatenate([p.lat for p in parts]),
+            np.concatenate(offsets), np.concatenate(tag_keys), np.concatenate(tag_vals),
+            list(key_index), list(val_index),
+        )
+
+    def unique(self) -> "OSMColumns":
+        """Remove duplicatas por (tipo, id), mantendo a primeira ocorrência."""
+        if len(self) < 2:
+            return self
+        uid = self.ids * 4 + self.kind
+        _, first = np.unique(uid, return_index=True)
+        if len(first) == len(self):
+            return self
+        return self.take(np.sort(first))
+
+    def match(self, tags, key_codes: Dict[str, int] = None, value_codes: Dict[str, int] = None) -> np.ndarray:
+        """
+        Máscara booleana dos elementos que casam com qualquer (key, value) de
+        `tags` (value None = qualquer valor), no formato de build_query.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        if len(self.tag_keys) == 0:
+            return mask
+        key_codes = key_codes if key_codes is not None else {k: i for i, k in enumerate(self.keys)}
+        value_codes = value_codes if value_codes is not None else {v: i for i, v in enumerate(self.values)}
+        hit = np.zeros(len(self.tag_keys), dtype=bool)
+        for k, v in tags:
+            kc = key_codes.get(k)
+            if kc is None:
+                continue
+            if v is None:
+                hit |= self.tag_keys == kc
+            elif v in value_codes:
+                hit |= (self.tag_keys == kc) & (self.tag_vals == value_codes[v])
+        rows = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.tag_offsets))
+        mask[rows[hit]] = True
+        return mask
+
+    def within_bbox(self, bbox) -> "OSMColumns":
+        S, W, N, E = bbox
+        mask = (self.lon >= W) & (self.lon <= E) & (self.lat >= S) & (self.lat <= N)
+        return self if mask.all() else self.take(mask)
+
+    def to_payload(self) -> Dict:
+        """Dict serializável em JSON (listas por coluna)."""
+        return {
+            "v": 1,
+            "kind": self.kind.tolist(), "id": self.ids.tolist(),
+            "lon": self.lon.tolist(), "lat": self.lat.tolist(),
+            "tag_offsets": self.tag_offsets.tolist(),
+            "tag_keys": self.tag_keys.tolist(), "tag_vals": self.tag_vals.tolist(),
+            "keys": self.keys, "values": self.values,
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict) -> "OSMColumns":
+        if "elements" in payload:
+            return cls.from_elements(payload["elements"])
+        return cls(payload["kind"], payload["id"], payload["lon"], payload["lat"], payload["tag_offsets"],
+                   payload["tag_keys"], payload["tag_vals"], payload["keys"], payload["values"])
+
+    def to_bytes(self, level: int = 6) -> bytes:
+        """
+        Codificação binária compacta: cabeçalho + arrays brutos comprimidos com
+        zlib. Ids vão como deltas e colunas de 8 bytes com os bytes embaralhados
+        (byte-shuffle), o que deixa coordenadas próximas bem mais compressíveis.
+        """
+        keys, values = _pack_strings(self.keys).tobytes(), _pack_strings(self.values).tobytes()
+        n, nt = len(self), len(self.tag_keys)
+        ids_delta = np.diff(self.ids, prepend=np.int64(0)) if n else self.ids
+        body = b"".join([
+            _HEADER.pack(n, nt, len(keys), len(values)),
+            self.kind.tobytes(), _shuffle(ids_delta), _shuffle(self.lon), _shuffle(self.lat),
+            self.tag_offsets.tobytes(), self.tag_keys.tobytes(), self.tag_vals.tobytes(),
+            keys, values,
+        ])
+        return BINARY_MAGIC + zlib.compress(body, level)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "OSMColumns":
+        if not data.startswith(BINARY_MAGIC):
+            raise ValueError("Formato binário OSMColumns desconhecido")
+        body = memoryview(zlib.decompress(memoryview(data)[len(BINARY_MAGIC):]))
+        n, nt, lk, lv = _HEADER.unpack_from(body)
+        pos = _HEADER.size
+
+        def take(count, dtype, shuffled=False):
+            nonlocal pos
+            size = count * np.dtype(dtype).itemsize
+            chunk = body[pos:pos + size]
+            pos += size
+            return _unshuffle(chunk, dtype, count) if shuffled else np.frombuffer(chunk, dtype=dtype)
+
+        kind = take(n, np.int8)
+        ids = np.cumsum(take(n, np.int64, True))
+        lon, lat = take(n, np.float64, True), take(n, np.float64, True)
+        tag_offsets, tag_keys, tag_vals = take(n + 1, np.int64), take(nt, np.int32), take(nt, np.int32)
+        keys, values = _unpack_strings(take(lk, np.uint8)), _unpack_strings(take(lv, np.uint8))
+        return cls(kind, ids, lon, lat, tag_offsets, tag_keys, tag_vals, keys, values)
+
+    def save_npz(self, path: str, bounds=None):
+        """Grava as colunas num .npz (sem pickle). `bounds` = (S, W, N, E) de cobertura."""
+        np.savez_compressed(
+            path, kind=self.kind, ids=self.ids, lon=self.lon, lat=self.lat,
+            tag_offsets=self.tag_offsets, tag_keys=self.tag_keys, tag_vals=self.tag_vals,
+            keys=_pack_strings(self.keys), values=_pack_strings(self.values),
+            bounds=np.asarray(bounds if bounds is not None else [np.nan] * 4, dtype=np.float64),
+        )
+
+    @classmethod
+    def load_npz(cls, path: str):
+        """Lê um .npz gravado por save_npz. Retorna (OSMColumns, bounds ou None)."""
+        with np.load(path, allow_pickle=False) as z:
+            cols = cls(z["kind"], z["ids"], z["lon"], z["lat"], z["tag_offsets"], z["tag_keys"],
+                       z["tag_vals"], _unpack_strings(z["keys"]), _unpack_strings(z["values"]))
+            bounds = z["bounds"] if "bounds" in z.files else None
+        if bounds is None or not np.isfinite(bounds).all():
+            return cols, None
+        return cols, tuple(float(b) for b in bounds)
+
+
+BINARY_MAGIC = b"OSMC\x01"
+_HEADER = struct.Struct("<QQQQ")  # elementos, tags, bytes de chaves, bytes de valores
+
+
+def _shuffle(a: np.ndarray) -> bytes:
+    # Agrupa o i-ésimo byte de todos os valores (expoentes e prefixos repetidos ficam juntos)
+    return np.ascontiguousarray(a).view(np.uint8).reshape(-1, a.dtype.itemsize).T.tobytes()
+
+
+def _unshuffle(buf, dtype, count: int) -> np.ndarray:
+    width = np.dtype(dtype).itemsize
+    raw = np.frombuffer(buf, dtype=np.uint8).reshape(width, count)
+    return np.ascontiguousarray(raw.T).view(dtype).reshape(count)
+
+
+def _pack_strings(strings: List[str]) -> np.ndarray:
+    # Cada string termina em NUL, inclusive a última (preserva strings vazias)
+    return np.frombuffer("".join(s + "\x00" for s in strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_strings(buf: np.ndarray) -> List[str]:
+    return buf.tobytes().decode("utf-8").split("\x00")[:-1]
+
+
+class OSMColumnsBuilder:
+    """Acumula elementos (dicts) em arrays, internando chaves e valores de tags."""
+
+    def __init__(self):
+        self.kind = array("b"); self.ids = array("q")
+        self.lon = array("d"); self.lat = array("d")
+        self.tag_offsets = array("q", [0]); self.tag_keys = array("i"); self.tag_vals = array("i")
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[str, int] = {}
+
+    def add(self, el: Dict):
+        kind = KIND_CODES.get(el.get("type"), KIND_OTHER)
+        if kind == KIND_NODE:
+            lon, lat = el.get("lon"), el.get("lat")
+        else:
+            center = el.get("center") or {}
+            lon, lat = center.get("lon"), center.get("lat")
+        if lon is None or lat is None:
+            # Sem coordenada só mantemos elementos derivados (marcadores de conjunto)
+            if kind != KIND_OTHER:
+                return
+            lon = lat = float("nan")
+        self.kind.append(kind); self.ids.append(el.get("id") or 0)
+        self.lon.append(lon); self.lat.append(lat)
+        tags = el.get("tags") or {}
+        for k, v in tags.items():
+            self.tag_keys.append(self._keys.setdefault(k, len(self._keys)))
+            self.tag_vals.append(self._values.setdefault(v, len(self._values)))
+        self.tag_offsets.append(len(self.tag_keys))
+
+    def finish(self) -> OSMColumns:
+        def arr(a, dtype):
+            return np.frombuffer(a, dtype=dtype).copy() if len(a) else np.zeros(0, dtype=dtype)
+        return OSMColumns(arr(self.kind, np.int8), arr(self.ids, np.int64), arr(self.lon, np.float64),
+                          arr(self.lat, np.float64), arr(self.tag_offsets, np.int64),
+                          arr(self.tag_keys, np.int32), arr(self.tag_vals, np.int32),
+                          list(self._keys), list(self._values))
+
+
+_SKIP = re.compile(r"[\s,]*")
+
+
+class OverpassStreamParser:
+    """
+    Parser incremental do JSON do Overpass.
+
+    Localiza o array "elements" e decodifica um elemento por vez conforme os
+    bytes chegam (feed), entregando cada um a `on_element`. Erros de formato
+    são sinalizados com ValueError em close().
+    """
+
+    def __init__(self, on_element: Callable[[Dict], None]):
+        self.on_element = on_element
+        self.count = 0
+        self.remark: Optional[str] = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._state = 0  # 0: procurando "elements"; 1: dentro do array; 2: depois do array
+        self._tail: List[str] = []
+
+    def feed(self, chunk: bytes):
+        self._feed_text(self._decoder.decode(chunk))
+
+    def _feed_text(self, text: str):
+        if self._state == 2:
+            self._tail.append(text)
+            return
+        self._buf += text
+        self._drain()
+
+    def _drain(self):
+        buf, pos = self._buf, 0
+        if self._state == 0:
+            i = buf.find('"elements"')
+            j = buf.find("[", i + 10) if i >= 0 else -1
+            if j < 0:
+                # Mantém só o suficiente para não perder o token dividido entre chunks
+                self._buf = buf[i:] if i >= 0 else buf[-16:]
+                return
+            pos, self._state = j + 1, 1
+        if self._state == 1:
+            pos = self._decode_batch(buf, pos)
+        while self._state == 1:
+            pos = _SKIP.match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            if buf[pos] == "]":
+                self._state = 2
+                pos += 1
+                break
+            try:
+                obj, end = self._json.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # elemento ainda incompleto
+            self.on_element(obj)
+            self.count += 1
+            pos = end
+        if self._state == 2:
+            self._tail.append(buf[pos:])
+            self._buf = ""
+        else:
+            self._buf = buf[pos:]
+
+    def _decode_batch(self, buf: str, pos: int) -> int:
+        """
+        Caminho rápido: o Overpass escreve o "}" final de cada elemento na
+        coluna 0, então tentamos decodificar de uma só vez tudo até o último
+        "\n}" do buffer. Se não for uma fronteira de elemento, o laço
+        elemento-a-elemento de _drain assume.
+        """
+        pos = _SKIP.match(buf, pos).end()
+        k = buf.rfind("\n}", pos)
+        if k <= pos:
+            return pos
+        try:
+            batch = self._json.decode("[" + buf[pos:k + 2] + "]")
+        except json.JSONDecodeError:
+            return pos
+        for obj in batch:
+            self.on_element(obj)
+        self.count += len(batch)
+        return k + 2
+
+    def close(self):
+        self._feed_text(self._decoder.decode(b"", final=True))
+        if self._state == 0:
+            raise ValueError("Resposta Overpass inesperada")
+        if self._state == 1:
+            raise ValueError("Resposta Overpass truncada")
+        m = re.search(r'"remark"\s*:\s*("(?:[^"\\]|\\.)*")', "".join(self._tail))
+        if m:
+            self.remark = json.loads(m.group(1))
+
+
+def parse_overpass_bytes(chunks: Iterable[bytes]) -> OSMColumns:
+    """Atalho síncrono: decodifica uma sequência de chunks em OSMColumns."""
+    builder = OSMColumnsBuilder()
+    parser = OverpassStreamParser(builder.add)
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+    return builder.finish()
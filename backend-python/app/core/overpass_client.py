@@ -1,7 +1,12 @@
 from typing import Dict, List, Tuple
+import hashlib
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+import numpy as np
 from .config import settings
+from .http_clients import get_client
+from .overpass_mirrors import Mirror, MirrorPool, NoMirrorAvailable
+from .singleflight import overpass_flight, overpass_columns_flight
+from .osm_columns import OSMColumns, OSMColumnsBuilder, OverpassStreamParser, KIND_OTHER
 
 BUSINESS_TAGS = {
     "restaurante": [
@@ -257,15 +262,22 @@ POI_TAGS_OFFICES = [('office', None)]
 POI_TAGS_SCHOOLS = [('amenity','school'), ('amenity','university'), ('amenity','kindergarten'), ('amenity','college')]
 POI_TAGS_PARKS   = [('leisure','park'), ('leisure','playground'), ('leisure','garden')]
 
+def business_tags_union(business_types=None) -> List[Tuple]:
+    """Tags de concorrência de vários tipos de negócio, sem repetição (ordem estável)."""
+    return list(dict.fromkeys(t for b in (business_types or BUSINESS_TAGS) for t in BUSINESS_TAGS[b]))
+
 def build_clause(tag):
     k, v = tag
     if v is None:
         return f'["{k}"]'
     return f'["{k}"="{v}"]'
 
-def build_query(bbox, tags):
+def _union_clauses(bbox, tags):
     S,W,N,E = bbox
-    clauses = "\n  ".join([f'node{build_clause(t)}({S},{W},{N},{E});\n  way{build_clause(t)}({S},{W},{N},{E});\n  relation{build_clause(t)}({S},{W},{N},{E});' for t in tags])
+    return "\n  ".join([f'node{build_clause(t)}({S},{W},{N},{E});\n  way{build_clause(t)}({S},{W},{N},{E});\n  relation{build_clause(t)}({S},{W},{N},{E});' for t in tags])
+
+def build_query(bbox, tags):
+    clauses = _union_clauses(bbox, tags)
     q = f'''
 [out:json][timeout:180];
 (
@@ -275,31 +287,179 @@ out tags center;
 '''
     return q
 
+# Elemento sintético (via `make`) que marca o início de cada conjunto nomeado
+SET_MARKER = "sitescore_set"
+
+def build_multi_query(bbox, tag_sets: Dict[str, List]):
+    """
+    Gera um único programa Overpass QL com um conjunto nomeado por entrada de
+    `tag_sets`. Antes dos elementos de cada conjunto é emitido um marcador
+    SET_MARKER com tags {"name": <conjunto>}, usado por split_multi_result.
+    """
+    blocks = []
+    for name, tags in tag_sets.items():
+        clauses = _union_clauses(bbox, tags)
+        blocks.append(f'''(
+  {clauses}
+)->.{name};
+make {SET_MARKER} name="{name}";
+out;
+.{name} out tags center;''')
+    body = "\n".join(blocks)
+    return f'''
+[out:json][timeout:180];
+{body}
+'''
+
+def split_multi_result(data: Dict, names) -> Dict[str, Dict]:
+    """Separa a resposta de build_multi_query em um JSON Overpass por conjunto."""
+    out = {n: {"elements": []} for n in names}
+    current = None
+    for el in data.get("elements", []):
+        if el.get("type") == SET_MARKER:
+            current = (el.get("tags") or {}).get("name")
+            continue
+        if current in out:
+            out[current]["elements"].append(el)
+    return out
+
 class OverpassError(Exception): ...
-class OverpassRateLimitError(Exception): ...
+class OverpassServerError(OverpassError): ...
+class OverpassRateLimitError(Exception):
+    def __init__(self, message: str = "", retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
 
-@retry(
-    stop=stop_after_attempt(3), 
-    wait=wait_exponential(multiplier=2, min=4, max=60), 
-    retry=retry_if_exception_type(OverpassRateLimitError)
-)
-async def fetch_overpass(query: str) -> Dict:
-    async with httpx.AsyncClient(timeout=180) as client:
-        resp = await client.post(settings.OVERPASS_URL, data={'data': query})
-        
-        # Se for 429 (rate limit), tentar novamente com backoff exponencial
-        if resp.status_code == 429:
-            import logging
-            logging.warning(f"Overpass rate limit atingido, aguardando retry...")
-            raise OverpassRateLimitError(f"Rate limit excedido, tentando novamente...")
-        
-        # Para outros erros, não fazer retry
+def _retry_after(headers) -> float:
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def _raise_for_status(status_code: int, text: str, retry_after: float = None):
+    # 429 (rate limit) e 5xx são falhas do mirror: o pool faz failover para outro
+    if status_code == 429:
+        import logging
+        logging.warning(f"Overpass rate limit atingido")
+        raise OverpassRateLimitError(f"Rate limit excedido", retry_after=retry_after)
+    
+    if status_code != 200:
+        import logging
+        logging.error(f"Erro Overpass: HTTP {status_code}: {text[:200]}")
+        if status_code >= 500:
+            raise OverpassServerError(f"HTTP {status_code}: {text[:200]}")
+        raise OverpassError(f"HTTP {status_code}: {text[:200]}")
+
+def _is_mirror_fault(e: BaseException) -> bool:
+    return isinstance(e, (httpx.TransportError, OverpassServerError, OverpassRateLimitError))
+
+def _trip_after(e: BaseException) -> float:
+    # 429 abre o circuito na hora (pelo Retry-After, se houver)
+    if isinstance(e, OverpassRateLimitError):
+        return e.retry_after if e.retry_after is not None else settings.OVERPASS_BREAKER_COOLDOWN
+    return None
+
+_pool = None
+
+def get_mirror_pool() -> MirrorPool:
+    """Pool de mirrors configurado em OVERPASS_URLS (ou OVERPASS_URL)."""
+    global _pool
+    if _pool is None:
+        urls = [u.strip() for u in (settings.OVERPASS_URLS or settings.OVERPASS_URL).split(',') if u.strip()]
+        mirrors = [Mirror(u, slots=settings.OVERPASS_MIRROR_SLOTS, cooldown=settings.OVERPASS_BREAKER_COOLDOWN)
+                   for u in urls]
+        # Sem failover possível com um único mirror: tenta de novo com backoff
+        _pool = MirrorPool(mirrors, hedge_after=settings.OVERPASS_HEDGE_AFTER,
+                           is_fault=_is_mirror_fault, retry_after_of=_trip_after,
+                           retries=settings.OVERPASS_RETRIES if len(mirrors) == 1 else 0)
+    return _pool
+
+async def _run_on_mirrors(send):
+    try:
+        return await get_mirror_pool().run(send)
+    except NoMirrorAvailable as e:
+        raise OverpassRateLimitError(str(e))
+
+def _raise_for_remark(remark: str):
+    """
+    Remark de erro de execução (timeout, memória) = resultado truncado: falha do
+    mirror, para o pool fazer failover e nada ir para o cache de tiles.
+    """
+    if not remark:
+        return
+    text = remark.lower()
+    if text.lstrip().startswith("runtime error") or "timed out" in text or "out of memory" in text:
+        raise OverpassServerError(f"Resultado Overpass incompleto: {remark[:200]}")
+    import logging
+    logging.warning(f"Overpass remark: {remark[:200]}")
+
+async def _stream_from_mirror(url: str, query: str, client: httpx.AsyncClient = None) -> OSMColumns:
+    client = client or get_client("overpass")
+    async with client.stream("POST", url, data={'data': query}) as resp:
         if resp.status_code != 200:
-            import logging
-            logging.error(f"Erro Overpass: HTTP {resp.status_code}: {resp.text[:200]}")
-            raise OverpassError(f"HTTP {resp.status_code}: {resp.text[:200]}")
-        
-        data = resp.json()
-        if 'elements' not in data:
-            raise OverpassError("Resposta Overpass inesperada")
-        return data
+            body = await resp.aread()
+            _raise_for_status(resp.status_code, body[:400].decode('utf-8', 'replace'), _retry_after(resp.headers))
+        builder = OSMColumnsBuilder()
+        parser = OverpassStreamParser(builder.add)
+        try:
+            async for chunk in resp.aiter_bytes():
+                parser.feed(chunk)
+            parser.close()
+        except ValueError as e:
+            # Corpo truncado ou inválido: falha do mirror
+            raise OverpassServerError(str(e))
+    _raise_for_remark(parser.remark)
+    return builder.finish()
+
+async def _fetch_from_mirror(url: str, query: str, client: httpx.AsyncClient = None) -> Dict:
+    client = client or get_client("overpass")
+    resp = await client.post(url, data={'data': query})
+    _raise_for_status(resp.status_code, resp.text, _retry_after(resp.headers))
+    
+    data = resp.json()
+    if 'elements' not in data:
+        raise OverpassError("Resposta Overpass inesperada")
+    _raise_for_remark(data.get('remark'))
+    return data
+
+async def _stream_overpass_upstream(query: str) -> OSMColumns:
+    return await _run_on_mirrors(lambda url: _stream_from_mirror(url, query))
+
+async def _fetch_overpass_upstream(query: str) -> Dict:
+    return await _run_on_mirrors(lambda url: _fetch_from_mirror(url, query))
+
+async def fetch_overpass(query: str) -> Dict:
+    """
+    Executa a query no Overpass. Queries idênticas em andamento (neste processo
+    ou em outro worker) compartilham a mesma chamada upstream.
+    """
+    key = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    return await overpass_flight.do(key, lambda: _fetch_overpass_upstream(query))
+
+async def fetch_overpass_columns(query: str) -> OSMColumns:
+    """
+    Como fetch_overpass, mas decodifica a resposta em streaming direto para
+    OSMColumns (arrays de coordenadas, ids e tags codificadas).
+    """
+    key = hashlib.sha1(query.encode('utf-8')).hexdigest()
+    return await overpass_columns_flight.do(key, lambda: _stream_overpass_upstream(query))
+
+def split_multi_columns(cols: OSMColumns, names) -> Dict[str, OSMColumns]:
+    """
+    Equivalente colunar de split_multi_result. O marcador de cada conjunto é
+    emitido mesmo sem elementos; conjunto sem marcador = resposta truncada
+    (OverpassServerError), para não virar um conjunto vazio no cache.
+    """
+    out = {n: OSMColumns.empty() for n in names}
+    markers = np.flatnonzero(cols.kind == KIND_OTHER)
+    set_of_row = np.searchsorted(markers, np.arange(len(cols)), side='right') - 1
+    seen = set()
+    for m, row in enumerate(markers):
+        name = cols.tags_at(row).get('name')
+        if name in out:
+            seen.add(name)
+            out[name] = cols.take((set_of_row == m) & (cols.kind != KIND_OTHER))
+    missing = [n for n in out if n not in seen]
+    if missing:
+        raise OverpassServerError(f"Resposta Overpass sem os conjuntos: {', '.join(missing)}")
+    return out
@@ -0,0 +1,250 @@
+"""
+Pool de mirrors do Overpass com seleção por saúde.
+
+Cada mirror mantém uma média móvel exponencial (EWMA) da latência, uma janela
+das últimas respostas para o circuit breaker e a contagem de slots em uso.
+Cada query vai para o mirror disponível de menor custo estimado; se ele não
+responder em OVERPASS_HEDGE_AFTER segundos, uma cópia é disparada no segundo
+melhor mirror e vence a primeira resposta. Falhas de infraestrutura (rede,
+5xx, 429) fazem failover imediato para outro mirror em vez de esperar backoff.
+
+O slot é reservado no momento da escolha (pick); com todos os mirrors
+disponíveis ocupados, a query aguarda um slot ser liberado. Quando não resta
+mirror para tentar (todos falharam ou estão com o circuito aberto), o pool
+pode tentar de novo `retries` vezes, esperando o backoff ou a reabertura do
+circuito (o que for maior, até `retry_max_wait`) — útil com um único mirror,
+em que não há failover.
+
+Estados do breaker: fechado -> aberto (taxa de erro alta ou 429) -> meio-aberto
+após o cooldown (uma única query de teste) -> fechado ou aberto de novo.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class NoMirrorAvailable(Exception):
+    """Todos os mirrors estão com o circuito aberto ou sem slots livres."""
+
+
+class Mirror:
+    def __init__(self, url: str, slots: int = 2, alpha: float = 0.3, initial_latency: float = 5.0,
+                 window: int = 10, min_samples: int = 3, error_rate: float = 0.5, cooldown: float = 30.0):
+        self.url = url
+        self.slots = slots
+        self.alpha = alpha
+        self.latency = initial_latency
+        self.results = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.error_rate = error_rate
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_until = 0.0
+        self.inflight = 0
+
+    def available(self, now: float) -> bool:
+        if self.state == OPEN and now >= self.opened_until:
+            self.state = HALF_OPEN
+        if self.state == OPEN:
+            return False
+        if self.state == HALF_OPEN:
+            # Meio-aberto: só uma query de teste por vez
+            return self.inflight == 0
+        return self.inflight < self.slots
+
+    def saturated(self, now: float) -> bool:
+        """Circuito não está aberto, mas todos os slots estão em uso (vale esperar)."""
+        return not self.available(now) and self.state != OPEN
+
+    def cost(self) -> float:
+        """Latência esperada, penalizada pela ocupação dos slots."""
+        return self.latency * (1.0 + self.inflight / max(self.slots, 1))
+
+    def record_success(self, elapsed: float):
+        self.latency = self.alpha * elapsed + (1 - self.alpha) * self.latency
+        self.results.append(True)
+        if self.state != CLOSED:
+            logger.info(f"Mirror Overpass recuperado: {self.url}")
+        self.state = CLOSED
+
+    def record_failure(self, trip: bool = False, retry_after: Optional[float] = None):
+        self.results.append(False)
+        errors = self.results.count(False)
+        if trip or self.state == HALF_OPEN or (
+                len(self.results) >= self.min_samples and errors / len(self.results) >= self.error_rate):
+            self.open(retry_after)
+
+    def open(self, retry_after: Optional[float] = None):
+        wait = retry_after if retry_after is not None else self.cooldown
+        self.state = OPEN
+        self.opened_until = time.monotonic() + wait
+        self.results.clear()
+        logger.warning(f"Circuito aberto para mirror Overpass {self.url} por {wait:.0f}s")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url, "state": self.state, "latency_ewma_s": round(self.latency, 3),
+            "inflight": self.inflight, "slots": self.slots,
+            "recent_errors": self.results.count(False), "recent_samples": len(self.results),
+        }
+
+
+class MirrorPool:
+    """
+    Args:
+        mirrors: lista de Mirror, em ordem de preferência para desempate
+        hedge_after: segundos até disparar a cópia da query (0 desativa)
+        is_fault: erro atribuível ao mirror (conta para o breaker e faz failover);
+            outros erros (ex.: query inválida) são propagados direto
+        retry_after_of: segundos pedidos pelo mirror para abrir o circuito já
+            (ex.: 429 com Retry-After); None quando não se aplica
+        retries: novas rodadas quando não resta mirror para tentar
+        retry_backoff: espera base (s) entre rodadas, dobrando a cada uma
+        retry_max_wait: espera máxima (s) por rodada; se o circuito só reabre
+            depois disso, desiste
+    """
+
+    def __init__(self, mirrors: List[Mirror], hedge_after: float = 0.0,
+                 is_fault: Callable[[BaseException], bool] = lambda e: True,
+                 retry_after_of: Callable[[BaseException], Optional[float]] = lambda e: None,
+                 retries: int = 0, retry_backoff: float = 4.0, retry_max_wait: float = 60.0):
+        self.mirrors = mirrors
+        self.hedge_after = hedge_after
+        self.is_fault = is_fault
+        self.retry_after_of = retry_after_of
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_max_wait = retry_max_wait
+        self._waiters: List[asyncio.Future] = []
+
+    def pick(self, exclude=()) -> Optional[Mirror]:
+        """Melhor mirror disponível, já com o slot reservado (liberar com release)."""
+        now = time.monotonic()
+        candidates = [m for m in self.mirrors if m.url not in exclude and m.available(now)]
+        if not candidates:
+            return None
+        mirror = min(candidates, key=Mirror.cost)
+        mirror.inflight += 1
+        return mirror
+
+    def release(self, mirror: Mirror):
+        mirror.inflight -= 1
+        waiters, self._waiters = self._waiters, []
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def _wait_for_slot(self):
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+
+    def _retry_delay(self, attempt: int) -> Optional[float]:
+        """Espera até a próxima rodada; None se passar de retry_max_wait."""
+        now = time.monotonic()
+        reopen = min((m.opened_until - now for m in self.mirrors if m.state == OPEN), default=0.0)
+        delay = max(self.retry_backoff * 2 ** attempt, reopen)
+        return delay if reopen <= self.retry_max_wait else None
+
+    def _launch(self, mirror: Mirror, send: Callable[[str], Awaitable[Any]]) -> asyncio.Task:
+        task = asyncio.ensure_future(self._attempt(mirror, send))
+        # Libera o slot mesmo se a task for cancelada antes de começar
+        task.add_done_callback(lambda t: self.release(mirror))
+        return task
+
+    async def _attempt(self, mirror: Mirror, send: Callable[[str], Awaitable[Any]]) -> Any:
+        t0 = time.monotonic()
+        try:
+            result = await send(mirror.url)
+        except asyncio.CancelledError:
+            # Perdedor de um hedge: não é falha do mirror
+            raise
+        except Exception as e:
+            if self.is_fault(e):
+                retry_after = self.retry_after_of(e)
+                mirror.record_failure(trip=retry_after is not None, retry_after=retry_after)
+            raise
+        else:
+            mirror.record_success(time.monotonic() - t0)
+            return result
+
+    async def run(self, send: Callable[[str], Awaitable[Any]]) -> Any:
+        """Executa `send(url)` no melhor mirror, com hedge, failover e espera por slot."""
+        tried = set()
+        pending: Dict[asyncio.Task, Mirror] = {}
+        last_error: Optional[BaseException] = None
+        launch = True
+        attempt = 0
+        slot_wait: Optional[asyncio.Task] = None
+        try:
+            while True:
+                if launch:
+                    if slot_wait is not None:
+                        slot_wait.cancel()
+                        slot_wait = None
+                    mirror = self.pick(exclude=tried)
+                    if mirror is not None:
+                        tried.add(mirror.url)
+                        pending[self._launch(mirror, send)] = mirror
+                    elif pending:
+                        # Hedge sem slot livre: espera o primário ou um slot, sem rearmar o timer
+                        slot_wait = asyncio.ensure_future(self._wait_for_slot())
+                    else:
+                        now = time.monotonic()
+                        if any(m.saturated(now) for m in self.mirrors if m.url not in tried):
+                            await self._wait_for_slot()
+                            continue
+                        delay = self._retry_delay(attempt) if attempt < self.retries else None
+                        if delay is None:
+                            if last_error is not None:
+                                raise last_error
+                            raise NoMirrorAvailable("Nenhum mirror Overpass disponível")
+                        logger.info(f"Sem mirror Overpass disponível; nova tentativa em {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        attempt += 1
+                        tried.clear()
+                        continue
+                launch = False
+
+                hedge = (slot_wait is None and self.hedge_after > 0 and len(pending) == 1
+                         and len(tried) < len(self.mirrors))
+                waits = list(pending) + ([slot_wait] if slot_wait is not None else [])
+                done, _ = await asyncio.wait(waits, timeout=self.hedge_after if hedge else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if slot_wait is not None and slot_wait in done:
+                    done.discard(slot_wait)
+                    slot_wait = None
+                    launch = True  # slot liberado: tenta o hedge de novo
+                if not done:
+                    if not launch:
+                        logger.info(f"Overpass lento em {next(iter(pending.values())).url}; disparando hedge")
+                        launch = True
+                    continue
+                for task in done:
+                    pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    if not self.is_fault(error):
+                        raise error
+                    last_error = error
+                # Failover: só dispara outro mirror se nenhum estiver em andamento
+                launch = not pending
+        finally:
+            for task in pending:
+                task.cancel()
+            if slot_wait is not None:
+                slot_wait.cancel()
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [m.status() for m in self.mirrors]
@@ -0,0 +1,166 @@
+"""
+Conjunto de pontos em arrays (lon/lat, ids, colunas de tags) para o caminho
+quente das features, no lugar de GeoDataFrames.
+
+Um PointSet não cria objetos shapely nem passa pelo pyproj: as coordenadas
+vêm direto de OSMColumns e a projeção métrica (LocalMetric) e o KD-tree são
+calculados sob demanda, uma vez por conjunto. Os subconjuntos (máscara,
+índices ou fatia) reaproveitam a métrica e as coordenadas já projetadas do
+pai; fatias são views sem cópia e as colunas categóricas compartilham o
+dicionário de valores. Para o que precisar de geometria, use
+to_geodataframe().
+
+A interface imita o necessário de um GeoDataFrame (len, empty, columns,
+frame[chave], frame[máscara], take), então features.py e tag_index aceitam
+os dois tipos.
+"""
+from typing import Dict, Iterable, List, Optional, Union
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from .osm_columns import KIND_OTHER, OSMColumns
+from .points_engine import LocalMetric, PointsIndex, gdf_lonlat
+from .tag_index import INDEXED_KEYS, tag_columns, tag_columns_from_dicts, tag_mask
+
+
+class PointSet:
+    """Pontos (lon, lat) com ids, colunas de tags/atributos e índice espacial preguiçoso."""
+
+    __slots__ = ("lon", "lat", "ids", "data", "_metric", "_xy", "_index", "__weakref__")
+
+    def __init__(self, lon, lat, ids=None, data: Optional[Dict] = None,
+                 metric: Optional[LocalMetric] = None, xy: Optional[np.ndarray] = None):
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.ids = np.asarray(ids, dtype=np.int64) if ids is not None else np.arange(len(self.lon), dtype=np.int64)
+        # chave -> pd.Categorical (tags) ou ndarray (atributos numéricos)
+        self.data = data or {}
+        self._metric = metric
+        self._xy = xy
+        self._index = None
+
+    @classmethod
+    def empty_set(cls) -> "PointSet":
+        return cls(np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def from_columns(cls, cols: OSMColumns, keys: Iterable[str] = INDEXED_KEYS) -> "PointSet":
+        """Direto das colunas do Overpass (ignora marcadores de conjunto)."""
+        if (cols.kind == KIND_OTHER).any():
+            cols = cols.take(cols.kind != KIND_OTHER)
+        return cls(cols.lon, cols.lat, cols.ids, tag_columns(cols, keys))
+
+    @classmethod
+    def from_gdf(cls, gdf: gpd.GeoDataFrame) -> "PointSet":
+        """De um GeoDataFrame (centroides para geometrias não pontuais)."""
+        lon, lat = gdf_lonlat(gdf)
+        data = {}
+        for name in gdf.columns:
+            if name == gdf.geometry.name:
+                continue
+            col = gdf[name]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                data[name] = col.array
+            elif pd.api.types.is_numeric_dtype(col.dtype):
+                data[name] = col.to_numpy()
+            elif name != "tags":
+                data[name] = pd.Categorical(col)
+        if "tags" in gdf.columns:
+            data.update(tag_columns_from_dicts(list(gdf["tags"])))
+        return cls(lon, lat, data=data)
+
+    @classmethod
+    def concat(cls, parts: List["PointSet"]) -> "PointSet":
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty_set()
+        if len(parts) == 1:
+            return parts[0]
+        n = [len(p) for p in parts]
+        data = {}
+        for key in dict.fromkeys(k for p in parts for k in p.data):
+            cols = [p.data.get(key) for p in parts]
+            if any(isinstance(c, np.ndarray) for c in cols):
+                data[key] = np.concatenate([np.asarray(c, dtype=np.float64) if c is not None else np.full(m, np.nan)
+                                            for c, m in zip(cols, n)])
+            else:
+                categories = pd.Index(sorted(set().union(*(c.categories for c in cols if c is not None))), dtype=object)
+                codes = [c.set_categories(categories).codes if c is not None else np.full(m, -1, dtype=np.int8)
+                         for c, m in zip(cols, n)]
+                data[key] = pd.Categorical.from_codes(np.concatenate(codes), categories=categories)
+        return cls(np.concatenate([p.lon for p in parts]), np.concatenate([p.lat for p in parts]),
+                   np.concatenate([p.ids for p in parts]), data)
+
+    def __len__(self) -> int:
+        return len(self.lon)
+
+    @property
+    def empty(self) -> bool:
+        return len(self.lon) == 0
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.data)
+
+    @property
+    def metric(self) -> LocalMetric:
+        if self._metric is None:
+            self._metric = LocalMetric(float(self.lat.mean()) if len(self) else 0.0,
+                                       float(self.lon.mean()) if len(self) else 0.0)
+        return self._metric
+
+    @property
+    def xy(self) -> np.ndarray:
+        """Coordenadas projetadas (metros) na métrica do conjunto."""
+        if self._xy is None:
+            self._xy = self.metric.project(self.lon, self.lat)
+        return self._xy
+
+    @property
+    def spatial_index(self) -> PointsIndex:
+        """KD-tree do conjunto (usado por index_for)."""
+        if self._index is None:
+            self._index = PointsIndex.from_xy(self.xy, self.metric)
+        return self._index
+
+    def take(self, selector: Union[np.ndarray, slice, List[int]]) -> "PointSet":
+        """Subconjunto por máscara booleana, índices ou fatia (fatia = views sem cópia)."""
+        if not isinstance(selector, slice):
+            selector = np.asarray(selector)
+            if selector.dtype != bool:
+                selector = selector.astype(np.int64)
+        data = {k: v[selector] for k, v in self.data.items()}
+        return PointSet(self.lon[selector], self.lat[selector], self.ids[selector], data,
+                        metric=self._metric, xy=self._xy[selector] if self._xy is not None else None)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            col = self.data[key]
+            return pd.Series(col, copy=False)
+        return self.take(key)
+
+    def mask(self, key: str, values: Optional[Iterable[str]] = None) -> np.ndarray:
+        return tag_mask(self, key, values)
+
+    def within(self, geom) -> np.ndarray:
+        """Máscara dos pontos dentro do polígono (para várias camadas, use PolygonClip)."""
+        from .polygon_clip import PolygonClip
+        return PolygonClip(geom).mask(self)
+
+    def to_geodataframe(self) -> gpd.GeoDataFrame:
+        """GeoDataFrame equivalente (EPSG:4326), para APIs que exigem geometria."""
+        return gpd.GeoDataFrame(
+            {k: (v if isinstance(v, np.ndarray) else pd.Categorical(v)) for k, v in self.data.items()},
+            geometry=gpd.points_from_xy(self.lon, self.lat), crs="EPSG:4326",
+        )
+
+
+def as_point_set(obj) -> PointSet:
+    """Aceita PointSet, GeoDataFrame ou OSMColumns."""
+    if isinstance(obj, PointSet):
+        return obj
+    if isinstance(obj, OSMColumns):
+        return PointSet.from_columns(obj)
+    return PointSet.from_gdf(obj)
@@ -0,0 +1,221 @@
+"""
+Consultas de vizinhança sobre conjuntos de pontos (contagem por raio, vizinho
+mais próximo, KDE gaussiano truncado) com um KD-tree em métrica local.
+
+Os pontos são projetados uma única vez numa projeção equiretangular centrada
+na latitude média dos dados (metros reais, erro < 0,5% em escala urbana, ao
+contrário do Web Mercator, que infla distâncias por 1/cos(lat)). O índice de
+cada GeoDataFrame fica em cache enquanto o frame existir, então várias
+contagens sobre os mesmos dados não reprojetam nem reconstroem nada.
+"""
+import math
+import weakref
+from typing import Dict, Iterable, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from scipy import sparse
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_M = 6_371_008.8
+M_PER_DEG = math.pi / 180.0 * EARTH_RADIUS_M
+
+
+class LocalMetric:
+    """Projeção equiretangular local: (lon, lat) -> metros em torno de lat0."""
+
+    def __init__(self, lat0: float, lon0: float = 0.0):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self.kx = M_PER_DEG * math.cos(math.radians(lat0))
+
+    def project(self, lon, lat) -> np.ndarray:
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        return np.column_stack([(lon - self.lon0) * self.kx, (lat - self.lat0) * M_PER_DEG])
+
+    def unproject(self, xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Inverso de project: metros locais -> (lon, lat)."""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        return xy[:, 0] / self.kx + self.lon0, xy[:, 1] / M_PER_DEG + self.lat0
+
+
+class PointsIndex:
+    """KD-tree sobre pontos projetados em LocalMetric."""
+
+    def __init__(self, lon, lat, metric: Optional[LocalMetric] = None):
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        if metric is None:
+            lat0 = float(lat.mean()) if len(lat) else 0.0
+            lon0 = float(lon.mean()) if len(lon) else 0.0
+            metric = LocalMetric(lat0, lon0)
+        self.metric = metric
+        self.xy = metric.project(lon, lat)
+        self.tree = cKDTree(self.xy) if len(self.xy) else None
+
+    def __len__(self) -> int:
+        return len(self.xy)
+
+    @classmethod
+    def from_xy(cls, xy: np.ndarray, metric: LocalMetric) -> "PointsIndex":
+        """Índice sobre coordenadas já projetadas em `metric` (sem reprojetar)."""
+        index = cls.__new__(cls)
+        index.metric = metric
+        index.xy = xy
+        index.tree = cKDTree(xy) if len(xy) else None
+        return index
+
+    @classmethod
+    def from_gdf(cls, gdf: gpd.GeoDataFrame, metric: Optional[LocalMetric] = None) -> "PointsIndex":
+        lon, lat = gdf_lonlat(gdf)
+        return cls(lon, lat, metric)
+
+    def count_within(self, lon, lat, radii: Iterable[float]) -> np.ndarray:
+        """
+        Contagens para vários pontos e raios numa chamada.
+
+        Returns:
+            array int (n_pontos, n_raios)
+        """
+        q = self.metric.project(np.atleast_1d(lon), np.atleast_1d(lat))
+        radii = list(radii)
+        out = np.zeros((len(q), len(radii)), dtype=np.int64)
+        if self.tree is None:
+            return out
+        for j, r in enumerate(radii):
+            out[:, j] = self.tree.query_ball_point(q, r, return_length=True)
+        return out
+
+    def indices_within(self, lon: float, lat: float, radius: float) -> np.ndarray:
+        if self.tree is None:
+            return np.zeros(0, dtype=np.int64)
+        q = self.metric.project([lon], [lat])[0]
+        return np.asarray(sorted(self.tree.query_ball_point(q, radius)), dtype=np.int64)
+
+    def kde(self, lon, lat, bandwidth_m: float, weights=None, cutoff: float = 4.0) -> np.ndarray:
+        """
+        Soma de kernels gaussianos exp(-d²/2σ²) em cada ponto de consulta.
+
+        Só pares a menos de `cutoff`·σ entram na soma (o resto contribui
+        menos de exp(-cutoff²/2)); `weights` pondera cada ponto do índice.
+        """
+        q = self.metric.project(np.atleast_1d(lon), np.atleast_1d(lat))
+        out = np.zeros(len(q))
+        if self.tree is None or len(q) == 0:
+            return out
+        pairs = cKDTree(q).sparse_distance_matrix(self.tree, cutoff * bandwidth_m, output_type="ndarray")
+        if len(pairs) == 0:
+            return out
+        vals = np.exp(-(pairs["v"] ** 2) / (2.0 * bandwidth_m ** 2))
+        if weights is not None:
+            vals *= np.broadcast_to(np.asarray(weights, dtype=np.float64), (len(self),))[pairs["j"]]
+        return np.bincount(pairs["i"], weights=vals, minlength=len(q))
+
+    def column_sums(self, lon, lat, columns: np.ndarray, radius: float = None,
+                    bandwidth_m: float = None, cutoff: float = 4.0) -> np.ndarray:
+        """
+        Somas de várias colunas por ponto do índice (ex.: pertinência a cada
+        tipo de negócio) sobre a vizinhança de cada consulta, numa única
+        passada: com `radius`, soma simples dos vizinhos a até `radius` metros
+        (como count_within); com `bandwidth_m`, soma ponderada pelo kernel
+        gaussiano truncado (como kde).
+
+        Returns:
+            array (n_pontos, n_colunas)
+        """
+        columns = np.asarray(columns, dtype=np.float64).reshape(len(self), -1)
+        q = self.metric.project(np.atleast_1d(lon), np.atleast_1d(lat))
+        if self.tree is None or len(q) == 0:
+            return np.zeros((len(q), columns.shape[1]))
+        reach = radius if bandwidth_m is None else cutoff * bandwidth_m
+        pairs = cKDTree(q).sparse_distance_matrix(self.tree, reach, output_type="ndarray")
+        vals = (np.ones(len(pairs)) if bandwidth_m is None
+                else np.exp(-(pairs["v"] ** 2) / (2.0 * bandwidth_m ** 2)))
+        weights = sparse.csr_matrix((vals, (pairs["i"], pairs["j"])), shape=(len(q), len(self)))
+        return np.asarray(weights @ columns)
+
+    def ring_profile(self, lon, lat, rings: Iterable[float], decay_m: float = 250.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Contagens e somas com decaimento exp(-d/decay_m) para vários anéis
+        cumulativos (d <= raio) numa única passada.
+
+        Uma consulta ao raio máximo gera os pares (ponto, vizinho, d); cada
+        distância cai no primeiro anel que a contém (searchsorted nos raios
+        ordenados) e a soma acumulada por anel dá todos os raios de uma vez.
+
+        Returns:
+            (contagens, somas com decaimento), arrays (n_pontos, n_anéis) na ordem de `rings`
+        """
+        q = self.metric.project(np.atleast_1d(lon), np.atleast_1d(lat))
+        rings = np.asarray(list(rings), dtype=np.float64)
+        order = np.argsort(rings)  # colunas acumuladas em ordem crescente de raio
+        counts = np.zeros((len(q), len(rings)))
+        decayed = np.zeros((len(q), len(rings)))
+        if self.tree is None or len(q) == 0 or len(rings) == 0:
+            return counts.astype(np.int64), decayed
+        i, d = self._pairs_within(q, float(rings.max()))
+        if len(d):
+            bucket = np.searchsorted(rings[order], d, side="left")
+            flat = i * len(rings) + bucket
+            size = len(q) * len(rings)
+            counts += np.bincount(flat, minlength=size).reshape(len(q), len(rings))
+            decayed += np.bincount(flat, weights=np.exp(-d / decay_m), minlength=size).reshape(len(q), len(rings))
+        counts = np.cumsum(counts, axis=1)
+        decayed = np.cumsum(decayed, axis=1)
+        inverse = np.argsort(order)
+        return counts[:, inverse].astype(np.int64), decayed[:, inverse]
+
+    def _pairs_within(self, q: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(índice da consulta, distância) de todos os pares a até `radius` metros."""
+        if len(q) == 1:
+            # um ponto: consulta direta ao KD-tree, sem montar a árvore das consultas
+            j = np.asarray(self.tree.query_ball_point(q[0], radius), dtype=np.int64)
+            return np.zeros(len(j), dtype=np.int64), np.hypot(*(self.xy[j] - q[0]).T)
+        pairs = cKDTree(q).sparse_distance_matrix(self.tree, radius, output_type="ndarray")
+        return pairs["i"].astype(np.int64), pairs["v"]
+
+    def nearest(self, lon, lat) -> np.ndarray:
+        """Distância (m) ao ponto mais próximo; inf se o índice estiver vazio."""
+        q = self.metric.project(np.atleast_1d(lon), np.atleast_1d(lat))
+        if self.tree is None:
+            return np.full(len(q), np.inf)
+        d, _ = self.tree.query(q, k=1)
+        return d
+
+
+def gdf_lonlat(gdf: gpd.GeoDataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordenadas (lon, lat) dos pontos (centroide para outras geometrias)."""
+    if gdf.empty:
+        return np.zeros(0), np.zeros(0)
+    geoms = gdf.geometry
+    if geoms.crs is not None and not geoms.crs.equals("EPSG:4326"):
+        geoms = geoms.to_crs(4326)
+    arr = np.asarray(geoms.values)
+    if not (shapely.get_type_id(arr) == 0).all():
+        arr = shapely.centroid(arr)
+    return shapely.get_x(arr), shapely.get_y(arr)
+
+
+# id(frame) -> (weakref do frame, tamanho, índice)
+_INDEX_CACHE: Dict[int, Tuple[weakref.ref, int, PointsIndex]] = {}
+
+
+def index_for(gdf: gpd.GeoDataFrame) -> PointsIndex:
+    """Índice do frame, construído na primeira consulta e reutilizado nas seguintes."""
+    # PointSet (e afins) mantêm o próprio índice
+    own = getattr(gdf, "spatial_index", None)
+    if isinstance(own, PointsIndex):
+        return own
+    key = id(gdf)
+    entry = _INDEX_CACHE.get(key)
+    if entry is not None and entry[0]() is gdf and entry[1] == len(gdf):
+        return entry[2]
+    index = PointsIndex.from_gdf(gdf)
+    try:
+        ref = weakref.ref(gdf, lambda _, key=key: _INDEX_CACHE.pop(key, None))
+    except TypeError:
+        return index
+    _INDEX_CACHE[key] = (ref, len(gdf), index)
+    return index
@@ -0,0 +1,48 @@
+"""
+Recorte de conjuntos de pontos por polígono (Polygon/MultiPolygon).
+
+O polígono é preparado uma única vez (shapely.prepare) e reutilizado para
+todas as camadas. Para cada conjunto, os candidatos saem do bbox do polígono
+(pelo KD-tree do conjunto, quando já existe, ou por comparação vetorizada das
+coordenadas) e só eles passam pelo ponto-em-polígono vetorizado
+(shapely.contains_xy) sobre os arrays lon/lat, sem criar geometrias.
+"""
+import numpy as np
+import shapely
+
+from .point_set import PointSet, as_point_set
+
+
+class PolygonClip:
+    """Polígono preparado + bbox, aplicável a vários PointSets."""
+
+    def __init__(self, geom):
+        self.geom = geom
+        shapely.prepare(self.geom)
+        self.bounds = geom.bounds  # (minx, miny, maxx, maxy)
+
+    def _candidates(self, points: PointSet) -> np.ndarray:
+        W, S, E, N = self.bounds
+        index = points._index
+        if index is not None and index.tree is not None:
+            # Círculo que envolve o bbox no KD-tree, depois o bbox exato
+            corners = index.metric.project([W, E, W, E], [S, S, N, N])
+            center = corners.mean(axis=0)
+            radius = float(np.max(np.hypot(*(corners - center).T)))
+            idx = np.asarray(index.tree.query_ball_point(center, radius * (1 + 1e-9)), dtype=np.int64)
+            lon, lat = points.lon[idx], points.lat[idx]
+            return idx[(lon >= W) & (lon <= E) & (lat >= S) & (lat <= N)]
+        return np.flatnonzero((points.lon >= W) & (points.lon <= E) & (points.lat >= S) & (points.lat <= N))
+
+    def mask(self, points) -> np.ndarray:
+        """Máscara booleana dos pontos dentro do polígono (borda excluída, como `within`)."""
+        points = as_point_set(points)
+        out = np.zeros(len(points), dtype=bool)
+        idx = self._candidates(points)
+        if len(idx):
+            out[idx] = shapely.contains_xy(self.geom, points.lon[idx], points.lat[idx])
+        return out
+
+    def clip(self, points) -> PointSet:
+        points = as_point_set(points)
+        return points.take(self.mask(points))
@@ -0,0 +1,163 @@
+"""
+KDE em grade (raster) para mapas de calor.
+
+As fontes são acumuladas numa grade regular (np.histogram2d) com margem de
+`cutoff`·σ em volta do bbox e convoluídas com um kernel gaussiano separável
+(scipy.ndimage.gaussian_filter, dois convolve1d). O resultado aproxima, em
+cada célula, a mesma soma exp(-d²/2σ²) de features.kde_values, mas o custo
+independe do número de pares fonte/célula.
+
+Com células maiores que σ/2 (bbox grande, resolução baixa) a convolução é
+feita numa grade subdividida e o resultado é a média de cada bloco: cada
+célula devolvida vale a densidade média na sua área, não o valor no centro.
+Se nem assim a grade couber em MAX_GRID_CELLS, usa-se a maior subdivisão
+que couber (aproximação mais grosseira).
+
+Formatos de saída: GeoJSON de pontos (centro das células, compatível com o
+heatmap do frontend), raster (float32 em base64 + transform) e PNG em tons de
+cinza.
+"""
+import base64
+import math
+import struct
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+from .points_engine import M_PER_DEG
+
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+# Célula mínima de σ/16: abaixo disso a grade só cresce (a margem tem cutoff·σ/célula
+# células de cada lado) sem detalhe a mais, e um bbox minúsculo estouraria a memória
+MIN_CELLS_PER_SIGMA = 16
+MAX_GRID_CELLS = 4_000_000
+# Célula máxima da convolução: σ/2; células pedidas maiores são subdivididas
+MAX_CELL_SIGMA = 0.5
+
+
+class DensityGrid:
+    """Valores (linhas de norte para sul) e georreferência da grade."""
+
+    __slots__ = ("values", "west", "north", "cell_lon", "cell_lat")
+
+    def __init__(self, values: np.ndarray, west: float, north: float, cell_lon: float, cell_lat: float):
+        self.values = values
+        self.west = west
+        self.north = north
+        self.cell_lon = cell_lon
+        self.cell_lat = cell_lat
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape
+
+    @property
+    def transform(self) -> List[float]:
+        """Affine no formato GDAL: (x0, dx, 0, y0, 0, -dy)."""
+        return [self.west, self.cell_lon, 0.0, self.north, 0.0, -self.cell_lat]
+
+    def cell_centers(self) -> Tuple[np.ndarray, np.ndarray]:
+        ny, nx = self.shape
+        lons = self.west + (np.arange(nx) + 0.5) * self.cell_lon
+        lats = self.north - (np.arange(ny) + 0.5) * self.cell_lat
+        return np.meshgrid(lons, lats)
+
+    def to_geojson(self, min_value: float = 0.0) -> Dict:
+        lons, lats = self.cell_centers()
+        mask = self.values >= min_value
+        feats = [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [x, y]}, "properties": {"value": v}}
+            for x, y, v in zip(lons[mask].tolist(), lats[mask].tolist(), self.values[mask].tolist())
+        ]
+        return {"type": "FeatureCollection", "features": feats}
+
+    def to_raster_payload(self) -> Dict:
+        ny, nx = self.shape
+        return {
+            "width": nx, "height": ny,
+            "transform": self.transform,
+            "bbox": [self.west, self.north - ny * self.cell_lat, self.west + nx * self.cell_lon, self.north],
+            "dtype": "float32", "encoding": "base64",
+            "max": float(self.values.max()) if self.values.size else 0.0,
+            "values": base64.b64encode(self.values.astype("<f4").tobytes()).decode("ascii"),
+        }
+
+    def to_png(self) -> bytes:
+        """PNG 8 bits em tons de cinza, normalizado pelo máximo da grade."""
+        vmax = float(self.values.max()) if self.values.size else 0.0
+        img = np.zeros(self.shape, dtype=np.uint8) if vmax <= 0 else \
+            np.clip(np.rint(self.values / vmax * 255.0), 0, 255).astype(np.uint8)
+        return _encode_png_gray(img)
+
+
+def density_grid(sources: Iterable[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]], bbox: BBox,
+                 bandwidth_m: float = 200.0, resolution: int = 50, cutoff: float = 4.0) -> DensityGrid:
+    """
+    Args:
+        sources: (lons, lats, pesos ou None) por fonte
+        bbox: (south, west, north, east)
+        resolution: células no lado maior do bbox (células ~quadradas em metros),
+            limitada a células de no mínimo bandwidth_m / MIN_CELLS_PER_SIGMA;
+            acima de bandwidth_m · MAX_CELL_SIGMA cada célula é a média da
+            densidade na sua área
+
+    Raises:
+        ValueError: bbox vazio/invertido ou grade acima de MAX_GRID_CELLS
+    """
+    S, W, N, E = bbox
+    if not (N > S and E > W):
+        raise ValueError(f"bbox vazio ou invertido: {bbox}")
+    kx = M_PER_DEG * math.cos(math.radians((S + N) / 2))
+    width_m, height_m = (E - W) * kx, (N - S) * M_PER_DEG
+    cell_m = max(max(width_m, height_m) / max(int(resolution), 1), bandwidth_m / MIN_CELLS_PER_SIGMA)
+    nx, ny = max(int(math.ceil(width_m / cell_m)), 1), max(int(math.ceil(height_m / cell_m)), 1)
+    cell_lon, cell_lat = cell_m / kx, cell_m / M_PER_DEG
+
+    # Margem para que fontes fora do bbox (até cutoff·σ) contribuam nas bordas
+    def padded(f: int) -> Tuple[int, int]:
+        pad = int(math.ceil(cutoff * bandwidth_m / (cell_m / f)))
+        return pad, (nx * f + 2 * pad) * (ny * f + 2 * pad)
+
+    sub = max(int(math.ceil(cell_m / (MAX_CELL_SIGMA * bandwidth_m))), 1)
+    while sub > 1 and padded(sub)[1] > MAX_GRID_CELLS:
+        sub -= 1
+    pad, total = padded(sub)
+    if total > MAX_GRID_CELLS:
+        raise ValueError(f"Grade de densidade grande demais: {nx + 2 * pad}x{ny + 2 * pad} células")
+    fine_m = cell_m / sub
+    x_edges = W + (np.arange(-pad, nx * sub + pad + 1)) * (cell_lon / sub)
+    y_edges = S + (np.arange(-pad, ny * sub + pad + 1)) * (cell_lat / sub)
+    counts = np.zeros((len(y_edges) - 1, len(x_edges) - 1))
+    for lons, lats, weights in sources:
+        if len(lons) == 0:
+            continue
+        h, _, _ = np.histogram2d(lats, lons, bins=[y_edges, x_edges], weights=weights)
+        counts += h
+
+    sigma = bandwidth_m / fine_m
+    # gaussian_filter normaliza o kernel (soma 1); o KDE usa pico 1 -> fator 2πσ²
+    smooth = gaussian_filter(counts, sigma=sigma, mode="constant", truncate=cutoff) * (2 * math.pi * sigma ** 2)
+    values = smooth[pad:pad + ny * sub, pad:pad + nx * sub]
+    if sub > 1:
+        values = values.reshape(ny, sub, nx, sub).mean(axis=(1, 3))
+    values = values[::-1]  # linhas de norte para sul
+    return DensityGrid(np.ascontiguousarray(values), W, S + ny * cell_lat, cell_lon, cell_lat)
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+
+def _encode_png_gray(img: np.ndarray) -> bytes:
+    h, w = img.shape
+    raw = np.zeros((h, w + 1), dtype=np.uint8)  # filtro 0 no início de cada linha
+    raw[:, 1:] = img
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 0, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)),
+        _png_chunk(b"IEND", b""),
+    ])
@@ -1,24 +1,131 @@
+"""
+Rate limit por usuário e contabilidade da cota diária do Overpass no Redis.
+
+- enforce_quota: janela deslizante (contador da janela atual + fração da
+  anterior) avaliada e incrementada num único script Lua, sem o pico de 2x
+  nas bordas da janela fixa.
+- inc_overpass_count: acumula as queries Overpass do request num contexto
+  local; o middleware grava tudo numa única chamada ao fim do request
+  (flush_overpass_usage). Fora de um request, grava na hora. Respostas em
+  streaming gravam o que consumirem depois do middleware (current_usage).
+"""
+import contextvars
+import logging
 import time
+from typing import Dict, Optional
+
 import redis
 from fastapi import HTTPException, status
 from .config import settings
+
+logger = logging.getLogger(__name__)
+
 r = redis.from_url(settings.REDIS_URL)
 
-def allow_request(key: str, limit: int, window_seconds: int = 60) -> bool:
-    now = int(time.time())
-    bucket = f"rate:{key}:{now // window_seconds}"
-    cnt = r.incr(bucket)
-    if cnt == 1:
-        r.expire(bucket, window_seconds)
-    return cnt <= limit
+# KEYS[1] = janela atual, KEYS[2] = janela anterior
+# ARGV = limite, duração da janela (ms), ms decorridos na janela atual
+_SLIDING_WINDOW = r.register_script("""
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local elapsed = tonumber(ARGV[3])
+local current = tonumber(redis.call('get', KEYS[1]) or '0')
+local previous = tonumber(redis.call('get', KEYS[2]) or '0')
+local used = previous * (window - elapsed) / window + current
+if used + 1 > limit then
+    return {0, math.max(0, math.floor(limit - used))}
+end
+redis.call('incr', KEYS[1])
+redis.call('pexpire', KEYS[1], window * 2)
+return {1, math.max(0, math.floor(limit - used - 1))}
+""")
+
+# KEYS = chaves diárias de cota; ARGV = incrementos (mesma ordem), TTL (s)
+_RECORD_USAGE = r.register_script("""
+local ttl = tonumber(ARGV[#ARGV])
+local totals = {}
+for i, key in ipairs(KEYS) do
+    totals[i] = redis.call('incrby', key, ARGV[i])
+    if totals[i] == tonumber(ARGV[i]) then
+        redis.call('expire', key, ttl)
+    end
+end
+return totals
+""")
+
+
+class RequestUsage:
+    """Estado do request corrente: resultado do rate limit e queries Overpass pendentes."""
+
+    def __init__(self):
+        self.limit: Optional[Dict[str, int]] = None
+        self.overpass: Dict[str, int] = {}
+
+
+_usage: contextvars.ContextVar[Optional[RequestUsage]] = contextvars.ContextVar("request_usage", default=None)
+
+
+def begin_request() -> RequestUsage:
+    usage = RequestUsage()
+    _usage.set(usage)
+    return usage
+
+
+def current_usage() -> Optional[RequestUsage]:
+    return _usage.get()
+
+
+def allow_request(key: str, limit: int, window_seconds: int = 60):
+    """Retorna (permitido, restantes, segundos até a janela virar)."""
+    now_ms = int(time.time() * 1000)
+    window_ms = window_seconds * 1000
+    idx = now_ms // window_ms
+    allowed, remaining = _SLIDING_WINDOW(
+        keys=[f"rate:{key}:{idx}", f"rate:{key}:{idx - 1}"],
+        args=[limit, window_ms, now_ms - idx * window_ms],
+    )
+    reset = ((idx + 1) * window_ms - now_ms + 999) // 1000
+    return bool(allowed), int(remaining), int(reset)
+
 
 def enforce_quota(user_key: str, limit_per_minute: int = 60):
-    if not allow_request(user_key, limit_per_minute, 60):
-        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded")
+    allowed, remaining, reset = allow_request(user_key, limit_per_minute, 60)
+    headers = {
+        "X-RateLimit-Limit": str(limit_per_minute),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+    }
+    usage = _usage.get()
+    if usage is not None:
+        usage.limit = headers
+    if not allowed:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Rate limit exceeded",
+                            headers={**headers, "Retry-After": str(reset)})
+
+
+def _day_key(user_key: str) -> str:
+    return f"quota:overpass:{user_key}:{time.strftime('%Y-%m-%d')}"
+
+
+def record_overpass_usage(counts: Dict[str, int]):
+    """Grava as contagens {usuário: queries} numa única chamada. Retorna os totais do dia."""
+    if not counts:
+        return {}
+    users = list(counts)
+    totals = _RECORD_USAGE(keys=[_day_key(u) for u in users], args=[counts[u] for u in users] + [86400])
+    return dict(zip(users, totals))
+
 
 def inc_overpass_count(user_key: str):
-    day_key = f"quota:overpass:{user_key}:{time.strftime('%Y-%m-%d')}"
-    total = r.incr(day_key)
-    if total == 1:
-        r.expire(day_key, 86400)
-    return total
+    usage = _usage.get()
+    if usage is None:
+        return record_overpass_usage({user_key: 1})[user_key]
+    usage.overpass[user_key] = usage.overpass.get(user_key, 0) + 1
+    return usage.overpass[user_key]
+
+
+def flush_overpass_usage(usage: RequestUsage):
+    try:
+        record_overpass_usage(usage.overpass)
+    except redis.RedisError as e:
+        logger.warning(f"Erro ao gravar cota Overpass: {e}")
+    usage.overpass = {}
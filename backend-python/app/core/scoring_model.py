@@ -1,5 +1,6 @@
-from typing import Dict, Tuple, List
-from .features import normalize
+import re
+from typing import Dict, Tuple, List, Optional
+import numpy as np
 
 WEIGHTS = {
     # EXISTENTES
@@ -149,28 +150,144 @@ CAPS = {
     "mix": 1.0,
 }
 
-def compute_score(business_type: str, raw_features: Dict[str, float]) -> Tuple[float, List[Dict], str]:
-    w = WEIGHTS[business_type]
-    feats_norm = {k: (raw_features.get(k, 0.0) if k == "mix" else normalize(raw_features.get(k, 0.0), CAPS.get(k, 1.0)))
-                  for k in set(CAPS.keys()) | set(raw_features.keys())}
-    contributions = []; total = 0.0
-    for k, weight in w.items():
-        v = feats_norm.get(k, 0.0)
-        contrib = v * weight
-        total += contrib
-        contributions.append({
+# Raio (m) em que cada cap de CAPS foi calibrado
+BASE_RADIUS = {
+    "competition": 500,
+    "offices": 500,
+    "schools": 500,
+    "parks": 500,
+    "transit": 300,
+}
+
+# Vetor de features padrão dos modelos ML (modelos treinados com DataFrame
+# guardam as próprias colunas em feature_names_in_, inclusive as de anéis)
+ML_FEATURES = ['competition', 'offices', 'schools', 'parks', 'transit', 'flow_kde', 'mix', 'street_centrality']
+
+RING_FEATURE = re.compile(r"^(?P<base>\w+?)_r(?P<radius>\d+)(?:_decay)?$")
+
+def cap_for(name: str) -> float:
+    """
+    Cap de normalização da feature. Features de anel ('offices_r1000',
+    'offices_r1000_decay') usam o cap da feature base escalado pela área do anel.
+    """
+    if name in CAPS:
+        return CAPS[name]
+    m = RING_FEATURE.match(name)
+    if m and m.group("base") in BASE_RADIUS:
+        scale = (int(m.group("radius")) / BASE_RADIUS[m.group("base")]) ** 2
+        return max(CAPS[m.group("base")] * scale, 1.0)
+    return 1.0
+
+class CompiledWeights:
+    """Pesos de um tipo de negócio compilados em arrays: features, pesos e caps de normalização."""
+
+    __slots__ = ("business_type", "items", "names", "weights", "caps")
+
+    def __init__(self, business_type: str, weights: Dict[str, float]):
+        self.business_type = business_type
+        self.items = tuple(weights.items())
+        self.names = [k for k, _ in self.items]
+        self.weights = np.array([w for _, w in self.items], dtype=np.float64)
+        self.caps = np.array([cap_for(k) for k in self.names], dtype=np.float64)
+
+
+_COMPILED: Dict[str, CompiledWeights] = {}
+
+def compiled_weights(business_type: str) -> CompiledWeights:
+    """CompiledWeights do tipo, recompilado só quando WEIGHTS[business_type] muda."""
+    weights = WEIGHTS[business_type]
+    compiled = _COMPILED.get(business_type)
+    if compiled is None or compiled.items != tuple(weights.items()):
+        compiled = _COMPILED[business_type] = CompiledWeights(business_type, weights)
+    return compiled
+
+def normalize_array(X: np.ndarray, caps: np.ndarray) -> np.ndarray:
+    """normalize vetorizado: valores não finitos viram 0, o resto é limitado ao cap e dividido por ele."""
+    with np.errstate(invalid="ignore"):
+        return np.where(np.isfinite(X), np.minimum(X, caps), 0.0) / caps
+
+
+class ScoreBatch:
+    """
+    Scores de N vetores de features de um tipo de negócio. Valores,
+    normalizações e contribuições ficam em arrays (N, n_pesos) na ordem de
+    WEIGHTS[tipo]; dicts de contribuição e explicações só são montados quando
+    pedidos.
+    """
+
+    __slots__ = ("business_type", "names", "weights", "values", "normalized", "contributions", "scores")
+
+    def __init__(self, compiled: CompiledWeights, values: np.ndarray):
+        self.business_type = compiled.business_type
+        self.names = compiled.names
+        self.weights = compiled.weights
+        self.values = values
+        self.normalized = normalize_array(values, compiled.caps)
+        self.contributions = self.normalized * compiled.weights
+        self.scores = np.clip((self.contributions.sum(axis=1) + 1) * 50, 0.0, 100.0)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def contribution_dicts(self, i: int) -> List[Dict]:
+        values, norm, contrib = self.values[i].tolist(), self.normalized[i].tolist(), self.contributions[i].tolist()
+        return [{
             "name": k,
-            "value": raw_features.get(k, 0.0),
-            "weight": weight,
-            "contribution": contrib,
-            "description": f"{k} (norm={v:.2f}) com peso {weight:+.2f}"
-        })
-    score = max(0.0, min(100.0, (total + 1) * 50))
-    
-    # Gerar explicação detalhada e contextualizada
-    explanation = generate_detailed_explanation(business_type, raw_features, contributions, score)
-    
-    return score, contributions, explanation
+            "value": values[j],
+            "weight": w,
+            "contribution": contrib[j],
+            "description": f"{k} (norm={norm[j]:.2f}) com peso {w:+.2f}"
+        } for j, (k, w) in enumerate(zip(self.names, self.weights.tolist()))]
+
+    def explanation(self, i: int, raw_features: Dict[str, float]) -> str:
+        return generate_detailed_explanation(self.business_type, raw_features, self.contribution_dicts(i),
+                                             self.scores[i].item())
+
+def score_columns(business_type: str, features: Dict[str, np.ndarray]) -> ScoreBatch:
+    """Scores de vários vetores de um tipo a partir de colunas {feature: array (N,)} (ausente = 0)."""
+    compiled = compiled_weights(business_type)
+    n = len(np.atleast_1d(next(iter(features.values())))) if features else 1
+    values = np.zeros((n, len(compiled.names)))
+    for j, k in enumerate(compiled.names):
+        if k in features:
+            values[:, j] = features[k]
+    return ScoreBatch(compiled, values)
+
+def score_rows(business_type: str, rows: List[Dict[str, float]]) -> ScoreBatch:
+    """Scores de vários vetores de um tipo a partir de dicts de features brutas."""
+    compiled = compiled_weights(business_type)
+    values = np.array([[row.get(k, 0.0) for k in compiled.names] for row in rows], dtype=np.float64)
+    return ScoreBatch(compiled, values.reshape(len(rows), len(compiled.names)))
+
+def score_matrix(business_types: List[str], features: Dict[str, np.ndarray]) -> np.ndarray:
+    """
+    Scores de vários pontos e tipos de negócio num único produto com a matriz
+    de pesos. Cada feature é um array (n_pontos,) comum a todos os tipos ou
+    (n_pontos, n_tipos) por tipo.
+
+    Returns:
+        scores (n_pontos, n_tipos) na ordem de `business_types`
+    """
+    compiled = [compiled_weights(b) for b in business_types]
+    names = list(dict.fromkeys(k for c in compiled for k in c.names))
+    col = {k: f for f, k in enumerate(names)}
+    W = np.zeros((len(business_types), len(names)))
+    for t, c in enumerate(compiled):
+        W[t, [col[k] for k in c.names]] = c.weights
+    n = len(np.atleast_1d(next(iter(features.values()))))
+    X = np.zeros((n, len(business_types), len(names)))
+    for f, k in enumerate(names):
+        v = np.asarray(features.get(k, 0.0), dtype=np.float64)
+        X[:, :, f] = v.reshape(n, -1) if v.ndim else v
+    X = normalize_array(X, np.array([cap_for(k) for k in names]))
+    return np.clip((np.einsum("ptf,tf->pt", X, W) + 1) * 50, 0.0, 100.0)
+
+def compute_score(business_type: str, raw_features: Dict[str, float],
+                  explain: bool = True) -> Tuple[float, List[Dict], Optional[str]]:
+    """Score de um vetor de features; a explicação só é gerada com explain=True."""
+    batch = score_rows(business_type, [raw_features])
+    explanation = batch.explanation(0, raw_features) if explain else None
+    return batch.scores[0].item(), batch.contribution_dicts(0), explanation
 
 
 def generate_detailed_explanation(business_type: str, raw_features: Dict[str, float], contributions: List[Dict], score: float) -> str:
@@ -226,48 +343,43 @@ def generate_detailed_explanation(business_type: str, raw_features: Dict[str, fl
     offices_count = int(raw_features.get('offices', 0))
     if offices_count > 0:
         if offices_count >= 50:
-            office_text = f"🏢 **Região Corporativa:** Mapeamos **{offices_count} escritórios** na área. Excelente para negócios que atendem público corporativo (horário comercial, almoço executivo, etc)."
+            paragraphs.append(f"🏢 **Região Corporativa:** Mapeamos **{offices_count} escritórios** na área. Excelente para negócios que atendem público corporativo (horário comercial, almoço executivo, etc).")
         elif offices_count >= 20:
-            office_text = f"🏢 **Presença Corporativa:** **{offices_count} escritórios** identificados, gerando fluxo de profissionais durante horário comercial."
+            paragraphs.append(f"🏢 **Presença Corporativa:** **{offices_count} escritórios** identificados, gerando fluxo de profissionais durante horário comercial.")
         elif offices_count >= 5:
-            office_text = f"🏢 **Alguns Escritórios:** **{offices_count} escritórios** na região, oferecendo algum potencial de clientes corporativos."
+            paragraphs.append(f"🏢 **Alguns Escritórios:** **{offices_count} escritórios** na região, oferecendo algum potencial de clientes corporativos.")
     
     # Análise de escolas (fluxo familiar)
     schools_count = int(raw_features.get('schools', 0))
     if schools_count > 0:
         if schools_count >= 10:
-            school_text = f"🏫 **Muitas Escolas:** Há **{schools_count} instituições de ensino** próximas, gerando fluxo constante de famílias e estudantes nos horários de entrada/saída."
+            paragraphs.append(f"🏫 **Muitas Escolas:** Há **{schools_count} instituições de ensino** próximas, gerando fluxo constante de famílias e estudantes nos horários de entrada/saída.")
         elif schools_count >= 5:
-            school_text = f"🏫 **Presença de Escolas:** **{schools_count} escolas** na área, trazendo movimento familiar para a região."
+            paragraphs.append(f"🏫 **Presença de Escolas:** **{schools_count} escolas** na área, trazendo movimento familiar para a região.")
         elif schools_count >= 2:
-            school_text = f"🏫 **Algumas Escolas:** **{schools_count} escolas** identificadas, com potencial de fluxo nos horários escolares."
+            paragraphs.append(f"🏫 **Algumas Escolas:** **{schools_count} escolas** identificadas, com potencial de fluxo nos horários escolares.")
     
     # Análise de parques (lazer e bem-estar)
     parks_count = int(raw_features.get('parks', 0))
     if parks_count > 0:
         if parks_count >= 5:
-            park_text = f"🌳 **Área Verde:** A região possui **{parks_count} parques e áreas verdes**, indicando área com foco em qualidade de vida e lazer."
+            paragraphs.append(f"🌳 **Área Verde:** A região possui **{parks_count} parques e áreas verdes**, indicando área com foco em qualidade de vida e lazer.")
         elif parks_count >= 2:
-            park_text = f"🌳 **Espaços Verdes:** **{parks_count} áreas verdes** próximas, agregando valor à localização."
+            paragraphs.append(f"🌳 **Espaços Verdes:** **{parks_count} áreas verdes** próximas, agregando valor à localização.")
     
     # Análise de mix (diversidade)
     mix_score = raw_features.get('mix', 0)
     if mix_score > 0.7:
-        mix_text = f"🎨 **Alta Diversidade:** A região tem grande variedade de estabelecimentos e serviços (mix score: {mix_score:.2f}), indicando área comercial consolidada e movimentada."
+        paragraphs.append(f"🎨 **Alta Diversidade:** A região tem grande variedade de estabelecimentos e serviços (mix score: {mix_score:.2f}), indicando área comercial consolidada e movimentada.")
     elif mix_score > 0.4:
-        mix_text = f"🎨 **Boa Diversidade:** Variedade moderada de comércios e serviços (mix score: {mix_score:.2f}), caracterizando área comercial em desenvolvimento."
+        paragraphs.append(f"🎨 **Boa Diversidade:** Variedade moderada de comércios e serviços (mix score: {mix_score:.2f}), caracterizando área comercial em desenvolvimento.")
     
     # Análise de fluxo (KDE)
     flow_score = raw_features.get('flow_kde', 0)
     if flow_score > 50:
-        flow_text = f"👥 **Alto Fluxo de Pessoas:** A análise de densidade indica movimento intenso de pedestres na área (score: {flow_score:.0f}), sugerindo boa visibilidade e tráfego de potenciais clientes."
+        paragraphs.append(f"👥 **Alto Fluxo de Pessoas:** A análise de densidade indica movimento intenso de pedestres na área (score: {flow_score:.0f}), sugerindo boa visibilidade e tráfego de potenciais clientes.")
     elif flow_score > 20:
-        flow_text = f"👥 **Fluxo Moderado:** Movimento médio de pessoas detectado (score: {flow_score:.0f}), com potencial de visibilidade."
-    
-    # Adicionar textos gerados ao relatório
-    for text_var in ['comp_text', 'transit_text', 'office_text', 'school_text', 'park_text', 'mix_text', 'flow_text']:
-        if text_var in locals():
-            paragraphs.append(locals()[text_var])
+        paragraphs.append(f"👥 **Fluxo Moderado:** Movimento médio de pessoas detectado (score: {flow_score:.0f}), com potencial de visibilidade.")
     
     # Conclusão com recomendação
     top_factors = sorted(contributions, key=lambda c: abs(c["contribution"]), reverse=True)[:3]
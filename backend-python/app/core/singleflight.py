@@ -0,0 +1,130 @@
+"""
+Single-flight: chamadas idênticas e simultâneas compartilham uma única execução.
+
+Dentro do processo, a primeira chamada para uma chave dispara a execução numa
+task própria e todas as chamadas (inclusive a primeira) aguardam essa task
+via shield: se o cliente de quem disparou desconecta, o cancelamento não se
+propaga para a execução nem para os demais. Entre workers, o líder é eleito com um lock no Redis
+(SET NX PX) e publica o resultado numa chave de curta duração que os outros
+workers acompanham. Se o Redis estiver indisponível, ou o líder falhar, cada
+processo executa a chamada por conta própria.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import redis
+
+from .cache import encode_value, decode_value
+from .config import settings
+from .osm_columns import OSMColumns
+
+logger = logging.getLogger(__name__)
+
+# Remove o lock apenas se ele ainda pertencer ao líder que o criou
+_RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    def __init__(self, redis_client: Optional[redis.Redis] = None, namespace: str = "sf",
+                 lock_ttl_ms: int = 200_000, result_ttl_ms: int = 30_000, poll_interval: float = 0.1,
+                 encode: Callable[[Any], bytes] = lambda v: json.dumps(v, ensure_ascii=False).encode("utf-8"),
+                 decode: Callable[[bytes], Any] = lambda b: json.loads(b)):
+        self.r = redis_client
+        self.namespace = namespace
+        self.lock_ttl_ms = lock_ttl_ms
+        self.result_ttl_ms = result_ttl_ms
+        self.poll_interval = poll_interval
+        self.encode = encode
+        self.decode = decode
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Executa `fn` uma única vez por chave entre chamadas concorrentes."""
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(self._run_shared(key, fn))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Evita "Task exception was never retrieved" quando todos desistiram
+            task.exception()
+
+    async def _run_shared(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if self.r is None:
+            return await fn()
+        lock_key = f"{self.namespace}:lock:{key}"
+        result_key = f"{self.namespace}:result:{key}"
+        token = uuid.uuid4().hex
+        try:
+            cached = self.r.get(result_key)
+            if cached is not None:
+                return self.decode(cached)
+            leader = bool(self.r.set(lock_key, token, nx=True, px=self.lock_ttl_ms))
+        except redis.RedisError as e:
+            logger.debug(f"Single-flight sem Redis ({e}); executando localmente")
+            return await fn()
+
+        if not leader:
+            found, value = await self._wait_for_leader(lock_key, result_key)
+            if found:
+                return value
+            return await fn()
+
+        try:
+            result = await fn()
+            try:
+                self.r.set(result_key, self.encode(result), px=self.result_ttl_ms)
+            except redis.RedisError as e:
+                logger.warning(f"Erro ao publicar resultado single-flight: {e}")
+            return result
+        finally:
+            try:
+                self.r.eval(_RELEASE_LOCK, 1, lock_key, token)
+            except redis.RedisError:
+                pass
+
+    async def _wait_for_leader(self, lock_key: str, result_key: str):
+        deadline = time.monotonic() + self.lock_ttl_ms / 1000.0
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                pipe = self.r.pipeline()
+                pipe.get(result_key)
+                pipe.exists(lock_key)
+                value, lock_alive = pipe.execute()
+            except redis.RedisError:
+                return False, None
+            if value is not None:
+                return True, self.decode(value)
+            if not lock_alive:
+                # Líder terminou sem publicar (erro) ou expirou
+                return False, None
+        return False, None
+
+
+def _redis_or_none() -> Optional[redis.Redis]:
+    if not settings.SINGLEFLIGHT_REDIS:
+        return None
+    return redis.from_url(settings.REDIS_URL)
+
+
+overpass_flight = SingleFlight(_redis_or_none(), namespace="sf:overpass", encode=encode_value, decode=decode_value)
+overpass_columns_flight = SingleFlight(
+    _redis_or_none(), namespace="sf:overpass-cols",
+    encode=OSMColumns.to_bytes, decode=OSMColumns.from_bytes,
+)
@@ -0,0 +1,104 @@
+"""
+Busca dos melhores pontos de uma região para um tipo de negócio.
+
+1. Grade grossa (grid_m) dentro do polígono, com as features do /score
+   calculadas de uma vez (score_feature_matrix) e pontuadas pelo modelo de
+   pesos vetorizado (score_columns).
+2. Refinamento: em volta das melhores células, grade fina (grid_m /
+   REFINE_STEPS) limitada à célula e ao polígono, também numa única passada.
+3. Seleção gulosa por score com distância mínima entre os escolhidos.
+
+As camadas devem cobrir o polígono com margem (padded_bbox): as features de
+cada ponto usam os dados em volta dele, não só os de dentro do polígono.
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from .features import score_feature_matrix
+from .point_set import PointSet
+from .points_engine import LocalMetric
+from .polygon_clip import PolygonClip
+from .scoring_model import score_columns
+
+REFINE_STEPS = 4  # pontos da grade fina por lado de célula grossa
+
+
+def grid_points(geom, metric: LocalMetric, step_m: float) -> PointSet:
+    """Pontos de uma grade de `step_m` metros (centros de célula) dentro do polígono."""
+    W, S, E, N = geom.bounds
+    (x0, y0), (x1, y1) = metric.project([W, E], [S, N])
+    xs = np.arange(x0 + step_m / 2, x1, step_m)
+    ys = np.arange(y0 + step_m / 2, y1, step_m)
+    xx, yy = np.meshgrid(xs, ys)
+    lon, lat = metric.unproject(np.column_stack([xx.ravel(), yy.ravel()]))
+    points = PointSet(lon, lat, metric=metric)
+    return points.take(PolygonClip(geom).mask(points))
+
+
+def refine_points(geom, metric: LocalMetric, centers: PointSet, step_m: float) -> PointSet:
+    """Grade fina dentro de cada célula grossa de `centers` (lado `step_m`), recortada ao polígono."""
+    offsets = (np.arange(REFINE_STEPS) + 0.5) / REFINE_STEPS * step_m - step_m / 2
+    ox, oy = np.meshgrid(offsets, offsets)
+    xy = (metric.project(centers.lon, centers.lat)[:, None, :]
+          + np.stack([ox.ravel(), oy.ravel()], axis=1)[None]).reshape(-1, 2)
+    lon, lat = metric.unproject(xy)
+    points = PointSet(lon, lat, metric=metric)
+    return points.take(PolygonClip(geom).mask(points))
+
+
+def select_spaced(xy: np.ndarray, scores: np.ndarray, k: int, min_spacing_m: float) -> List[int]:
+    """Índices dos k melhores scores, ignorando os que ficam a menos de `min_spacing_m` de um já escolhido."""
+    chosen: List[int] = []
+    for i in np.argsort(-scores, kind="stable"):
+        if len(chosen) == k:
+            break
+        if chosen and np.min(np.hypot(*(xy[chosen] - xy[i]).T)) < min_spacing_m:
+            continue
+        chosen.append(int(i))
+    return chosen
+
+
+def search_sites(geom, business_type: str, comp: PointSet, poi: PointSet, transit: PointSet, k: int = 10,
+                 grid_m: float = 100.0, min_spacing_m: float = 200.0, refine_cells: int = None) -> Dict:
+    """
+    Top-k pontos do polígono para o tipo de negócio.
+
+    Returns:
+        {"candidates": [{lon, lat, score, features, contributions}], "evaluated": {"coarse", "refined"}}
+    """
+    center = geom.centroid
+    metric = LocalMetric(center.y, center.x)
+    coarse = grid_points(geom, metric, grid_m)
+    if coarse.empty:
+        # polígono menor que uma célula: avalia o centroide (ou um ponto interno)
+        inner = center if geom.contains(center) else geom.representative_point()
+        coarse = PointSet(np.array([inner.x]), np.array([inner.y]), metric=metric)
+
+    coarse_feats = score_feature_matrix(comp, poi, transit, coarse.lon, coarse.lat)
+    coarse_scores = score_columns(business_type, coarse_feats).scores
+
+    refine_cells = refine_cells or max(3 * k, 10)
+    best = np.argsort(-coarse_scores, kind="stable")[:refine_cells]
+    fine = refine_points(geom, metric, coarse.take(best), grid_m)
+
+    lon = np.concatenate([coarse.lon, fine.lon])
+    lat = np.concatenate([coarse.lat, fine.lat])
+    fine_feats = score_feature_matrix(comp, poi, transit, fine.lon, fine.lat) if len(fine) else \
+        {name: values[:0] for name, values in coarse_feats.items()}
+    feats = {name: np.concatenate([coarse_feats[name], fine_feats[name]]) for name in coarse_feats}
+    batch = score_columns(business_type, feats)
+
+    chosen = select_spaced(metric.project(lon, lat), batch.scores, k, min_spacing_m)
+    candidates = []
+    for rank, i in enumerate(chosen):
+        features = {name: values[i].item() for name, values in feats.items()}
+        candidates.append({
+            "rank": rank + 1,
+            "lon": float(lon[i]),
+            "lat": float(lat[i]),
+            "score": batch.scores[i].item(),
+            "features": {name: (v if np.isfinite(v) else None) for name, v in features.items()},
+            "contributions": batch.contribution_dicts(i),
+        })
+    return {"candidates": candidates, "evaluated": {"coarse": len(coarse), "refined": len(fine)}}
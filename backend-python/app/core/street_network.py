@@ -0,0 +1,279 @@
+"""
+Malha viária a partir do esqueleto de ways do Overpass, sem OSMnx.
+
+A query traz só ids de ways, listas de nós e coordenadas (`out skel`). O grau
+de cada nó sai de um bincount sobre as listas de nós: cada ocorrência no meio
+de uma way conta 2 (liga dois segmentos) e nas pontas conta 1. Nós com grau
+>= 3 são cruzamentos e nós com grau 1 são becos sem saída. Quadras (trechos
+entre nós de grau != 2) e seus comprimentos também saem de operações
+vetorizadas sobre os segmentos consecutivos (trechos de ways diferentes
+unidos por um nó de grau 2 são a mesma quadra).
+
+O esqueleto é guardado por tile na mesma tabela do cache de POIs
+(overpass_cache), com a mesma grade de OVERPASS_TILE_DEG.
+"""
+import io
+import logging
+import math
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .overpass_client import fetch_overpass
+from .points_engine import LocalMetric, PointsIndex
+from .tile_cache import BBox, Tile, load_blobs, store_blobs, tile_bbox, tile_key, tiles_envelope, tiles_for_bbox
+
+logger = logging.getLogger(__name__)
+
+# Vias que formam a malha de quarteirões (sem calçadas, serviços e trilhas)
+STREET_HIGHWAYS = (
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+    "residential", "living_street", "pedestrian", "road",
+)
+
+SKELETON_SIGNATURE = "streets-v1"
+SKELETON_MAGIC = b"STSK\x01"
+
+
+def build_skeleton_query(bbox: BBox) -> str:
+    S, W, N, E = bbox
+    pattern = "|".join(STREET_HIGHWAYS)
+    return f'''
+[out:json][timeout:180];
+way["highway"~"^({pattern})$"]({S},{W},{N},{E});
+out skel qt;
+>;
+out skel qt;
+'''
+
+
+class StreetSkeleton:
+    """Nós (ids ordenados + coordenadas) e ways em CSR (offsets + ids de nós)."""
+
+    __slots__ = ("node_ids", "lon", "lat", "way_ids", "way_offsets", "way_nodes")
+
+    def __init__(self, node_ids, lon, lat, way_ids, way_offsets, way_nodes):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.way_ids = np.asarray(way_ids, dtype=np.int64)
+        self.way_offsets = np.asarray(way_offsets, dtype=np.int64)
+        self.way_nodes = np.asarray(way_nodes, dtype=np.int64)
+
+    @property
+    def n_ways(self) -> int:
+        return len(self.way_ids)
+
+    @classmethod
+    def empty(cls) -> "StreetSkeleton":
+        return cls([], [], [], [], [0], [])
+
+    @classmethod
+    def from_overpass(cls, data: Dict) -> "StreetSkeleton":
+        node_ids, lon, lat = [], [], []
+        way_ids, way_offsets, way_nodes = [], [0], []
+        for el in data.get("elements", []):
+            if el.get("type") == "node" and el.get("lat") is not None:
+                node_ids.append(el["id"]); lon.append(el["lon"]); lat.append(el["lat"])
+            elif el.get("type") == "way" and len(el.get("nodes") or []) >= 2:
+                way_ids.append(el["id"])
+                way_nodes.extend(el["nodes"])
+                way_offsets.append(len(way_nodes))
+        return cls._sorted(node_ids, lon, lat, way_ids, way_offsets, way_nodes)
+
+    @classmethod
+    def _sorted(cls, node_ids, lon, lat, way_ids, way_offsets, way_nodes) -> "StreetSkeleton":
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        node_ids, first = np.unique(node_ids, return_index=True)
+        return cls(node_ids, np.asarray(lon, dtype=np.float64)[first], np.asarray(lat, dtype=np.float64)[first],
+                   way_ids, way_offsets, way_nodes)
+
+    def take_ways(self, keep: np.ndarray) -> "StreetSkeleton":
+        """Subconjunto de ways (máscara booleana), com apenas os nós que elas usam."""
+        keep = np.asarray(keep, dtype=bool)
+        lengths = np.diff(self.way_offsets)
+        offsets = np.concatenate([[0], np.cumsum(lengths[keep])])
+        way_nodes = self.way_nodes[np.repeat(keep, lengths)]
+        used = np.isin(self.node_ids, way_nodes)
+        return StreetSkeleton(self.node_ids[used], self.lon[used], self.lat[used],
+                              self.way_ids[keep], offsets, way_nodes)
+
+    def for_tile(self, tile: Tile, size: float = None) -> "StreetSkeleton":
+        """Ways com ao menos um nó no tile (inteiras, para não quebrar quadras na borda)."""
+        size = size or settings.OVERPASS_TILE_DEG
+        ix = np.floor(self.lon / size).astype(np.int64)
+        iy = np.floor(self.lat / size).astype(np.int64)
+        inside = self.node_ids[(ix == tile[0]) & (iy == tile[1])]
+        hit = np.isin(self.way_nodes, inside)
+        way_of = np.repeat(np.arange(self.n_ways), np.diff(self.way_offsets))
+        keep = np.zeros(self.n_ways, dtype=bool)
+        keep[way_of[hit]] = True
+        return self.take_ways(keep)
+
+    @classmethod
+    def concat(cls, parts: List["StreetSkeleton"]) -> "StreetSkeleton":
+        """Junta esqueletos (tiles vizinhos) removendo ways e nós repetidos."""
+        parts = [p for p in parts if p.n_ways]
+        if not parts:
+            return cls.empty()
+        way_ids = np.concatenate([p.way_ids for p in parts])
+        _, first = np.unique(way_ids, return_index=True)
+        keep = np.zeros(len(way_ids), dtype=bool)
+        keep[first] = True
+        lengths = np.concatenate([np.diff(p.way_offsets) for p in parts])
+        way_nodes = np.concatenate([p.way_nodes for p in parts])[np.repeat(keep, lengths)]
+        return cls._sorted(
+            np.concatenate([p.node_ids for p in parts]),
+            np.concatenate([p.lon for p in parts]),
+            np.concatenate([p.lat for p in parts]),
+            way_ids[keep], np.concatenate([[0], np.cumsum(lengths[keep])]), way_nodes,
+        )
+
+    def to_bytes(self) -> bytes:
+        buf = io.BytesIO()
+        np.savez_compressed(buf, **{name: getattr(self, name) for name in self.__slots__})
+        return SKELETON_MAGIC + buf.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "StreetSkeleton":
+        if not data.startswith(SKELETON_MAGIC):
+            raise ValueError("Formato binário de esqueleto viário desconhecido")
+        with np.load(io.BytesIO(data[len(SKELETON_MAGIC):])) as arrays:
+            return cls(*(arrays[name] for name in cls.__slots__))
+
+
+class StreetNetwork:
+    """Grau dos nós, cruzamentos, becos e quadras de um esqueleto viário."""
+
+    def __init__(self, skeleton: StreetSkeleton, metric: Optional[LocalMetric] = None):
+        self.skeleton = skeleton
+        sk = skeleton
+        if metric is None:
+            metric = LocalMetric(float(sk.lat.mean()) if len(sk.lat) else 0.0,
+                                 float(sk.lon.mean()) if len(sk.lon) else 0.0)
+        self.metric = metric
+
+        n_pos = len(sk.way_nodes)
+        is_first = np.zeros(n_pos, dtype=bool)
+        is_last = np.zeros(n_pos, dtype=bool)
+        if sk.n_ways:
+            is_first[sk.way_offsets[:-1]] = True
+            is_last[sk.way_offsets[1:] - 1] = True
+        pos = np.searchsorted(sk.node_ids, sk.way_nodes)
+        found = pos < len(sk.node_ids)
+        found[found] = sk.node_ids[pos[found]] == sk.way_nodes[found]
+
+        # Grau: 2 no meio da way, 1 em cada ponta
+        contrib = 2 - is_first.astype(np.int64) - is_last.astype(np.int64)
+        self.degree = np.bincount(pos[found], weights=contrib[found], minlength=len(sk.node_ids)).astype(np.int64)
+
+        # Segmentos consecutivos dentro da mesma way; quadra nova em cada nó de grau != 2
+        seg = np.flatnonzero(~is_last)
+        seg = seg[found[seg] & found[seg + 1]]
+        a, b = pos[seg], pos[seg + 1]
+        xy = metric.project(sk.lon, sk.lat)
+        seg_len = np.hypot(*(xy[b] - xy[a]).T) if len(seg) else np.zeros(0)
+        breaks = is_first[seg] | (self.degree[a] != 2)
+        breaks[1:] |= seg[1:] != seg[:-1] + 1  # nó ausente no meio da way
+        if len(breaks):
+            breaks[0] = True
+        piece = np.cumsum(breaks) - 1
+        n_pieces = int(piece[-1]) + 1 if len(piece) else 0
+        piece_len = np.bincount(piece, weights=seg_len, minlength=n_pieces)
+        piece_start = a[breaks]
+        piece_end = b[np.r_[np.flatnonzero(breaks)[1:] - 1, len(seg) - 1]] if n_pieces else np.zeros(0, dtype=np.int64)
+
+        # Trechos de ways diferentes que se encontram num nó de grau 2 (way
+        # dividida por mudança de tag) formam a mesma quadra
+        ends = np.concatenate([piece_start, piece_end])
+        owner = np.concatenate([np.arange(n_pieces), np.arange(n_pieces)])
+        joint = self.degree[ends] == 2
+        ends, owner = ends[joint], owner[joint]
+        order = np.argsort(ends, kind="stable")
+        ends, owner = ends[order], owner[order]
+        pair = np.flatnonzero(ends[1:] == ends[:-1])
+        links = coo_matrix((np.ones(len(pair)), (owner[pair], owner[pair + 1])), shape=(n_pieces, n_pieces))
+        _, block = connected_components(links, directed=False)
+        self.block_lengths = np.bincount(block, weights=piece_len) if n_pieces else np.zeros(0)
+        _, first_piece = np.unique(block, return_index=True)
+        start = piece_start[first_piece]
+
+        self.intersections = PointsIndex(sk.lon[self.degree >= 3], sk.lat[self.degree >= 3], metric)
+        self.dead_ends = PointsIndex(sk.lon[self.degree == 1], sk.lat[self.degree == 1], metric)
+        self.blocks = PointsIndex(sk.lon[start], sk.lat[start], metric)
+
+    def intersection_density(self, lons, lats, radius_m: float) -> np.ndarray:
+        """Cruzamentos (grau >= 3) por km² em volta de cada ponto."""
+        area_km2 = math.pi * radius_m ** 2 / 1_000_000
+        return self.intersections.count_within(lons, lats, [radius_m])[:, 0] / area_km2
+
+    def stats(self, lon: float, lat: float, radius_m: float) -> Dict[str, float]:
+        """Densidade de cruzamentos, proporção de becos e comprimento das quadras no raio."""
+        area_km2 = math.pi * radius_m ** 2 / 1_000_000
+        n_inter = int(self.intersections.count_within(lon, lat, [radius_m])[0, 0])
+        n_dead = int(self.dead_ends.count_within(lon, lat, [radius_m])[0, 0])
+        blocks = self.block_lengths[self.blocks.indices_within(lon, lat, radius_m)]
+        return {
+            "intersections": n_inter,
+            "intersection_density": n_inter / area_km2,
+            "dead_ends": n_dead,
+            "dead_end_ratio": n_dead / (n_inter + n_dead) if (n_inter + n_dead) else 0.0,
+            "blocks": int(len(blocks)),
+            "block_length_mean": float(blocks.mean()) if len(blocks) else 0.0,
+            "block_length_median": float(np.median(blocks)) if len(blocks) else 0.0,
+            "street_length_km": float(blocks.sum()) / 1000.0,
+        }
+
+
+async def fetch_street_skeleton(bbox: BBox, db: Optional[Session] = None,
+                                fetch: Callable[[str], Awaitable[Dict]] = fetch_overpass,
+                                size: float = None, ttl_seconds: int = None) -> StreetSkeleton:
+    """
+    Esqueleto viário do bbox usando o cache de tiles: só os tiles ausentes ou
+    expirados vão ao Overpass, numa única query sobre o envelope deles.
+    """
+    if db is None:
+        return StreetSkeleton.from_overpass(await fetch(build_skeleton_query(bbox)))
+
+    size = size or settings.OVERPASS_TILE_DEG
+    ttl_seconds = ttl_seconds or settings.OVERPASS_TILE_TTL
+    keys = {t: tile_key(SKELETON_SIGNATURE, t, size) for t in tiles_for_bbox(bbox, size)}
+
+    cached: Dict[str, bytes] = {}
+    try:
+        cached = load_blobs(db, list(keys.values()))
+    except Exception as e:
+        logger.warning(f"Erro ao ler cache do esqueleto viário: {e}")
+        db.rollback()
+
+    parts, missing = [], []
+    for t, key in keys.items():
+        if key in cached:
+            parts.append(StreetSkeleton.from_bytes(cached[key]))
+        else:
+            missing.append(t)
+
+    if missing:
+        fetched = StreetSkeleton.from_overpass(await fetch(build_skeleton_query(tiles_envelope(missing, size))))
+        to_store: Dict[str, Tuple[BBox, bytes]] = {}
+        for t in missing:
+            part = fetched.for_tile(t, size)
+            parts.append(part)
+            to_store[keys[t]] = (tile_bbox(t, size), part.to_bytes())
+        try:
+            store_blobs(db, to_store, ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Erro ao gravar cache do esqueleto viário: {e}")
+            db.rollback()
+
+    return StreetSkeleton.concat(parts)
+
+
+async def fetch_street_network(bbox: BBox, db: Optional[Session] = None,
+                               fetch: Callable[[str], Awaitable[Dict]] = fetch_overpass) -> StreetNetwork:
+    return StreetNetwork(await fetch_street_skeleton(bbox, db=db, fetch=fetch))
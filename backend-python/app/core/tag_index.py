@@ -0,0 +1,89 @@
+"""
+Índice de tags para GeoDataFrames de elementos OSM.
+
+Em vez de uma coluna de dicts, to_geodf cria uma coluna categórica por chave
+indexada (amenity, shop, office, ...): códigos inteiros + dicionário de
+valores. Filtrar por (chave, valores) vira uma comparação vetorizada de
+códigos (tag_mask), sem percorrer dicts em Python.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import overpass_client
+from .osm_columns import OSMColumns
+
+
+def keys_from_tag_lists() -> List[str]:
+    """Chaves OSM presentes em todas as listas *_TAGS do overpass_client."""
+    keys = set()
+    for name in dir(overpass_client):
+        if not (name.endswith("_TAGS") or "_TAGS_" in name):
+            continue
+        value = getattr(overpass_client, name)
+        for tags in (value.values() if isinstance(value, dict) else [value]):
+            keys.update(k for k, _ in tags)
+    return sorted(keys)
+
+
+# Chaves das listas de tags + as usadas diretamente pelas features
+INDEXED_KEYS = tuple(sorted(set(keys_from_tag_lists()) | {"sidewalk", "name", "lit", "building", "landuse"}))
+
+
+def tag_columns(cols: OSMColumns, keys: Iterable[str] = INDEXED_KEYS) -> Dict[str, pd.Categorical]:
+    """Colunas categóricas (uma por chave presente) direto do CSR de OSMColumns."""
+    out = {}
+    if len(cols.tag_keys) == 0:
+        return out
+    key_codes = {k: i for i, k in enumerate(cols.keys)}
+    rows = np.repeat(np.arange(len(cols), dtype=np.int64), np.diff(cols.tag_offsets))
+    for key in keys:
+        kc = key_codes.get(key)
+        if kc is None:
+            continue
+        hit = np.flatnonzero(cols.tag_keys == kc)
+        if len(hit) == 0:
+            continue
+        used, local = np.unique(cols.tag_vals[hit], return_inverse=True)
+        codes = np.full(len(cols), -1, dtype=np.int32)
+        codes[rows[hit]] = local
+        out[key] = pd.Categorical.from_codes(codes, categories=[cols.values[v] for v in used])
+    return out
+
+
+def tag_columns_from_dicts(tags: List[Dict[str, str]], keys: Iterable[str] = INDEXED_KEYS) -> Dict[str, pd.Categorical]:
+    out = {}
+    for key in keys:
+        values = [t.get(key) for t in tags]
+        if any(v is not None for v in values):
+            out[key] = pd.Categorical(values)
+    return out
+
+
+def tag_mask(gdf: pd.DataFrame, key: str, values: Optional[Iterable[str]] = None) -> np.ndarray:
+    """
+    Máscara dos elementos com a chave `key` (qualquer valor) ou com valor em
+    `values`. Aceita frames antigos com coluna 'tags' (dicts).
+    """
+    if isinstance(values, str):
+        values = [values]
+    if key in gdf.columns and key != getattr(gdf, "_geometry_column_name", None):
+        col = gdf[key]
+        mask = col.notna() if values is None else col.isin(list(values))
+        return np.asarray(mask, dtype=bool)
+    if "tags" in gdf.columns:
+        if values is None:
+            return np.asarray(gdf["tags"].apply(lambda t: key in t), dtype=bool)
+        values_set = set(values)
+        return np.asarray(gdf["tags"].apply(lambda t: t.get(key) in values_set), dtype=bool)
+    return np.zeros(len(gdf), dtype=bool)
+
+
+def tag_values(gdf: pd.DataFrame, key: str) -> pd.Series:
+    """Valores da chave como Series de objetos (None quando ausente)."""
+    if key in gdf.columns:
+        return gdf[key].astype(object).where(gdf[key].notna(), None)
+    if "tags" in gdf.columns:
+        return gdf["tags"].apply(lambda t: t.get(key))
+    return pd.Series([None] * len(gdf), index=gdf.index, dtype=object)
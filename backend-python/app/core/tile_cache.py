@@ -0,0 +1,230 @@
+"""
+Cache de resultados do Overpass em tiles alinhados a uma grade fixa (PostGIS).
+
+O bbox pedido é dividido em tiles de OVERPASS_TILE_DEG graus. Tiles presentes e
+válidos (expires_at no futuro) vêm da tabela overpass_cache; somente os tiles
+faltantes são buscados no Overpass, numa única query cobrindo o envelope deles
+(com vários conjuntos de tags, uma única query multi-conjunto), e gravados de
+volta por tile. Quando um extrato local (LocalExtractBackend) cobre o bbox, ele
+responde diretamente, sem cache nem rede.
+
+Toda busca com cache (acerto ou não) conta como demanda do bbox para o
+pré-aquecimento (demand.record_demand).
+"""
+import datetime
+import hashlib
+import json
+import logging
+import math
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from shapely.geometry import box
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from ..models.cache_entry import CacheEntry
+from .config import settings
+from .demand import record_demand
+from .osm_columns import OSMColumns
+from .osm_backend import RemoteOverpassBackend, get_local_backend
+from .overpass_client import BUSINESS_TAGS, build_query, fetch_overpass_columns
+
+logger = logging.getLogger(__name__)
+
+Tile = Tuple[int, int]
+BBox = Tuple[float, float, float, float]  # (south, west, north, east)
+
+
+def tags_signature(tags) -> str:
+    """Hash estável de uma lista de tags (independe da ordem)."""
+    payload = json.dumps(sorted([list(t) for t in tags], key=str), ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+_BUSINESS_BY_SIGNATURE = {tags_signature(tags): b for b, tags in BUSINESS_TAGS.items()}
+
+
+def business_types_of(tag_sets: Dict[str, List]) -> List[str]:
+    """Tipos de negócio cujas tags de concorrência aparecem entre os conjuntos."""
+    return sorted({_BUSINESS_BY_SIGNATURE[sig] for sig in map(tags_signature, tag_sets.values())
+                   if sig in _BUSINESS_BY_SIGNATURE})
+
+
+def tile_of(lon: float, lat: float, size: float = None) -> Tile:
+    size = size or settings.OVERPASS_TILE_DEG
+    return (math.floor(lon / size), math.floor(lat / size))
+
+
+def tiles_for_bbox(bbox: BBox, size: float = None) -> List[Tile]:
+    size = size or settings.OVERPASS_TILE_DEG
+    S, W, N, E = bbox
+    x0, y0 = tile_of(W, S, size)
+    x1, y1 = tile_of(E, N, size)
+    return [(ix, iy) for iy in range(y0, y1 + 1) for ix in range(x0, x1 + 1)]
+
+
+def tile_bbox(tile: Tile, size: float = None) -> BBox:
+    size = size or settings.OVERPASS_TILE_DEG
+    ix, iy = tile
+    return (iy * size, ix * size, (iy + 1) * size, (ix + 1) * size)
+
+
+def tiles_envelope(tiles: Iterable[Tile], size: float = None) -> BBox:
+    size = size or settings.OVERPASS_TILE_DEG
+    tiles = list(tiles)
+    xs = [t[0] for t in tiles]; ys = [t[1] for t in tiles]
+    return (min(ys) * size, min(xs) * size, (max(ys) + 1) * size, (max(xs) + 1) * size)
+
+
+def tile_key(signature: str, tile: Tile, size: float = None) -> str:
+    size = size or settings.OVERPASS_TILE_DEG
+    return f"ovp:{signature}:{size:g}:{tile[0]}:{tile[1]}"
+
+
+def bucket_columns(cols: OSMColumns, tiles: Iterable[Tile], size: float = None) -> Dict[Tile, OSMColumns]:
+    """Distribui elementos pelos tiles pedidos (descarta os que caem fora)."""
+    size = size or settings.OVERPASS_TILE_DEG
+    ix = np.floor(cols.lon / size).astype(np.int64)
+    iy = np.floor(cols.lat / size).astype(np.int64)
+    return {t: cols.take((ix == t[0]) & (iy == t[1])) for t in tiles}
+
+
+def clip_columns(cols: OSMColumns, bbox: BBox) -> OSMColumns:
+    """Mantém elementos cujo ponto representativo está no bbox, sem duplicatas."""
+    return cols.within_bbox(bbox).unique()
+
+
+def _load_rows(db: Session, keys: List[str]):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return db.execute(
+        select(CacheEntry.key, CacheEntry.blob, CacheEntry.payload)
+        .where(CacheEntry.key.in_(keys), CacheEntry.expires_at > now)
+    ).all()
+
+
+def _load_tiles(db: Session, keys: List[str]) -> Dict[str, OSMColumns]:
+    return {k: OSMColumns.from_bytes(bytes(b)) if b is not None else OSMColumns.from_payload(p)
+            for k, b, p in _load_rows(db, keys)}
+
+
+def load_blobs(db: Session, keys: List[str]) -> Dict[str, bytes]:
+    """Tiles válidos gravados como binário (store_blobs), por chave."""
+    return {k: bytes(b) for k, b, _ in _load_rows(db, keys) if b is not None}
+
+
+def _store_tiles(db: Session, entries: Dict[str, Tuple[BBox, OSMColumns]], ttl_seconds: int):
+    store_blobs(db, {key: (b, cols.to_bytes()) for key, (b, cols) in entries.items()}, ttl_seconds)
+
+
+def store_blobs(db: Session, entries: Dict[str, Tuple[BBox, bytes]], ttl_seconds: int):
+    """Grava (ou substitui) tiles binários na tabela overpass_cache."""
+    if not entries:
+        return
+    now = datetime.datetime.now(datetime.timezone.utc)
+    expires = now + datetime.timedelta(seconds=ttl_seconds)
+    rows = [{
+        "key": key,
+        "geom": f"SRID=4326;{box(b[1], b[0], b[3], b[2]).wkt}",
+        "payload": None,
+        "blob": blob,
+        "fetched_at": now,
+        "expires_at": expires,
+    } for key, (b, blob) in entries.items()]
+    stmt = insert(CacheEntry).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CacheEntry.key],
+        set_={"payload": stmt.excluded.payload, "blob": stmt.excluded.blob, "geom": stmt.excluded.geom,
+              "fetched_at": stmt.excluded.fetched_at, "expires_at": stmt.excluded.expires_at},
+    )
+    db.execute(stmt)
+    db.commit()
+
+
+async def fetch_tiled_many(bbox: BBox, tag_sets: Dict[str, List], db: Optional[Session] = None,
+                           fetch: Callable[[str], Awaitable[OSMColumns]] = fetch_overpass_columns,
+                           size: float = None, ttl_seconds: int = None,
+                           track_demand: bool = True) -> Dict[str, OSMColumns]:
+    """
+    Busca vários conjuntos de tags no mesmo bbox usando o cache de tiles.
+
+    Os tiles faltantes de todos os conjuntos são buscados numa única ida ao
+    Overpass (build_multi_query) e separados por conjunto antes de gravar.
+
+    Args:
+        bbox: (south, west, north, east)
+        tag_sets: {nome: lista de (key, value)} no formato de build_query
+        db: sessão SQLAlchemy; sem sessão a busca vai direto ao Overpass
+        fetch: função que executa a query (permite auditoria/quota no chamador)
+        track_demand: conta a busca na demanda do pré-aquecimento (desligar
+            no próprio warmer e em jobs offline)
+
+    Returns:
+        {nome: OSMColumns recortado ao bbox}
+    """
+    local = get_local_backend()
+    if local is not None and local.covers(bbox):
+        return await local.query_sets(bbox, tag_sets)
+    if db is not None and track_demand:
+        record_demand(bbox, business_types_of(tag_sets))
+
+    size = size or settings.OVERPASS_TILE_DEG
+    ttl_seconds = ttl_seconds or settings.OVERPASS_TILE_TTL
+    tiles = tiles_for_bbox(bbox, size)
+    keys = {name: {t: tile_key(tags_signature(tags), t, size) for t in tiles}
+            for name, tags in tag_sets.items()}
+
+    cached: Dict[str, OSMColumns] = {}
+    if db is not None:
+        try:
+            cached = _load_tiles(db, [k for per_set in keys.values() for k in per_set.values()])
+        except Exception as e:
+            logger.warning(f"Erro ao ler cache de tiles: {e}")
+            db.rollback()
+
+    parts: Dict[str, List[OSMColumns]] = {name: [] for name in tag_sets}
+    missing: Dict[str, List[Tile]] = {}
+    for name in tag_sets:
+        for t in tiles:
+            if keys[name][t] in cached:
+                parts[name].append(cached[keys[name][t]])
+            else:
+                missing.setdefault(name, []).append(t)
+
+    if missing:
+        logger.debug(f"Tiles Overpass faltando: { {n: len(ts) for n, ts in missing.items()} }")
+        envelope = tiles_envelope([t for ts in missing.values() for t in ts], size)
+        remote = RemoteOverpassBackend(fetch)
+        fetched = await remote.query_sets(envelope, {n: tag_sets[n] for n in missing})
+
+        to_store = {}
+        for name, ts in missing.items():
+            buckets = bucket_columns(fetched[name], ts, size)
+            for t, cols in buckets.items():
+                parts[name].append(cols)
+                to_store[keys[name][t]] = (tile_bbox(t, size), cols)
+        if db is not None:
+            try:
+                _store_tiles(db, to_store, ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Erro ao gravar cache de tiles: {e}")
+                db.rollback()
+
+    return {name: clip_columns(OSMColumns.concat(ps), bbox) for name, ps in parts.items()}
+
+
+async def fetch_tiled(bbox: BBox, tags, db: Optional[Session] = None,
+                      fetch: Callable[[str], Awaitable[OSMColumns]] = fetch_overpass_columns,
+                      size: float = None, ttl_seconds: int = None) -> OSMColumns:
+    """
+    Busca os elementos de `tags` no bbox usando o cache de tiles.
+
+    Returns:
+        OSMColumns recortado ao bbox
+    """
+    local = get_local_backend()
+    if db is None and (local is None or not local.covers(bbox)):
+        return clip_columns(await fetch(build_query(bbox, tags)), bbox)
+    result = await fetch_tiled_many(bbox, {"data": tags}, db=db, fetch=fetch, size=size, ttl_seconds=ttl_seconds)
+    return result["data"]
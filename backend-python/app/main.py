@@ -1,10 +1,16 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from .core.config import settings
 from .core.db import init_db
 from .api.v1.router import api_router
 from .core.metrics import setup_instrumentation
 from .core.gtfs import load_gtfs
+from .core.http_clients import close_clients
+from .core.osm_backend import get_local_backend
+from .core.rate_limit import begin_request, flush_overpass_usage
+from .core.cache_warmer import warm_loop
+from .ml.registry import get_model_registry
+import asyncio
 import os
 
 app = FastAPI(title="SiteScore AI", version="0.2.0")
@@ -20,11 +26,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_usage(request: Request, call_next):
+    # Cota Overpass do request gravada numa única chamada ao Redis, ao final
+    usage = begin_request()
+    try:
+        response = await call_next(request)
+    finally:
+        flush_overpass_usage(usage)
+    if usage.limit:
+        response.headers.update(usage.limit)
+    return response
+
 @app.on_event("startup")
 def on_startup():
     init_db()
     gtfs_path = os.getenv("GTFS_ZIP_PATH", "")
     if gtfs_path and os.path.exists(gtfs_path):
         load_gtfs(gtfs_path)
+    # Pré-carrega o extrato OSM local (se configurado) antes do primeiro request
+    get_local_backend()
+    # Modelos de ML desserializados uma vez por worker
+    get_model_registry().load_all()
+
+@app.on_event("startup")
+async def start_cache_warmer():
+    if settings.WARM_INTERVAL_SECONDS > 0:
+        app.state.warmer = asyncio.create_task(warm_loop(settings.WARM_INTERVAL_SECONDS))
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    warmer = getattr(app.state, "warmer", None)
+    if warmer is not None:
+        warmer.cancel()
+    await close_clients()
 
 app.include_router(api_router, prefix="/api/v1")
@@ -0,0 +1,214 @@
+"""
+Registro em memória dos modelos de ML do /score (app/models_store ou
+ML_MODELS_DIR).
+
+Cada modelo (<tipo>.joblib ou <tipo>_<segmento>.joblib) é desserializado uma
+vez por worker. A cada pedido o registro só confere o mtime/tamanho do
+arquivo, no máximo uma vez a cada ML_RELOAD_INTERVAL segundos, e recarrega
+quando o arquivo muda; se a nova versão falhar ao carregar, a anterior
+continua servindo; um arquivo inválido só é lido de novo quando muda.
+Segmentos fora de [A-Za-z0-9_-] (até 64 caracteres) são recusados antes de
+montar o caminho. predict aceita uma matriz de features (vários locais numa
+chamada ao modelo) e recusa linhas sem alguma coluna do modelo (ex.: anéis de
+um modelo treinado com --rings), para o chamador cair no modelo de pesos.
+"""
+import datetime
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+import time
+import warnings
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from ..core.config import settings
+from ..core.scoring_model import ML_FEATURES, RING_FEATURE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models_store")
+NAME_PART = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+# Nomes sem modelo lembrados para o throttle do stat (os mais antigos saem primeiro)
+MAX_UNLOADED = 1024
+
+
+def valid_segment(segment: Optional[str]) -> bool:
+    return not segment or bool(NAME_PART.match(segment))
+
+
+def model_name(business_type: str, segment: Optional[str] = None) -> str:
+    if not NAME_PART.match(business_type) or not valid_segment(segment):
+        raise ValueError(f"Nome de modelo inválido: {business_type!r}, {segment!r}")
+    return business_type if not segment else f"{business_type}_{segment}"
+
+
+class LoadedModel:
+    """Modelo carregado + identificação da versão (hash do arquivo) e colunas de entrada."""
+
+    __slots__ = ("name", "path", "model", "features", "rings", "mtime_ns", "size", "version", "loaded_at", "checked")
+
+    def __init__(self, name: str, path: str, model, stat: os.stat_result, version: str):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.features: List[str] = list(getattr(model, "feature_names_in_", ML_FEATURES))
+        # Raios (m) das colunas de anéis que o modelo espera; vazio se não usa anéis
+        self.rings: List[int] = sorted({int(m.group("radius")) for m in map(RING_FEATURE.match, self.features) if m})
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.version = version
+        self.loaded_at = datetime.datetime.now(datetime.timezone.utc)
+        self.checked = time.monotonic()
+
+    def missing_features(self, rows: List[Dict[str, float]]) -> List[str]:
+        return sorted({k for row in rows for k in self.features if k not in row})
+
+    def matrix(self, rows: List[Dict[str, float]]) -> np.ndarray:
+        return np.array([[row[k] for k in self.features] for row in rows], dtype=np.float64)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        with warnings.catch_warnings():
+            # modelos treinados com DataFrame avisam a cada predict com ndarray
+            warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            return np.clip(np.asarray(self.model.predict(X), dtype=np.float64), 0.0, 100.0)
+
+    def status(self) -> Dict:
+        return {
+            "version": self.version,
+            "file": os.path.basename(self.path),
+            "modified_at": datetime.datetime.fromtimestamp(self.mtime_ns / 1e9, datetime.timezone.utc).isoformat(),
+            "loaded_at": self.loaded_at.isoformat(),
+            "features": self.features,
+            "rings": self.rings,
+        }
+
+
+class ModelRegistry:
+    """Modelos por nome, carregados sob demanda e recarregados quando o arquivo muda."""
+
+    def __init__(self, models_dir: str, reload_interval: float = 2.0):
+        self.models_dir = models_dir
+        self.reload_interval = reload_interval
+        self._models: Dict[str, LoadedModel] = {}
+        self._unloaded: Dict[str, float] = {}  # nome -> último stat sem modelo (arquivo ausente ou inválido)
+        self._failed: Dict[str, Tuple[int, int]] = {}  # nome -> (mtime, tamanho) do arquivo que falhou
+        self._errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.models_dir, f"{name}.joblib")
+
+    def _mark_unloaded(self, name: str, now: float):
+        self._unloaded.pop(name, None)
+        self._unloaded[name] = now
+        if len(self._unloaded) > MAX_UNLOADED:
+            del self._unloaded[next(iter(self._unloaded))]
+
+    def get(self, business_type: str, segment: Optional[str] = None) -> Optional[LoadedModel]:
+        try:
+            name = model_name(business_type, segment)
+        except ValueError:
+            return None
+        now = time.monotonic()
+        entry = self._models.get(name)
+        if entry is not None and now - entry.checked < self.reload_interval:
+            return entry
+        if entry is None and now - self._unloaded.get(name, float("-inf")) < self.reload_interval:
+            return None
+        return self._refresh(name, now)
+
+    def _refresh(self, name: str, now: float) -> Optional[LoadedModel]:
+        path = self.path_for(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if self._models.pop(name, None) is not None:
+                logger.info(f"Modelo removido: {name}")
+            self._mark_unloaded(name, now)
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self._models.get(name)
+        if signature == self._failed.get(name) or (entry is not None and (entry.mtime_ns, entry.size) == signature):
+            # Mesmo arquivo de antes: não desserializa de novo (nem o inválido)
+            if entry is not None:
+                entry.checked = now
+            else:
+                self._mark_unloaded(name, now)
+            return entry
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is not None and (entry.mtime_ns, entry.size) == signature:
+                return entry
+            try:
+                with open(path, "rb") as f:
+                    raw = f.read()
+                version = hashlib.sha1(raw).hexdigest()[:12]
+                model = joblib.load(io.BytesIO(raw))
+            except Exception as e:
+                logger.warning(f"Erro ao carregar modelo {name}: {e}")
+                self._errors[name] = str(e)
+                self._failed[name] = signature
+                if entry is not None:
+                    entry.checked = now  # segue com a versão anterior
+                else:
+                    self._mark_unloaded(name, now)
+                return entry
+            loaded = LoadedModel(name, path, model, stat, version)
+            self._models[name] = loaded
+            self._unloaded.pop(name, None)
+            self._failed.pop(name, None)
+            self._errors.pop(name, None)
+            logger.info(f"Modelo carregado: {name} (versão {version})")
+            return loaded
+
+    def load_all(self) -> List[str]:
+        """Carrega todos os .joblib do diretório (ex.: na subida do worker)."""
+        try:
+            files = sorted(f for f in os.listdir(self.models_dir) if f.endswith(".joblib"))
+        except OSError:
+            return []
+        now = time.monotonic()
+        return [name for name in (f[:-len(".joblib")] for f in files) if self._refresh(name, now) is not None]
+
+    def predict(self, business_type: str, rows: List[Dict[str, float]],
+                segment: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Scores (0-100) de vários locais numa chamada ao modelo; None se não
+        houver modelo, se faltar alguma feature do modelo nas linhas ou se ele falhar.
+        """
+        entry = self.get(business_type, segment)
+        if entry is None or not rows:
+            return None
+        missing = entry.missing_features(rows)
+        if missing:
+            logger.warning(f"Modelo {entry.name} ignorado: features ausentes ({', '.join(missing[:5])})")
+            return None
+        try:
+            return entry.predict(entry.matrix(rows))
+        except Exception as e:
+            logger.warning(f"Erro no predict do modelo {entry.name}: {e}")
+            return None
+
+    def status(self) -> Dict:
+        return {
+            "models_dir": self.models_dir,
+            "loaded": {name: entry.status() for name, entry in sorted(self._models.items())},
+            "errors": dict(self._errors),
+        }
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def get_model_registry() -> ModelRegistry:
+    """Registro do worker, sobre ML_MODELS_DIR (ou app/models_store)."""
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(settings.ML_MODELS_DIR or DEFAULT_MODELS_DIR,
+                                  reload_interval=settings.ML_RELOAD_INTERVAL)
+    return _registry
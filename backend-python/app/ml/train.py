@@ -2,16 +2,20 @@ import argparse, os, joblib, pandas as pd
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import r2_score, mean_absolute_error
+from ..core.scoring_model import ML_FEATURES, RING_FEATURE
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument('--csv', required=True)
     ap.add_argument('--business_type', required=True, choices=['restaurante','academia','varejo_moda'])
     ap.add_argument('--segment', default=None)
+    ap.add_argument('--rings', action='store_true', help='inclui as colunas de anéis do CSV (ex.: offices_r1000, offices_r1000_decay)')
     ap.add_argument('--out', required=True)
     args = ap.parse_args()
     df = pd.read_csv(args.csv)
-    feats = ['competition','offices','schools','parks','transit','flow_kde','mix','street_centrality']
+    feats = list(ML_FEATURES)
+    if args.rings:
+        feats += [c for c in df.columns if RING_FEATURE.match(c)]
     X = df[feats]; y = df['target']
     Xtr, Xte, ytr, yte = train_test_split(X, y, test_size=0.2, random_state=42)
     model = GradientBoostingRegressor(random_state=42)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON
+from sqlalchemy import Column, Integer, String, DateTime, JSON, LargeBinary
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
 from .base import Base
@@ -8,6 +8,8 @@ class CacheEntry(Base):
     id = Column(Integer, primary_key=True, index=True)
     key = Column(String, index=True, unique=True, nullable=False)
     geom = Column(Geometry(geometry_type="GEOMETRY", srid=4326, spatial_index=True), nullable=False)
-    payload = Column(JSON, nullable=False)
+    # Entradas antigas: JSON; novas: OSMColumns.to_bytes() em `blob`
+    payload = Column(JSON, nullable=True)
+    blob = Column(LargeBinary, nullable=True)
     fetched_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     expires_at = Column(DateTime(timezone=True), nullable=False)
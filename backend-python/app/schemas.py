@@ -10,6 +10,21 @@ class ScoreRequest(BaseModel):
     business_type: str = Field(pattern="^(restaurante|academia|varejo_moda)$")
     name: Optional[str] = None
 
+class BatchScoreRequest(BaseModel):
+    sites: List[ScoreRequest] = Field(min_length=1)
+
+class BestBusinessRequest(BaseModel):
+    geometry: Geometry
+    business_types: Optional[List[str]] = None
+    top: Optional[int] = Field(default=None, ge=1)
+
+class SiteSearchRequest(BaseModel):
+    geometry: Geometry
+    business_type: str
+    k: int = Field(default=10, ge=1, le=50)
+    min_spacing_m: float = Field(default=200.0, ge=0)
+    grid_m: Optional[float] = Field(default=None, ge=25, le=1000)
+
 class FeatureContribution(BaseModel):
     name: str
     value: float
@@ -20,7 +35,7 @@ class FeatureContribution(BaseModel):
 class ScoreResponse(BaseModel):
     score: float
     features: List[FeatureContribution]
-    explanation: str
+    explanation: Optional[str] = None
     center: List[float]
     layer_refs: Dict[str, str]
 
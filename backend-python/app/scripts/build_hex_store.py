@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Pré-calcula as features do /score em grades hexagonais sobre o bbox de uma
+cidade e grava o store lido pelo /score (HEX_STORE_PATH).
+
+Uso:
+    python -m app.scripts.build_hex_store --bbox -46.83,-23.80,-46.36,-23.36 --out /data/hex_store
+
+Exemplo (cron semanal; o /score recarrega o store sozinho):
+    0 3 * * 0 cd /app && python -m app.scripts.build_hex_store --bbox W,S,E,N --out /data/hex_store
+"""
+import argparse
+import asyncio
+import logging
+import os
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.gtfs import GTFS, is_gtfs_available, load_gtfs
+from app.core.hex_store import build_hex_store
+from app.core.http_clients import close_clients
+from app.core.overpass_client import BUSINESS_TAGS
+
+
+async def run(args, bbox, sizes, business_types):
+    db = SessionLocal()
+    try:
+        transit = GTFS['points'] if is_gtfs_available() else None
+        return await build_hex_store(args.out, bbox, sizes, business_types, db=db, transit=transit)
+    finally:
+        db.close()
+        await close_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera o store de features em hexágonos')
+    parser.add_argument('--bbox', required=True, help='W,S,E,N (graus)')
+    parser.add_argument('--out', default=settings.HEX_STORE_PATH, help='Diretório do store')
+    parser.add_argument('--sizes', default=settings.HEX_STORE_SIZES, help='Tamanhos das células (m), separados por vírgula')
+    parser.add_argument('--business', default='', help='Tipos de negócio (padrão: todos)')
+    args = parser.parse_args()
+    if not args.out:
+        parser.error('--out ou HEX_STORE_PATH é obrigatório')
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+
+    W, S, E, N = (float(v) for v in args.bbox.split(','))
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+    business_types = [b for b in args.business.split(',') if b.strip()] or sorted(BUSINESS_TAGS)
+    unknown = set(business_types) - set(BUSINESS_TAGS)
+    if unknown:
+        parser.error(f"Tipos de negócio inválidos: {', '.join(sorted(unknown))}")
+    gtfs_path = os.getenv("GTFS_ZIP_PATH", "")
+    if gtfs_path and os.path.exists(gtfs_path):
+        load_gtfs(gtfs_path)
+
+    cells = asyncio.run(run(args, (S, W, N, E), sizes, business_types))
+    print(f"✅ Hex store gravado em {args.out} | células por tamanho: {cells}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Gera o extrato OSM colunar (.npz) usado pelo backend local (OSM_BACKEND=local).
+
+Lê um .osm.pbf (ex.: recorte do Geofabrik para o estado/cidade), mantém apenas
+elementos com as chaves usadas pelas listas de tags do SiteScore e grava as
+colunas com a área de cobertura.
+
+Uso:
+    python -m app.scripts.build_osm_extract --pbf sudeste-latest.osm.pbf --out sp.npz \\
+        --bbox -46.83,-24.01,-46.36,-23.36
+
+Requer o pacote opcional 'osmium' (pip install osmium).
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from app.core.osm_backend import read_pbf
+from app.core.tag_index import keys_from_tag_lists
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera extrato OSM colunar para o backend local')
+    parser.add_argument('--pbf', required=True, help='Arquivo .osm.pbf de entrada')
+    parser.add_argument('--out', required=True, help='Arquivo .npz de saída')
+    parser.add_argument('--bbox', help='Recorte W,S,E,N (padrão: extensão dos dados)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pbf):
+        print(f"❌ Arquivo não encontrado: {args.pbf}")
+        sys.exit(1)
+
+    keys = set(keys_from_tag_lists())
+    print(f"📦 Lendo {args.pbf} ({len(keys)} chaves de interesse)...")
+    cols = read_pbf(args.pbf, keys=keys)
+
+    bounds = None
+    if args.bbox:
+        W, S, E, N = [float(x) for x in args.bbox.split(",")]
+        bounds = (S, W, N, E)
+        cols = cols.within_bbox(bounds)
+    elif len(cols):
+        bounds = (float(np.min(cols.lat)), float(np.min(cols.lon)), float(np.max(cols.lat)), float(np.max(cols.lon)))
+
+    cols.save_npz(args.out, bounds=bounds)
+    print(f"✅ {len(cols)} elementos gravados em {args.out}")
+    print("\n📝 Configure OSM_BACKEND=local e OSM_EXTRACT_PATH no .env para usar o extrato")
+
+
+if __name__ == '__main__':
+    main()
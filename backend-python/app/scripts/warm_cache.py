@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Pré-aquece o cache de tiles do Overpass para as áreas mais demandadas
+(projetos salvos + consultas recentes ao cache de tiles).
+
+Uso:
+    python -m app.scripts.warm_cache --budget 50 --days 7
+
+Exemplo (cron, antes do horário comercial):
+    0 6 * * * cd /app && python -m app.scripts.warm_cache --budget 100 --features
+"""
+import argparse
+import asyncio
+import logging
+
+from app.core.cache_warmer import warm_cache
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.core.http_clients import close_clients
+
+
+async def run(args):
+    db = SessionLocal()
+    try:
+        return await warm_cache(db, budget=args.budget, lookback_days=args.days,
+                                max_areas=args.max_areas, features=args.features)
+    finally:
+        db.close()
+        await close_clients()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pré-aquece o cache Overpass')
+    parser.add_argument('--budget', type=int, default=settings.WARM_UPSTREAM_BUDGET, help='Máximo de queries upstream')
+    parser.add_argument('--days', type=int, default=settings.WARM_LOOKBACK_DAYS, help='Janela do histórico de consultas')
+    parser.add_argument('--max-areas', type=int, default=settings.WARM_MAX_AREAS, help='Máximo de áreas ranqueadas')
+    parser.add_argument('--features', action='store_true', help='Também aquece a centralidade de ruas (OSMnx)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+
+    stats = asyncio.run(run(args))
+    print(f"✅ Áreas aquecidas: {stats['areas']} | queries upstream: {stats['upstream']} | "
+          f"puladas (orçamento): {stats['skipped']} | erros: {stats['errors']}")
+
+
+if __name__ == '__main__':
+    main()
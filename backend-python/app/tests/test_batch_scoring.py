@@ -0,0 +1,82 @@
+import asyncio
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point, box
+
+from app.core.batch_scoring import BatchSite, fetch_group_layers, group_raw_features, group_sites
+from app.core.features import score_feature_matrix
+from app.core.osm_columns import OSMColumns
+from app.core.point_set import PointSet
+from app.core.polygon_clip import PolygonClip
+
+
+def _layers(seed=0):
+    rng = np.random.default_rng(seed)
+
+    def layer(n, key=None, values=None):
+        data = {key: pd.Categorical(rng.choice(values, n))} if key else {}
+        return PointSet(-46.67 + rng.random(n) * 0.06, -23.59 + rng.random(n) * 0.06, data=data)
+
+    comp = {"restaurante": layer(300), "academia": layer(80)}
+    poi = PointSet.concat([
+        layer(200, "office", ["company"]),
+        layer(80, "amenity", ["school", "university", "bank"]),
+        layer(60, "leisure", ["park", "pitch"]),
+    ])
+    return comp, poi, layer(120)
+
+
+def test_group_raw_features_match_single_site():
+    """Test that the vectorized batch features equal per-site score_feature_matrix (points and polygons)"""
+    comp, poi, transit = _layers()
+    sites = [
+        BatchSite(0, "restaurante", Point(-46.640, -23.560)),
+        BatchSite(1, "academia", Point(-46.630, -23.555)),
+        BatchSite(2, "restaurante", box(-46.650, -23.570, -46.635, -23.555)),
+        BatchSite(3, "academia", Point(-46.645, -23.565)),
+    ]
+    feats = group_raw_features(sites, comp, poi, transit)
+    assert len(feats) == len(sites)
+    for site, got in zip(sites, feats):
+        layers = (comp[site.business_type], poi, transit)
+        if not site.is_point:
+            clip = PolygonClip(site.geom)
+            layers = tuple(clip.clip(layer) for layer in layers)
+        expected = score_feature_matrix(*layers, site.center.x, site.center.y)
+        for name, values in expected.items():
+            assert got[name] == pytest.approx(values[0]), (site.index, name)
+
+
+def test_group_sites_by_cell_in_input_order():
+    """Test that nearby sites share a group and groups follow the first occurrence"""
+    sites = [BatchSite(i, "restaurante", Point(lon, lat)) for i, (lon, lat) in enumerate([
+        (-46.64, -23.56), (-43.205, -22.905), (-46.641, -23.561), (-43.215, -22.915),
+    ])]
+    groups = group_sites(sites, group_deg=0.05)
+    assert [[s.index for s in g] for g in groups] == [[0, 2], [1, 3]]
+
+
+def test_fetch_group_layers_one_query_per_group():
+    """Test that a group fetches all business types in one multi-set query"""
+    queries = []
+
+    async def fake_fetch(q):
+        queries.append(q)
+        elements = []
+        for i, name in enumerate(re.findall(r"->\.(\w+);", q)):
+            elements.append({"type": "sitescore_set", "id": i + 1, "tags": {"name": name}})
+            elements.append({"type": "node", "id": 100 + i, "lat": -23.56, "lon": -46.64, "tags": {"amenity": "cafe"}})
+        return OSMColumns.from_elements(elements)
+
+    sites = [BatchSite(0, "restaurante", Point(-46.64, -23.56)), BatchSite(1, "academia", Point(-46.63, -23.55))]
+    comp_sets, poi, transit = asyncio.run(fetch_group_layers(sites, db=None, fetch=fake_fetch))
+    assert len(queries) == 1
+    assert "->.competition_restaurante;" in queries[0] and "->.competition_academia;" in queries[0]
+    assert set(comp_sets) == {"restaurante", "academia"}
+    assert len(poi) == 1 and len(transit) == 1
+
+    gtfs = PointSet(np.array([-46.64]), np.array([-23.56]))
+    assert asyncio.run(fetch_group_layers(sites, db=None, fetch=fake_fetch, transit=gtfs))[2] is gtfs
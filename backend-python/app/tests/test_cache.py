@@ -0,0 +1,28 @@
+import json
+from app.core.cache import encode_value, decode_value, JSON_Z_MAGIC
+from app.core.osm_columns import OSMColumns, BINARY_MAGIC
+
+def test_encode_small_json_stays_plain():
+    """Test that small values are stored as plain JSON"""
+    data = [{"lat": -23.5, "lon": -46.6, "display_name": "São Paulo"}]
+    raw = encode_value(data)
+    assert json.loads(raw) == data
+    assert decode_value(raw) == data
+
+def test_encode_large_json_is_compressed():
+    """Test that large JSON values are compressed and still decode"""
+    data = [{"display_name": f"Rua {i}, São Paulo"} for i in range(200)]
+    raw = encode_value(data)
+    assert raw.startswith(JSON_Z_MAGIC)
+    assert len(raw) < len(json.dumps(data))
+    assert decode_value(raw) == data
+
+def test_encode_columns_binary():
+    """Test that OSMColumns round-trips through the binary cache format"""
+    cols = OSMColumns.from_elements([
+        {"type": "node", "id": 1, "lat": -23.55, "lon": -46.63, "tags": {"amenity": "cafe"}},
+        {"type": "way", "id": 2, "center": {"lat": -23.56, "lon": -46.64}, "tags": {}},
+    ])
+    raw = encode_value(cols)
+    assert raw.startswith(BINARY_MAGIC)
+    assert decode_value(raw).to_elements() == cols.to_elements()
@@ -0,0 +1,69 @@
+import asyncio
+import datetime
+import re
+from app.core.cache_warmer import rank_demand, warm_areas
+from app.core.demand import demand_member, load_recent_demand, parse_member, record_demand
+from app.core.osm_columns import OSMColumns
+
+NOW = datetime.datetime(2024, 5, 1, 6, 0, tzinfo=datetime.timezone.utc)
+
+class FakeRedis:
+    """Sorted sets em memória com a interface de pipeline usada por demand"""
+    def __init__(self):
+        self.zsets, self.ops = {}, []
+    def pipeline(self):
+        self.ops = []
+        return self
+    def zincrby(self, key, amount, member):
+        self.ops.append(lambda: self.zsets.setdefault(key, {}).__setitem__(member, self.zsets.get(key, {}).get(member, 0) + amount))
+    def expire(self, key, ttl):
+        self.ops.append(lambda: True)
+    def zrange(self, key, start, end, withscores=False):
+        self.ops.append(lambda: [(m.encode(), float(c)) for m, c in self.zsets.get(key, {}).items()])
+    def execute(self):
+        return [op() for op in self.ops]
+
+def test_parse_demand_member():
+    """Test round-tripping the bbox and business types stored in the demand sets"""
+    member = demand_member((-23.553, -46.636, -23.547, -46.63), ["restaurante", "farmacia"])
+    assert parse_member(member.encode()) == ((-23.553, -46.636, -23.547, -46.63), ["farmacia", "restaurante"])
+    assert parse_member("(-23.5, -46.6)|") is None
+    assert parse_member("1,1,0,0|") is None
+
+def test_recorded_demand_is_loaded_by_hour():
+    """Test that every recorded request (cache hit or miss) is counted in its hour bucket"""
+    r = FakeRedis()
+    bbox = (-23.56, -46.64, -23.54, -46.62)
+    for hours_ago in (0, 0, 5):
+        record_demand(bbox, ["restaurante"], now=NOW - datetime.timedelta(hours=hours_ago), client=r)
+    loaded = sorted(load_recent_demand(1, now=NOW, client=r), key=lambda d: d[3])
+    assert [(d[2], d[3]) for d in loaded] == [(1.0, NOW - datetime.timedelta(hours=5)), (2.0, NOW)]
+    assert loaded[0][:2] == (bbox, ["restaurante"])
+
+def test_rank_demand_orders_by_recent_use():
+    """Test that recent and repeated areas rank first and inherit project business types"""
+    hot = (-23.56, -46.64, -23.54, -46.62)
+    old = (-23.70, -46.80, -23.68, -46.78)
+    demand = [(hot, [], 3.0, NOW - datetime.timedelta(hours=1)), (old, ["padaria"], 1.0, NOW - datetime.timedelta(days=6))]
+    projects = [(-46.633, -23.55, "restaurante"), (-46.633, -23.55, "restaurante"), (-46.65, -23.56, "farmacia")]
+    ranked = rank_demand(projects, demand, NOW)
+    assert ranked[0]["bbox"] == (-23.56, -46.64, -23.54, -46.62)
+    assert ranked[0]["business_types"] == ["farmacia", "restaurante"]
+    assert ranked[1]["business_types"] == ["restaurante"]
+    assert ranked[-1]["bbox"] == (-23.7, -46.8, -23.68, -46.78)
+    assert ranked[-1]["business_types"] == ["padaria"]
+
+def test_warm_areas_respects_budget():
+    """Test that warming stops issuing upstream queries once the budget is spent"""
+    queries = []
+    async def fake_fetch(q):
+        queries.append(q)
+        # Resposta completa e vazia: só os marcadores de cada conjunto
+        return OSMColumns.from_elements([{"type": "sitescore_set", "id": i, "tags": {"name": name}}
+                                         for i, name in enumerate(re.findall(r"->\.(\w+);", q))])
+    areas = [{"bbox": (-23.56 + i * 0.1, -46.64, -23.54 + i * 0.1, -46.62), "business_types": ["restaurante"]}
+             for i in range(5)]
+    stats = asyncio.run(warm_areas(areas, db=None, budget=2, fetch=fake_fetch))
+    assert len(queries) == 2
+    assert "->.competition_restaurante;" in queries[0]
+    assert stats["areas"] == 2 and stats["skipped"] == 3
@@ -133,3 +133,135 @@ def test_normalize():
     assert normalize(0, 100) == 0.0
     assert normalize(float('inf'), 100) == 0.0  # Handles infinity
     assert normalize(float('nan'), 100) == 0.0  # Handles NaN
+
+def test_build_multi_query_and_split():
+    """Test multi-set Overpass query generation and result splitting"""
+    from app.core.overpass_client import build_multi_query, split_multi_result, SET_MARKER
+    q = build_multi_query((0, 0, 1, 1), {"comp": [('amenity', 'cafe')], "pois": [('office', None)]})
+    assert q.count(f"make {SET_MARKER}") == 2
+    assert '.comp out tags center;' in q and '.pois out tags center;' in q
+    data = {"elements": [
+        {"type": SET_MARKER, "id": 1, "tags": {"name": "comp"}},
+        {"type": "node", "id": 5, "lat": 0.5, "lon": 0.5},
+        {"type": SET_MARKER, "id": 2, "tags": {"name": "pois"}},
+        {"type": "node", "id": 5, "lat": 0.5, "lon": 0.5},
+        {"type": "node", "id": 6, "lat": 0.6, "lon": 0.6},
+    ]}
+    parts = split_multi_result(data, ["comp", "pois"])
+    assert [e["id"] for e in parts["comp"]["elements"]] == [5]
+    assert [e["id"] for e in parts["pois"]["elements"]] == [5, 6]
+
+def test_to_geodf_columns():
+    """Test converting columnar Overpass data to GeoDataFrame"""
+    from app.core.osm_columns import OSMColumns
+    cols = OSMColumns.from_elements([
+        {"type": "node", "id": 1, "lat": -23.55, "lon": -46.63, "tags": {"amenity": "restaurant"}},
+        {"type": "way", "id": 2, "center": {"lat": -23.56, "lon": -46.64}, "tags": {"building": "yes"}},
+    ])
+    gdf = to_geodf(cols)
+    assert len(gdf) == 2
+    assert gdf.crs.to_string() == "EPSG:4326"
+    assert len(filter_by_tag(gdf, 'building')) == 1
+    assert to_geodf(OSMColumns.empty()).empty
+
+def test_count_within_radius_uses_true_metres():
+    """Test that radius counts use local metres instead of the Web Mercator buffer"""
+    # 0.0043° de latitude ≈ 478 m: dentro de 500 m reais (fora do buffer 3857 a 23.5°S)
+    pts = gpd.GeoDataFrame(geometry=[Point(-46.63, -23.55 + 0.0043), Point(-46.63, -23.55 + 0.0047)], crs=4326)
+    assert count_within_radius(pts, Point(-46.63, -23.55), 500) == 1
+    assert abs(nearest_distance_meters(pts, Point(-46.63, -23.55)) - 478.1) < 1.0
+
+def test_count_within_radii_vectorized():
+    """Test counting many points and radii in one call"""
+    from app.core.features import count_within_radii
+    pts = gpd.GeoDataFrame(geometry=[Point(0, 0), Point(0.001, 0), Point(0.01, 0)], crs=4326)
+    counts = count_within_radii(pts, [0.0, 0.01], [0.0, 0.0], [50, 200, 2000])
+    assert counts.tolist() == [[1, 2, 3], [1, 1, 3]]
+
+def test_kde_values_matches_exact_sum():
+    """Test truncated vectorized KDE against the exact Gaussian sum and weights"""
+    from app.core.features import kde_values
+    from app.core.points_engine import M_PER_DEG
+    src = gpd.GeoDataFrame(geometry=[Point(0, 0), Point(0.001, 0), Point(0.5, 0)], crs=4326)
+    vals = kde_values([0.0, 0.001], [0.0, 0.0], [src], bandwidth_m=200)
+    d = 0.001 * M_PER_DEG
+    expected = 1 + math.exp(-(d ** 2) / (2 * 200 ** 2))
+    assert abs(vals[0] - expected) < 1e-6 and abs(vals[1] - expected) < 1e-6
+    weighted = kde_values([0.0], [0.0], [src, src], bandwidth_m=200, weights=[2.0, [1.0, 0.0, 0.0]])
+    assert abs(weighted[0] - (2 * expected + 1)) < 1e-6
+
+def test_feature_context_registry_matches_functions():
+    """Test that the shared FeatureContext yields the same values as the per-feature functions"""
+    from app.core import features as F
+    els = [
+        {"type": "node", "id": 1, "lat": -23.550, "lon": -46.630, "tags": {"highway": "footway", "sidewalk": "both"}},
+        {"type": "node", "id": 2, "lat": -23.551, "lon": -46.631, "tags": {"highway": "street_lamp"}},
+        {"type": "node", "id": 3, "lat": -23.552, "lon": -46.630, "tags": {"amenity": "parking"}},
+        {"type": "node", "id": 4, "lat": -23.549, "lon": -46.629, "tags": {"leisure": "park"}},
+        {"type": "node", "id": 5, "lat": -23.553, "lon": -46.632, "tags": {"amenity": "police", "lit": "yes"}},
+        {"type": "node", "id": 6, "lat": -23.550, "lon": -46.628, "tags": {"shop": "bakery", "building": "yes"}},
+        {"type": "node", "id": 7, "lat": -23.600, "lon": -46.700, "tags": {"amenity": "parking"}},
+    ]
+    from app.core.osm_columns import OSMColumns
+    gdf = to_geodf(OSMColumns.from_elements(els))
+    point = Point(-46.63, -23.55)
+    ctx = F.FeatureContext(gdf, point)
+    values = F.compute_features(ctx, radii={"parking": 800})
+    assert set(values) == set(F.FEATURE_REGISTRY)
+    assert values["parking"] == F.parking_availability(gdf, point, 800) == 1
+    assert values["sidewalk_quality"] == F.sidewalk_quality(gdf, point) == 0.5
+    assert values["green_spaces"] == F.green_score(gdf, point) == 1
+    assert values["walkability"] == F.walkability_score(gdf, point)
+    assert values["safety"] == F.safety_infrastructure(gdf, point)
+    assert values["amenity_diversity"] == F.amenity_diversity(gdf, point)
+    # vizinhança de cada raio calculada uma única vez
+    assert set(ctx._near) == {500, 800, 1000}
+    empty = F.compute_features(F.FeatureContext(to_geodf(OSMColumns.empty()), point))
+    assert all(v == 0 for v in empty.values())
+
+def test_ring_features_single_pass():
+    """Test multi-ring counts and decayed sums against per-radius counts"""
+    from app.core.features import ring_features, ring_feature_names
+    from app.core.points_engine import M_PER_DEG
+    # pontos a ~0, 111, 333 e 1113 m ao norte
+    pts = gpd.GeoDataFrame(geometry=[Point(0, d) for d in (0.0, 0.001, 0.003, 0.01)], crs=4326)
+    feats = ring_features({"offices": pts}, Point(0, 0), rings=[1000, 100, 500], decay_m=250)
+    assert set(feats) == set(ring_feature_names(["offices"], [1000, 100, 500]))
+    for r in (100, 500, 1000):
+        assert feats[f"offices_r{r}"] == count_within_radius(pts, Point(0, 0), r)
+    expected = 1 + math.exp(-0.001 * M_PER_DEG / 250) + math.exp(-0.003 * M_PER_DEG / 250)
+    assert abs(feats["offices_r500_decay"] - expected) < 1e-9
+    empty = ring_features({"parks": gpd.GeoDataFrame(geometry=[], crs=4326)}, Point(0, 0), rings=[100])
+    assert empty == {"parks_r100": 0.0, "parks_r100_decay": 0.0}
+
+def test_all_competition_features_match_per_type():
+    """Test the union-set, all-types competition pass against per-type competition_feature_matrix"""
+    import numpy as np
+    from app.core.features import (
+        all_competition_feature_matrix, base_feature_matrix, competition_feature_matrix, competition_membership
+    )
+    from app.core.osm_columns import OSMColumns
+    from app.core.overpass_client import BUSINESS_TAGS
+    from app.core.point_set import PointSet
+    rng = np.random.default_rng(0)
+    values = [("amenity", "cafe"), ("amenity", "restaurant"), ("amenity", "fast_food"), ("shop", "bakery"),
+              ("shop", "clothes"), ("amenity", "bar"), ("leisure", "fitness_centre"), ("office", "company")]
+    els = []
+    for i in range(400):
+        k, v = values[rng.integers(len(values))]
+        els.append({"type": "node", "id": i + 1, "lat": -23.57 + rng.random() * 0.03,
+                    "lon": -46.65 + rng.random() * 0.03, "tags": {k: v}})
+    everything = PointSet.from_columns(OSMColumns.from_elements(els))
+    types = list(BUSINESS_TAGS)
+    membership = competition_membership(everything, types)
+    assert membership[:, types.index("restaurante")].sum() > membership[:, types.index("lanchonete")].sum() > 0
+
+    lons, lats = -46.64 + rng.random(5) * 0.01, -23.56 + rng.random(5) * 0.01
+    base, _, flow_base = base_feature_matrix(everything, everything, lons, lats)
+    union = everything.take(membership.any(axis=1))
+    feats = all_competition_feature_matrix(union, types, base, flow_base, lons, lats)
+    for t, b in enumerate(types):
+        only = union.take(competition_membership(union, [b])[:, 0] > 0)
+        expected = competition_feature_matrix(only, base, flow_base, lons, lats)
+        for name, v in expected.items():
+            assert np.allclose(feats[name][:, t], v), (b, name)
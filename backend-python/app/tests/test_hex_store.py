@@ -0,0 +1,127 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import hex_store
+from app.core.config import settings
+from app.core.features import score_feature_matrix
+from app.core.hex_store import HexFeatureStore, HexGrid, build_store_arrays, write_store
+from app.core.point_set import PointSet
+
+BBOX = (-23.58, -46.66, -23.54, -46.62)  # (S, W, N, E)
+
+
+def _layer(rng, n, key=None, values=None):
+    lon = -46.67 + rng.random(n) * 0.06
+    lat = -23.59 + rng.random(n) * 0.06
+    data = {key: pd.Categorical(rng.choice(values, n))} if key else {}
+    return PointSet(lon, lat, data=data)
+
+
+def _layers(seed=0):
+    rng = np.random.default_rng(seed)
+    comp = {"cafe": _layer(rng, 300), "bar": _layer(rng, 150)}
+    poi = PointSet.concat([
+        _layer(rng, 200, "office", ["company", "government"]),
+        _layer(rng, 80, "amenity", ["school", "university", "bank"]),
+        _layer(rng, 60, "leisure", ["park", "pitch"]),
+    ])
+    transit = _layer(rng, 120)
+    return comp, poi, transit
+
+
+def test_hex_grid_cell_round_trip():
+    """Test that cell centers map back to their own cell and nearby points to the nearest center"""
+    grid = HexGrid(-23.56, -46.64, 250)
+    q, r = grid.cells_in_bbox(BBOX)
+    assert len(q) > 50
+    lon, lat = grid.centers(q, r)
+    q2, r2 = grid.cell_of(lon, lat)
+    assert np.array_equal(q, q2) and np.array_equal(r, r2)
+
+    rng = np.random.default_rng(0)
+    plon = -46.66 + rng.random(500) * 0.04
+    plat = -23.58 + rng.random(500) * 0.04
+    pq, pr = grid.cell_of(plon, plat)
+    own = np.hypot(*(grid.metric.project(plon, plat) - grid.center_xy(pq, pr)).T)
+    # O centro da própria célula é o mais próximo entre todos os centros
+    all_xy = grid.center_xy(*grid.cells_in_bbox((-23.60, -46.68, -23.52, -46.60)))
+    nearest = np.min(np.hypot(*(grid.metric.project(plon, plat)[:, None, :] - all_xy[None]).transpose(2, 0, 1)), axis=1)
+    assert np.allclose(own, nearest)
+    assert own.max() <= 250 + 1e-6
+
+
+def test_hex_store_lookup_matches_live_features(tmp_path):
+    """Test that stored features equal score_feature_matrix computed at the cell center"""
+    comp, poi, transit = _layers()
+    arrays = build_store_arrays(BBOX, [100, 250], comp, poi, transit)
+    write_store(str(tmp_path), BBOX, arrays)
+    store = HexFeatureStore(str(tmp_path))
+    assert store.sizes == [100, 250]
+
+    for size in (100, 250):
+        found = store.lookup(-46.641, -23.562, "cafe", size)
+        assert found["resolution_m"] == size
+        clon, clat = found["cell_center"]
+        live = {k: v[0] for k, v in score_feature_matrix(comp["cafe"], poi, transit, clon, clat).items()}
+        for name, value in live.items():
+            assert found["features"][name] == pytest.approx(value, rel=1e-5, abs=1e-6), name
+        assert isinstance(found["features"]["competition"], int)
+
+    feats, covered = store.lookup_many([-46.641, -46.63, -46.70], [-23.562, -23.55, -23.56], "bar")
+    assert covered.tolist() == [True, True, False]
+    assert np.isnan(feats["competition"][2])
+    assert store.lookup(-46.70, -23.56, "cafe") is None
+    assert store.lookup(-46.641, -23.562, "restaurant") is None
+
+
+def test_hex_store_staleness_and_reload(tmp_path, monkeypatch):
+    """Test that the /score lookup skips stale stores and reloads when the store is rebuilt"""
+    comp, poi, transit = _layers(seed=1)
+    arrays = build_store_arrays(BBOX, [250], comp, poi, transit)
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=200)
+    write_store(str(tmp_path), BBOX, arrays, built_at=old)
+
+    monkeypatch.setattr(settings, "HEX_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(settings, "HEX_STORE_MAX_AGE_HOURS", 168.0)
+    monkeypatch.setattr(hex_store, "_STORE", {"store": None, "mtime": None, "error": None})
+
+    assert hex_store.get_hex_store().is_stale()
+    assert hex_store.lookup_score_features(-46.641, -23.562, "cafe") is None
+    assert hex_store.get_hex_store_status()["stale"] is True
+
+    write_store(str(tmp_path), BBOX, arrays)
+    meta = os.path.join(str(tmp_path), hex_store.META_FILE)
+    os.utime(meta, ns=(os.stat(meta).st_atime_ns, os.stat(meta).st_mtime_ns + 1_000_000))
+    found = hex_store.lookup_score_features(-46.641, -23.562, "cafe")
+    assert found is not None and found["resolution_m"] == 250
+    assert hex_store.lookup_score_features(-46.70, -23.56, "cafe") is None
+
+
+def test_hex_store_disabled(monkeypatch):
+    """Test that an unset HEX_STORE_PATH disables the store"""
+    monkeypatch.setattr(settings, "HEX_STORE_PATH", "")
+    assert hex_store.get_hex_store() is None
+    assert hex_store.lookup_score_features(-46.64, -23.56, "cafe") is None
+    assert hex_store.get_hex_store_status()["enabled"] is False
+
+
+def test_hex_store_rebuild_publishes_through_meta(tmp_path):
+    """Test that each build uses its own array files, the meta.json switches builds, and only the previous build is kept"""
+    comp, poi, transit = _layers(seed=2)
+    arrays = build_store_arrays(BBOX, [250], comp, poi, transit)
+    first = write_store(str(tmp_path), BBOX, arrays)
+    opened = HexFeatureStore(str(tmp_path))
+    second = write_store(str(tmp_path), BBOX, arrays)
+    third = write_store(str(tmp_path), BBOX, arrays)
+    assert len({first, second, third}) == 3
+
+    files = sorted(os.listdir(tmp_path))
+    assert not any(first in f for f in files)
+    assert sum(second in f for f in files) == 2 and sum(third in f for f in files) == 2
+    assert HexFeatureStore(str(tmp_path)).meta["build_id"] == third
+    # Um store já aberto segue lendo seus arrays (mmap) depois da remoção dos arquivos
+    assert opened.lookup(-46.641, -23.562, "cafe") is not None
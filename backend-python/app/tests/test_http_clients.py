@@ -0,0 +1,52 @@
+import asyncio
+from app.core.http_clients import get_client, close_clients, pool_stats
+
+def test_get_client_is_shared_per_upstream():
+    """Test that the same pooled client is reused within an event loop"""
+    async def scenario():
+        a = get_client("overpass")
+        b = get_client("overpass")
+        c = get_client("nominatim")
+        assert a is b
+        assert a is not c
+        stats = pool_stats()
+        assert stats["overpass"]["open"] == 0
+        assert stats["overpass"]["max"] > 0
+        await close_clients()
+        assert a.is_closed
+    asyncio.run(scenario())
+
+def test_get_client_recreated_for_new_loop():
+    """Test that a client bound to a finished loop is not reused"""
+    async def grab():
+        return get_client("jwks")
+    c1 = asyncio.run(grab())
+    c2 = asyncio.run(grab())
+    assert c1 is not c2
+
+def test_stale_client_is_closed_when_replaced():
+    """Test that replacing a client bound to a finished loop closes the old one"""
+    async def grab():
+        return get_client("nominatim")
+    async def replace():
+        new = get_client("nominatim")
+        await asyncio.sleep(0)
+        return new
+    old = asyncio.run(grab())
+    new = asyncio.run(replace())
+    assert new is not old
+    assert old.is_closed and not new.is_closed
+
+def test_pool_stats_falls_back_without_httpx_internals(monkeypatch):
+    """Test that pool_stats uses the registry's in-flight counts when the transport pool is not exposed"""
+    import app.core.http_clients as http_clients
+    async def scenario():
+        client = get_client("jwks")
+        transport = client._transport
+        client._transport = object()
+        monkeypatch.setitem(http_clients._in_flight, "jwks", 3)
+        stats = pool_stats()["jwks"]
+        client._transport = transport
+        await close_clients()
+        return stats
+    assert asyncio.run(scenario()) == {"open": 2, "idle": 0, "waiting": 1, "max": 2}
@@ -0,0 +1,101 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+
+from app.core.scoring_model import ML_FEATURES
+from app.ml.registry import ModelRegistry
+
+
+def _train(seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.random((60, len(ML_FEATURES))) * 50, columns=ML_FEATURES)
+    y = X["offices"] + X["transit"] - X["competition"] + 50
+    return GradientBoostingRegressor(n_estimators=20, random_state=seed).fit(X, y)
+
+
+def _rows(n=5, seed=1):
+    rng = np.random.default_rng(seed)
+    return [dict(zip(ML_FEATURES, rng.random(len(ML_FEATURES)) * 50)) for _ in range(n)]
+
+
+def test_registry_loads_once_and_batch_predicts(tmp_path):
+    """Test that a model is loaded once and batch predictions match the model clipped to 0-100"""
+    model = _train()
+    joblib.dump(model, tmp_path / "restaurante.joblib")
+    registry = ModelRegistry(str(tmp_path), reload_interval=60)
+    entry = registry.get("restaurante")
+    assert entry is not None and entry.features == ML_FEATURES
+    assert registry.get("restaurante") is entry
+    rows = _rows()
+    expected = np.clip(model.predict(pd.DataFrame(rows)[ML_FEATURES]), 0, 100)
+    assert np.allclose(registry.predict("restaurante", rows), expected)
+    assert registry.predict("academia", rows) is None
+    assert registry.predict("restaurante", rows, segment="fast_casual") is None
+    status = registry.status()
+    assert status["loaded"]["restaurante"]["version"] == entry.version
+
+
+def test_registry_reloads_on_change_and_keeps_last_good(tmp_path):
+    """Test reload on file change, fallback to the previous version on a bad file, and removal"""
+    path = tmp_path / "academia_premium.joblib"
+    joblib.dump(_train(0), path)
+    registry = ModelRegistry(str(tmp_path), reload_interval=0)
+    assert registry.load_all() == ["academia_premium"]
+    first = registry.get("academia", "premium")
+
+    joblib.dump(_train(1), path)
+    os.utime(path, ns=(first.mtime_ns + 10**9, first.mtime_ns + 10**9))
+    second = registry.get("academia", "premium")
+    assert second is not first and second.version != first.version
+
+    path.write_bytes(b"not a model")
+    os.utime(path, ns=(first.mtime_ns + 2 * 10**9, first.mtime_ns + 2 * 10**9))
+    assert registry.get("academia", "premium") is second
+    assert "academia_premium" in registry.status()["errors"]
+
+    path.unlink()
+    assert registry.get("academia", "premium") is None
+    assert registry.status()["loaded"] == {}
+
+
+def test_ring_model_refuses_rows_without_ring_features(tmp_path):
+    """Test that a model trained with ring columns exposes its rings and is skipped when they are missing"""
+    rng = np.random.default_rng(2)
+    columns = ML_FEATURES + ["offices_r1000", "offices_r1000_decay", "transit_r250"]
+    X = pd.DataFrame(rng.random((60, len(columns))) * 50, columns=columns)
+    model = GradientBoostingRegressor(n_estimators=10, random_state=0).fit(X, X["offices_r1000"])
+    joblib.dump(model, tmp_path / "restaurante.joblib")
+    registry = ModelRegistry(str(tmp_path), reload_interval=60)
+    assert registry.get("restaurante").rings == [250, 1000]
+    rows = _rows(3)
+    assert registry.predict("restaurante", rows) is None
+    for row in rows:
+        row.update({"offices_r1000": 10.0, "offices_r1000_decay": 5.0, "transit_r250": 2.0})
+    assert registry.predict("restaurante", rows).shape == (3,)
+
+
+def test_registry_throttles_bad_files_and_rejects_unsafe_segments(tmp_path, monkeypatch):
+    """Test that an unloadable file is not re-read until it changes and that unsafe segments never reach the filesystem"""
+    path = tmp_path / "restaurante.joblib"
+    path.write_bytes(b"not a model")
+    registry = ModelRegistry(str(tmp_path), reload_interval=0)
+    loads = []
+    real_load = joblib.load
+    monkeypatch.setattr("app.ml.registry.joblib.load", lambda f: loads.append(1) or real_load(f))
+    assert registry.get("restaurante") is None
+    assert registry.get("restaurante") is None
+    assert len(loads) == 1 and "restaurante" in registry.status()["errors"]
+
+    joblib.dump(_train(), path)
+    assert registry.get("restaurante") is not None
+    assert registry.status()["errors"] == {}
+
+    paths = []
+    monkeypatch.setattr(registry, "path_for", lambda name: paths.append(name) or ModelRegistry.path_for(registry, name))
+    for segment in ("../../etc/passwd", "a/b", "x" * 65, "seg ment"):
+        assert registry.get("restaurante", segment) is None
+        assert registry.predict("restaurante", _rows(1), segment) is None
+    assert paths == [] and registry._unloaded == {}
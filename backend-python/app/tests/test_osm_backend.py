@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from app.core.osm_backend import LocalExtractBackend, OverpassBackend, RemoteOverpassBackend, load_extract
+from app.core.osm_columns import OSMColumns
+
+def _extract():
+    return OSMColumns.from_elements([
+        {"type": "node", "id": 1, "lat": -23.550, "lon": -46.630, "tags": {"amenity": "cafe"}},
+        {"type": "node", "id": 2, "lat": -23.551, "lon": -46.631, "tags": {"highway": "bus_stop"}},
+        {"type": "way", "id": 3, "center": {"lat": -23.549, "lon": -46.629}, "tags": {"shop": "bakery"}},
+        {"type": "node", "id": 4, "lat": -23.400, "lon": -46.500, "tags": {"amenity": "cafe"}},
+        {"type": "node", "id": 5, "lat": -23.552, "lon": -46.632, "tags": {"amenity": "bank"}},
+    ])
+
+def test_local_backend_query_sets():
+    """Test that the local extract answers tag queries inside the bbox"""
+    backend = LocalExtractBackend(_extract(), bounds=[(-23.6, -46.7, -23.3, -46.4)])
+    bbox = (-23.56, -46.64, -23.54, -46.62)
+    data = asyncio.run(backend.query_sets(bbox, {
+        "competition": [('amenity', 'cafe')],
+        "pois": [('shop', None), ('amenity', 'bank')],
+        "transit": [('highway', 'bus_stop')],
+    }))
+    assert data["competition"].ids.tolist() == [1]
+    assert sorted(data["pois"].ids.tolist()) == [3, 5]
+    assert data["transit"].tags_at(0) == {"highway": "bus_stop"}
+    assert len(asyncio.run(backend.query(bbox, [('leisure', 'park')]))) == 0
+
+def test_local_backend_covers():
+    """Test coverage check against the extract bounds"""
+    backend = LocalExtractBackend(_extract(), bounds=[(-23.6, -46.7, -23.3, -46.4)])
+    assert backend.covers((-23.56, -46.64, -23.54, -46.62))
+    assert not backend.covers((-23.7, -46.64, -23.54, -46.62))
+
+def test_npz_round_trip(tmp_path):
+    """Test saving and loading a columnar extract"""
+    path = str(tmp_path / "extract.npz")
+    cols = _extract()
+    cols.save_npz(path, bounds=(-23.6, -46.7, -23.3, -46.4))
+    loaded, bounds = load_extract(path)
+    assert bounds == (-23.6, -46.7, -23.3, -46.4)
+    assert loaded.ids.tolist() == cols.ids.tolist()
+    assert [loaded.tags_at(i) for i in range(len(loaded))] == [cols.tags_at(i) for i in range(len(cols))]
+
+def test_remote_backend_single_query():
+    """Test that the remote backend sends one plain query for one tag set"""
+    queries = []
+    async def fake_fetch(q):
+        queries.append(q)
+        return _extract()
+    data = asyncio.run(RemoteOverpassBackend(fake_fetch).query((-23.56, -46.64, -23.54, -46.62), [('amenity', 'cafe')]))
+    assert len(queries) == 1 and "sitescore_set" not in queries[0]
+    assert len(data) == 5
+
+def test_incomplete_backend_fails_at_construction():
+    """Test that a backend without query_sets cannot be instantiated"""
+    class Incomplete(OverpassBackend):
+        name = "incomplete"
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,66 @@
+import json
+import pytest
+from app.core.osm_columns import OSMColumns, OverpassStreamParser, parse_overpass_bytes, KIND_WAY
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": -23.55, "lon": -46.63, "tags": {"amenity": "cafe", "name": "Café Ç"}},
+    {"type": "way", "id": 2, "center": {"lat": -23.56, "lon": -46.64}, "tags": {"building": "yes"}},
+    {"type": "relation", "id": 3, "tags": {"type": "route"}},  # sem centro: descartado
+    {"type": "node", "id": 4, "lat": -23.57, "lon": -46.65},
+]
+
+def _overpass_body(elements, remark=None):
+    """Monta um corpo no mesmo layout que o Overpass usa (elementos na coluna 0)"""
+    body = '{\n  "version": 0.6,\n  "osm3s": {"copyright": "x"},\n  "elements": [\n\n'
+    body += ",\n".join(json.dumps(e, indent=2, ensure_ascii=False) for e in elements)
+    body += "\n\n  ]" + (f',\n  "remark": {json.dumps(remark)}' if remark else "") + "\n}\n"
+    return body.encode("utf-8")
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 100000])
+def test_stream_parser_any_chunking(chunk_size):
+    """Test incremental parsing regardless of how the body is split"""
+    body = _overpass_body(ELEMENTS)
+    cols = parse_overpass_bytes(body[i:i + chunk_size] for i in range(0, len(body), chunk_size))
+    assert cols.ids.tolist() == [1, 2, 4]
+    assert cols.tags_at(0) == {"amenity": "cafe", "name": "Café Ç"}
+    assert cols.kind[1] == KIND_WAY
+    assert cols.lon[1] == -46.64
+
+def test_stream_parser_compact_json_and_remark():
+    """Test compact JSON (no Overpass layout) and the trailing remark"""
+    body = json.dumps({"elements": ELEMENTS, "remark": "runtime error: timeout"}).encode()
+    seen = []
+    parser = OverpassStreamParser(seen.append)
+    parser.feed(body[:50]); parser.feed(body[50:])
+    parser.close()
+    assert parser.count == 4 and len(seen) == 4
+    assert parser.remark == "runtime error: timeout"
+
+def test_stream_parser_rejects_unexpected_body():
+    """Test that non-Overpass or truncated bodies raise"""
+    with pytest.raises(ValueError):
+        parse_overpass_bytes([b'<html>error</html>'])
+    with pytest.raises(ValueError):
+        parse_overpass_bytes([_overpass_body(ELEMENTS)[:-20]])
+
+def test_columns_take_concat_roundtrip():
+    """Test subsetting, concatenation and payload round trip"""
+    cols = OSMColumns.from_elements(ELEMENTS)
+    other = OSMColumns.from_elements([{"type": "node", "id": 9, "lat": 0, "lon": 0, "tags": {"shop": "bakery"}}])
+    merged = OSMColumns.concat([cols.take([2, 0]), other])
+    assert merged.ids.tolist() == [4, 1, 9]
+    assert merged.tags_at(1)["name"] == "Café Ç"
+    assert merged.tags_at(2) == {"shop": "bakery"}
+    again = OSMColumns.from_payload(json.loads(json.dumps(merged.to_payload())))
+    assert again.to_elements() == merged.to_elements()
+    assert OSMColumns.from_payload({"elements": ELEMENTS}).ids.tolist() == [1, 2, 4]
+
+def test_columns_binary_roundtrip():
+    """Test the compact binary encoding used by the caches"""
+    cols = OSMColumns.from_elements(ELEMENTS)
+    data = cols.to_bytes()
+    again = OSMColumns.from_bytes(data)
+    assert again.to_elements() == cols.to_elements()
+    assert OSMColumns.from_bytes(OSMColumns.empty().to_bytes()).to_elements() == []
+    with pytest.raises(ValueError):
+        OSMColumns.from_bytes(b'{"elements": []}')
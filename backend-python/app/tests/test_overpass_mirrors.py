@@ -0,0 +1,216 @@
+import asyncio
+import httpx
+import pytest
+from app.core.overpass_mirrors import Mirror, MirrorPool, NoMirrorAvailable, CLOSED, OPEN, HALF_OPEN
+from app.core.overpass_client import (
+    _stream_from_mirror, _fetch_from_mirror, _is_mirror_fault, _trip_after,
+    OverpassError, OverpassServerError, OverpassRateLimitError
+)
+
+def _pool(urls, **kw):
+    return MirrorPool([Mirror(u, initial_latency=1.0, cooldown=60) for u in urls],
+                      is_fault=_is_mirror_fault, retry_after_of=_trip_after, **kw)
+
+def test_pick_prefers_low_latency():
+    """Test that the mirror with the lowest latency EWMA is chosen"""
+    pool = _pool(["a", "b"])
+    pool.mirrors[0].record_success(5.0)
+    pool.mirrors[1].record_success(0.1)
+    assert pool.pick().url == "b"
+    pool.mirrors[1].inflight = pool.mirrors[1].slots  # sem slots livres
+    assert pool.pick().url == "a"
+
+def test_failover_on_server_error_and_breaker_opens():
+    """Test failover to the next mirror and circuit opening on 429"""
+    calls = []
+    async def send(url):
+        calls.append(url)
+        if url == "a":
+            raise OverpassRateLimitError("429", retry_after=120)
+        return url
+    pool = _pool(["a", "b"])
+    pool.mirrors[1].latency = 2.0
+    assert asyncio.run(pool.run(send)) == "b"
+    assert calls == ["a", "b"]
+    assert pool.mirrors[0].state == OPEN
+    # Próxima query já não passa pelo mirror aberto
+    calls.clear()
+    asyncio.run(pool.run(send))
+    assert calls == ["b"]
+
+def test_query_errors_are_not_mirror_faults():
+    """Test that a 4xx query error is raised without failover"""
+    calls = []
+    async def send(url):
+        calls.append(url)
+        raise OverpassError("HTTP 400: parse error")
+    pool = _pool(["a", "b"])
+    with pytest.raises(OverpassError):
+        asyncio.run(pool.run(send))
+    assert calls == ["a"]
+    assert pool.mirrors[0].state == CLOSED
+
+def test_all_mirrors_open_fails_fast():
+    """Test that no request is sent when every circuit is open"""
+    pool = _pool(["a"])
+    pool.mirrors[0].open(60)
+    async def send(url):
+        raise AssertionError("não deveria chamar")
+    with pytest.raises(NoMirrorAvailable):
+        asyncio.run(pool.run(send))
+
+def test_half_open_after_cooldown():
+    """Test that an open mirror allows a single probe after the cooldown"""
+    m = Mirror("a")
+    m.open(0)
+    assert m.available(0.0 + 1e9) and m.state == HALF_OPEN
+    m.record_failure()
+    assert m.state == OPEN
+    m.open(0); m.available(1e9)
+    m.record_success(0.5)
+    assert m.state == CLOSED
+
+def test_error_rate_opens_circuit():
+    """Test that the breaker opens once the recent error rate crosses the threshold"""
+    m = Mirror("a", min_samples=3, error_rate=0.5)
+    m.record_success(1.0)
+    m.record_failure()
+    assert m.state == CLOSED
+    m.record_failure()
+    assert m.state == OPEN
+
+def test_hedged_request_uses_second_mirror():
+    """Test that a slow mirror is hedged and the faster answer wins"""
+    cancelled = []
+    async def send(url):
+        try:
+            await asyncio.sleep(5 if url == "slow" else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(url)
+            raise
+        return url
+    pool = _pool(["slow", "fast"], hedge_after=0.05)
+    pool.mirrors[1].latency = 3.0  # "slow" parece melhor até ser medido
+    assert asyncio.run(pool.run(send)) == "fast"
+    assert cancelled == ["slow"]
+    assert pool.mirrors[0].inflight == 0 and pool.mirrors[1].inflight == 0
+
+def test_hedge_without_free_slot_is_attempted_once():
+    """Test that a hedge blocked by busy slots waits for the primary instead of re-arming the timer"""
+    pool = _pool(["slow", "busy"], hedge_after=0.01)
+    pool.mirrors[1].latency = 3.0
+    pool.mirrors[1].inflight = pool.mirrors[1].slots  # todos os slots ocupados
+    picks = []
+    pick = pool.pick
+    def counting_pick(exclude=()):
+        mirror = pick(exclude=exclude)
+        picks.append(mirror.url if mirror else None)
+        return mirror
+    pool.pick = counting_pick
+    async def send(url):
+        await asyncio.sleep(0.2)
+        return url
+    assert asyncio.run(pool.run(send)) == "slow"
+    assert picks == ["slow", None]
+
+def test_stream_from_stub_server():
+    """Test streaming decode and status mapping against stub mirrors"""
+    def handler(request):
+        if request.url.host == "down":
+            return httpx.Response(504, text="Gateway Timeout")
+        if request.url.host == "busy":
+            return httpx.Response(429, headers={"Retry-After": "7"}, text="Too Many Requests")
+        return httpx.Response(200, content=b'{"version":0.6,"elements":[{"type":"node","id":1,"lat":-23.5,"lon":-46.6,"tags":{"amenity":"cafe"}}]}')
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            send = lambda url: _stream_from_mirror(url, "[out:json];", client=client)
+            with pytest.raises(OverpassServerError):
+                await send("http://down/api/interpreter")
+            with pytest.raises(OverpassRateLimitError) as exc:
+                await send("http://busy/api/interpreter")
+            assert exc.value.retry_after == 7.0
+            pool = _pool(["http://down/api/interpreter", "http://ok/api/interpreter"])
+            pool.mirrors[1].latency = 2.0
+            return await pool.run(send)
+
+    cols = asyncio.run(go())
+    assert cols.ids.tolist() == [1]
+
+def test_queries_wait_for_a_free_slot():
+    """Test that queries beyond the slot limit wait instead of failing and never oversubscribe"""
+    running, peak = [0], [0]
+    async def send(url):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return url
+    pool = _pool(["a"])
+    async def scenario():
+        return await asyncio.gather(*[pool.run(send) for _ in range(5)])
+    assert asyncio.run(scenario()) == ["a"] * 5
+    assert peak[0] == pool.mirrors[0].slots
+    assert pool.mirrors[0].inflight == 0
+
+def test_single_mirror_retries_after_rate_limit():
+    """Test that a lone mirror is retried once its circuit reopens after a 429"""
+    calls = []
+    async def send(url):
+        calls.append(url)
+        if len(calls) == 1:
+            raise OverpassRateLimitError("429", retry_after=0.05)
+        return url
+    pool = _pool(["a"], retries=2, retry_backoff=0.01)
+    assert asyncio.run(pool.run(send)) == "a"
+    assert calls == ["a", "a"]
+    assert pool.mirrors[0].state == CLOSED
+
+def test_retry_gives_up_when_circuit_reopens_too_late():
+    """Test that the retry wait is bounded by retry_max_wait"""
+    pool = _pool(["a"], retries=2, retry_backoff=0.01, retry_max_wait=1.0)
+    pool.mirrors[0].open(60)
+    async def send(url):
+        raise AssertionError("não deveria chamar")
+    with pytest.raises(NoMirrorAvailable):
+        asyncio.run(pool.run(send))
+
+def test_runtime_error_remark_is_a_mirror_fault():
+    """Test that a body with a runtime-error remark is not returned as success and fails over"""
+    partial = (b'{"version":0.6,"elements":[{"type":"node","id":1,"lat":-23.5,"lon":-46.6,"tags":{"amenity":"cafe"}}],'
+               b'"remark":"runtime error: Query timed out in \\"query\\" at line 3 after 26 seconds."}')
+    full = b'{"version":0.6,"elements":[{"type":"node","id":1,"lat":-23.5,"lon":-46.6},{"type":"node","id":2,"lat":-23.5,"lon":-46.6}]}'
+    def handler(request):
+        return httpx.Response(200, content=partial if request.url.host == "partial" else full)
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            with pytest.raises(OverpassServerError):
+                await _stream_from_mirror("http://partial/api/interpreter", "[out:json];", client=client)
+            with pytest.raises(OverpassServerError):
+                await _fetch_from_mirror("http://partial/api/interpreter", "[out:json];", client=client)
+            pool = _pool(["http://partial/api/interpreter", "http://ok/api/interpreter"])
+            pool.mirrors[1].latency = 2.0
+            return await pool.run(lambda url: _stream_from_mirror(url, "[out:json];", client=client))
+
+    cols = asyncio.run(go())
+    assert cols.ids.tolist() == [1, 2]
+
+def test_runtime_error_remark_is_not_cached(monkeypatch):
+    """Test that a remark-bearing body raises through the tile cache and stores no tiles"""
+    from app.core import tile_cache
+    stored = []
+    monkeypatch.setattr(tile_cache, "_load_tiles", lambda db, keys: {})
+    monkeypatch.setattr(tile_cache, "_store_tiles", lambda db, entries, ttl: stored.append(entries))
+    monkeypatch.setattr(tile_cache, "record_demand", lambda *a, **kw: None)
+    body = b'{"elements":[],"remark":"runtime error: Query run out of memory using about 2048 MB of RAM."}'
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(lambda r: httpx.Response(200, content=body))) as client:
+            fetch = lambda q: _stream_from_mirror("http://partial/api/interpreter", q, client=client)
+            await tile_cache.fetch_tiled_many((-23.56, -46.64, -23.54, -46.62), {"pois": [("shop", None)]},
+                                              db=object(), fetch=fetch)
+
+    with pytest.raises(OverpassServerError):
+        asyncio.run(go())
+    assert stored == []
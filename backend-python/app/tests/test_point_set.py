@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from shapely.geometry import Point, box
+
+from app.core import features as F
+from app.core.osm_columns import OSMColumns
+from app.core.point_set import PointSet, as_point_set
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": -23.550, "lon": -46.630, "tags": {"amenity": "restaurant"}},
+    {"type": "node", "id": 2, "lat": -23.551, "lon": -46.631, "tags": {"highway": "footway", "sidewalk": "both"}},
+    {"type": "node", "id": 3, "lat": -23.552, "lon": -46.630, "tags": {"amenity": "parking"}},
+    {"type": "way", "id": 4, "center": {"lat": -23.549, "lon": -46.629}, "tags": {"leisure": "park"}},
+    {"type": "node", "id": 5, "lat": -23.553, "lon": -46.632, "tags": {"office": "company", "building": "yes"}},
+    {"type": "node", "id": 6, "lat": -23.600, "lon": -46.700, "tags": {"shop": "bakery"}},
+]
+
+
+def test_point_set_matches_geodataframe_features():
+    """Test that features give the same values for a PointSet and the equivalent GeoDataFrame"""
+    cols = OSMColumns.from_elements(ELEMENTS)
+    points, gdf = PointSet.from_columns(cols), F.to_geodf(cols)
+    p = Point(-46.63, -23.55)
+    assert points.ids.tolist() == [1, 2, 3, 4, 5, 6]
+    assert F.count_within_radius(points, p, 500) == F.count_within_radius(gdf, p, 500) == 5
+    assert F.nearest_distance_meters(points, p) == F.nearest_distance_meters(gdf, p)
+    assert F.kde_value(p, [points], 200) == pytest.approx(F.kde_value(p, [gdf], 200))
+    assert len(F.filter_by_tag(points, "amenity", ["parking"])) == 1
+    assert F.compute_features(F.FeatureContext(points, p)) == pytest.approx(F.compute_features(F.FeatureContext(gdf, p)))
+    assert F.ring_features({"x": points}, p, [100, 1000]) == F.ring_features({"x": gdf}, p, [100, 1000])
+
+
+def test_point_set_slicing_shares_projection():
+    """Test mask/slice subsets reuse the parent projection and slices are views"""
+    points = PointSet.from_columns(OSMColumns.from_elements(ELEMENTS))
+    xy = points.xy
+    sub = points[points.mask("amenity")]
+    assert sub.ids.tolist() == [1, 3]
+    assert sub.metric is points.metric and np.array_equal(sub.xy, xy[[0, 2]])
+    view = points.take(slice(1, 4))
+    assert np.shares_memory(view.lon, points.lon) and np.shares_memory(view.xy, xy)
+    assert view["leisure"].tolist()[2] == "park"
+
+
+def test_point_set_concat_within_and_geodataframe():
+    """Test concat of sets with different tag keys, polygon mask and the GeoDataFrame escape hatch"""
+    a = PointSet.from_columns(OSMColumns.from_elements(ELEMENTS[:3]))
+    b = PointSet.from_columns(OSMColumns.from_elements(ELEMENTS[3:]))
+    both = PointSet.concat([a, PointSet.empty_set(), b])
+    assert len(both) == 6 and both.mask("amenity").tolist() == [True, False, True, False, False, False]
+    assert both.mask("shop", "bakery").tolist() == [False] * 5 + [True]
+    inside = both[both.within(box(-46.64, -23.56, -46.62, -23.54))]
+    assert inside.ids.tolist() == [1, 2, 3, 4, 5]
+    gdf = both.to_geodataframe()
+    assert gdf.crs.to_string() == "EPSG:4326" and len(F.filter_by_tag(gdf, "leisure")) == 1
+    back = as_point_set(gdf)
+    assert np.allclose(back.lon, both.lon) and back.mask("leisure").sum() == 1
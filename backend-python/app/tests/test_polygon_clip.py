@@ -0,0 +1,35 @@
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import MultiPolygon, Point, box
+
+from app.core.point_set import PointSet
+from app.core.polygon_clip import PolygonClip
+
+
+def _points(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    return PointSet(-46.7 + rng.random(n) * 0.2, -23.65 + rng.random(n) * 0.2)
+
+
+def test_polygon_clip_matches_geopandas_within():
+    """Test prepared/vectorized clipping against GeoSeries.within for Polygon and MultiPolygon"""
+    pts = _points()
+    gdf = pts.to_geodataframe()
+    district = Point(-46.62, -23.56).buffer(0.03, quad_segs=64)
+    multi = MultiPolygon([box(-46.69, -23.64, -46.66, -23.60), district])
+    for geom in (district, multi):
+        clip = PolygonClip(geom)
+        assert np.array_equal(clip.mask(pts), gdf.within(geom).to_numpy())
+        assert np.array_equal(clip.mask(gdf), gdf.within(geom).to_numpy())
+
+
+def test_polygon_clip_uses_existing_index():
+    """Test that the KD-tree prefilter gives the same result as the array bbox prefilter"""
+    pts = _points(seed=1)
+    geom = box(-46.65, -23.60, -46.60, -23.52)
+    expected = PolygonClip(geom).mask(pts)
+    pts.spatial_index  # constrói o índice
+    clipped = PolygonClip(geom).clip(pts)
+    assert np.array_equal(PolygonClip(geom).mask(pts), expected)
+    assert len(clipped) == expected.sum() and len(clipped) > 0
+    assert PolygonClip(box(10, 10, 11, 11)).clip(pts).empty
@@ -0,0 +1,71 @@
+import base64
+import numpy as np
+import pytest
+import geopandas as gpd
+from app.core.raster_kde import density_grid
+from app.core.features import kde_values
+
+BBOX = (-23.56, -46.64, -23.54, -46.62)
+
+def _sources():
+    rng = np.random.default_rng(1)
+    lons = -46.645 + rng.random(300) * 0.03
+    lats = -23.565 + rng.random(300) * 0.03
+    return lons, lats
+
+def test_density_grid_matches_point_kde():
+    """Test that the raster KDE approximates the exact KDE at cell centers"""
+    lons, lats = _sources()
+    grid = density_grid([(lons, lats, None)], BBOX, bandwidth_m=200, resolution=100)
+    cx, cy = grid.cell_centers()
+    gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(lons, lats), crs=4326)
+    exact = kde_values(cx.ravel(), cy.ravel(), [gdf], bandwidth_m=200).reshape(grid.shape)
+    assert grid.shape[0] == 100  # lado maior (norte-sul) com `resolution` células
+    assert np.abs(grid.values - exact).max() < 0.05 * exact.max()
+
+def test_density_grid_weights_and_orientation():
+    """Test per-source weights and north-up row order"""
+    grid = density_grid([(np.array([-46.621]), np.array([-23.541]), np.array([3.0]))], BBOX,
+                        bandwidth_m=200, resolution=40)
+    row, col = np.unravel_index(np.argmax(grid.values), grid.shape)
+    assert row < 3 and col > grid.shape[1] - 4  # canto nordeste
+    assert abs(grid.values.max() - 3.0) < 0.5
+
+def test_density_grid_payloads():
+    """Test raster and PNG encodings"""
+    lons, lats = _sources()
+    grid = density_grid([(lons, lats, None)], BBOX, resolution=20)
+    payload = grid.to_raster_payload()
+    values = np.frombuffer(base64.b64decode(payload["values"]), dtype="<f4")
+    assert values.size == payload["width"] * payload["height"]
+    assert grid.to_png().startswith(b"\x89PNG\r\n\x1a\n")
+    assert len(grid.to_geojson()["features"]) == grid.values.size
+    feats = grid.to_geojson(min_value=1e-3)["features"]
+    assert feats and all(f["properties"]["value"] >= 1e-3 for f in feats)
+
+def test_density_grid_tiny_bbox_is_bounded():
+    """Test that a degenerate or tiny bbox cannot blow up the grid size"""
+    lons, lats = _sources()
+    grid = density_grid([(lons, lats, None)], (-23.55, -46.63, -23.54999, -46.62999), bandwidth_m=200, resolution=1024)
+    assert grid.shape == (1, 1)
+    with pytest.raises(ValueError):
+        density_grid([(lons, lats, None)], (-23.55, -46.63, -23.55, -46.63), bandwidth_m=200, resolution=1024)
+
+def test_density_grid_coarse_cells_average_the_exact_kde():
+    """Test the default /layers/flow bbox and resolution, where cells are wider than 2σ"""
+    bbox = (-23.7, -46.8, -23.5, -46.6)
+    rng = np.random.default_rng(2)
+    lons = -46.8 + rng.random(2000) * 0.2
+    lats = -23.7 + rng.random(2000) * 0.2
+    grid = density_grid([(lons, lats, None)], bbox, bandwidth_m=200, resolution=50)
+    assert grid.shape[0] == 50
+    # Referência: KDE exato numa subgrade 5x5 por célula, média de cada bloco
+    sub = 5
+    offsets = (np.arange(sub) + 0.5) / sub - 0.5
+    cx, cy = grid.cell_centers()
+    px = (cx[:, :, None, None] + offsets[None, None, None, :] * grid.cell_lon).repeat(sub, axis=2)
+    py = (cy[:, :, None, None] - offsets[None, None, :, None] * grid.cell_lat).repeat(sub, axis=3)
+    gdf = gpd.GeoDataFrame(geometry=gpd.points_from_xy(lons, lats), crs=4326)
+    exact = kde_values(px.ravel(), py.ravel(), [gdf], bandwidth_m=200).reshape(grid.shape + (sub * sub,)).mean(axis=2)
+    assert np.abs(grid.values - exact).max() < 0.1 * exact.max()
+    assert np.corrcoef(grid.values.ravel(), exact.ravel())[0, 1] > 0.98
@@ -0,0 +1,53 @@
+import pytest
+from fastapi import HTTPException
+from app.core import rate_limit
+
+class FakeScript:
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+    def __call__(self, keys, args):
+        self.calls.append((keys, args))
+        return self.result(keys, args) if callable(self.result) else self.result
+
+def test_overpass_usage_batched_per_request(monkeypatch):
+    """Test that all Overpass queries of a request are recorded in one call"""
+    script = FakeScript(lambda keys, args: args[:-1])
+    monkeypatch.setattr(rate_limit, "_RECORD_USAGE", script)
+    usage = rate_limit.begin_request()
+    for _ in range(3):
+        rate_limit.inc_overpass_count("user-a")
+    rate_limit.inc_overpass_count("user-b")
+    assert script.calls == []
+    rate_limit.flush_overpass_usage(usage)
+    assert len(script.calls) == 1
+    keys, args = script.calls[0]
+    assert keys[0].startswith("quota:overpass:user-a:")
+    assert args == [3, 1, 86400]
+    rate_limit.flush_overpass_usage(usage)
+    assert len(script.calls) == 1
+
+def test_enforce_quota_sets_headers_and_rejects(monkeypatch):
+    """Test rate limit headers on success and 429 with Retry-After when exhausted"""
+    monkeypatch.setattr(rate_limit, "_SLIDING_WINDOW", FakeScript([1, 41]))
+    usage = rate_limit.begin_request()
+    rate_limit.enforce_quota("user-a", limit_per_minute=60)
+    assert usage.limit["X-RateLimit-Limit"] == "60"
+    assert usage.limit["X-RateLimit-Remaining"] == "41"
+
+    monkeypatch.setattr(rate_limit, "_SLIDING_WINDOW", FakeScript([0, 0]))
+    with pytest.raises(HTTPException) as exc:
+        rate_limit.enforce_quota("user-a", limit_per_minute=60)
+    assert exc.value.status_code == 429
+    assert exc.value.headers["X-RateLimit-Remaining"] == "0"
+    assert 0 < int(exc.value.headers["Retry-After"]) <= 60
+
+def test_sliding_window_keys(monkeypatch):
+    """Test that the current and previous windows are passed to the script"""
+    script = FakeScript([1, 9])
+    monkeypatch.setattr(rate_limit, "_SLIDING_WINDOW", script)
+    monkeypatch.setattr(rate_limit.time, "time", lambda: 125.0)
+    assert rate_limit.allow_request("k", 10, 60) == (True, 9, 55)
+    keys, args = script.calls[0]
+    assert keys == ["rate:k:2", "rate:k:1"]
+    assert args == [10, 60000, 5000]
@@ -230,3 +230,63 @@ def test_compute_score_normalization():
             if feat['weight'] != 0:
                 norm_val = feat['contribution'] / feat['weight']
                 assert -1.0 <= norm_val <= 1.0
+
+def test_ring_features_in_compute_score():
+    """Test that ring features get area-scaled caps and can be weighted"""
+    from app.core.scoring_model import cap_for
+    assert cap_for("offices_r1000") == CAPS["offices"] * 4
+    assert cap_for("transit_r600_decay") == CAPS["transit"] * 4
+    assert cap_for("unknown_r100") == 1.0
+    WEIGHTS["_test_rings"] = {"offices_r1000": 0.5}
+    try:
+        score, feats, _ = compute_score("_test_rings", {"offices_r1000": CAPS["offices"] * 2})
+    finally:
+        del WEIGHTS["_test_rings"]
+    assert feats[0]["contribution"] == 0.25 and score == 62.5
+
+def test_score_matrix_matches_compute_score():
+    """Test that the weights-matrix product scores every business type like compute_score"""
+    import numpy as np
+    from app.core.scoring_model import score_matrix
+    types = list(WEIGHTS)
+    rng = np.random.default_rng(0)
+    shared = {"offices": np.array([120.0, 900.0]), "schools": np.array([3.0, 0.0]),
+              "parks": np.array([1.0, 12.0]), "transit": np.array([8.0, 55.0])}
+    per_type = {"competition": rng.integers(0, 80, (2, len(types))).astype(float),
+                "flow_kde": rng.random((2, len(types))) * 80, "mix": rng.random((2, len(types)))}
+    scores = score_matrix(types, {**shared, **per_type})
+    assert scores.shape == (2, len(types))
+    for p in range(2):
+        for t, b in enumerate(types):
+            raw = {**{k: v[p] for k, v in shared.items()}, **{k: v[p, t] for k, v in per_type.items()}}
+            assert scores[p, t] == pytest.approx(compute_score(b, raw)[0])
+
+def test_score_rows_vectorized_and_lazy_explanation(monkeypatch):
+    """Test that score_rows matches compute_score row by row without rendering explanations"""
+    import numpy as np
+    from app.core import scoring_model
+    from app.core.scoring_model import score_columns, score_rows
+    rng = np.random.default_rng(0)
+    rows = [{"competition": float(rng.integers(0, 80)), "offices": float(rng.integers(0, 400)),
+             "schools": 3.0, "parks": 1.0, "transit": float(rng.integers(0, 50)),
+             "flow_kde": float(rng.random() * 70), "mix": float(rng.random() * 1.3)} for _ in range(50)]
+    expected = [compute_score("varejo_moda", raw) for raw in rows]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("explicação não deveria ser gerada")
+    monkeypatch.setattr(scoring_model, "generate_detailed_explanation", fail)
+    batch = score_rows("varejo_moda", rows)
+    assert np.allclose(batch.scores, [e[0] for e in expected])
+    assert batch.contribution_dicts(7) == expected[7][1]
+    assert batch.names == list(WEIGHTS["varejo_moda"])
+    assert compute_score("varejo_moda", rows[0], explain=False)[2] is None
+    columns = {k: np.array([r[k] for r in rows]) for k in rows[0]}
+    assert np.allclose(score_columns("varejo_moda", columns).scores, batch.scores)
+
+def test_explanation_paragraphs_not_repeated():
+    """Test that each explanation paragraph appears once"""
+    raw = {"competition": 12, "offices": 60, "schools": 6, "parks": 3, "transit": 12, "flow_kde": 60.0, "mix": 0.8}
+    _, _, expl = compute_score("restaurante", raw)
+    paragraphs = expl.split("\n\n")
+    assert len(paragraphs) == len(set(paragraphs))
+    assert any("Concorrência" in p for p in paragraphs) and any("Escritórios" in p or "Corporativa" in p for p in paragraphs)
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from app.core.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    """Test that identical concurrent calls run the function once"""
+    sf = SingleFlight(redis_client=None)
+    calls = []
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"elements": [1, 2, 3]}
+    async def scenario():
+        return await asyncio.gather(*[sf.do("q1", work) for _ in range(5)])
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(r == {"elements": [1, 2, 3]} for r in results)
+
+def test_distinct_keys_run_separately():
+    """Test that different keys are not coalesced"""
+    sf = SingleFlight(redis_client=None)
+    calls = []
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return len(calls)
+    async def scenario():
+        return await asyncio.gather(sf.do("a", work), sf.do("b", work))
+    asyncio.run(scenario())
+    assert len(calls) == 2
+
+def test_error_is_propagated_to_followers_and_not_cached():
+    """Test that a failing leader propagates the error and the key is released"""
+    sf = SingleFlight(redis_client=None)
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream")
+    async def scenario():
+        return await asyncio.gather(sf.do("k", boom), sf.do("k", boom), return_exceptions=True)
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert sf._inflight == {}
+
+def test_leader_cancellation_does_not_cancel_followers():
+    """Test that cancelling the first caller leaves the shared execution running for the others"""
+    sf = SingleFlight(redis_client=None)
+    calls = []
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+    async def scenario():
+        leader = asyncio.ensure_future(sf.do("k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(sf.do("k", work))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        result = await follower
+        return leader.cancelled(), result
+    cancelled, result = asyncio.run(scenario())
+    assert cancelled
+    assert result == "ok"
+    assert len(calls) == 1
+
+class FakeRedis:
+    """Subconjunto de redis.Redis usado pelo single-flight (get/set NX PX/eval/pipeline)"""
+    def __init__(self):
+        self.data = {}
+    def get(self, key):
+        return self.data.get(key)
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+    def exists(self, key):
+        return int(key in self.data)
+    def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token.encode():
+            del self.data[key]
+            return 1
+        return 0
+    def pipeline(self):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, r):
+        self.r, self.ops = r, []
+    def get(self, key):
+        self.ops.append(lambda: self.r.get(key))
+    def exists(self, key):
+        self.ops.append(lambda: self.r.exists(key))
+    def execute(self):
+        return [op() for op in self.ops]
+
+def test_redis_follower_worker_reuses_leader_result():
+    """Test that a second worker waits for the Redis leader and reads its published result"""
+    r = FakeRedis()
+    workers = [SingleFlight(redis_client=r, poll_interval=0.005) for _ in range(2)]
+    calls = []
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.03)
+        return {"elements": [1]}
+    async def scenario():
+        return await asyncio.gather(*[w.do("q", work) for w in workers])
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [{"elements": [1]}, {"elements": [1]}]
+    assert "sf:lock:q" not in r.data
+    assert "sf:result:q" in r.data
+
+def test_redis_follower_runs_itself_when_leader_fails():
+    """Test that a follower worker executes the call when the Redis leader releases the lock without a result"""
+    r = FakeRedis()
+    leader, follower = SingleFlight(redis_client=r, poll_interval=0.005), SingleFlight(redis_client=r, poll_interval=0.005)
+    async def boom():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("upstream")
+    async def work():
+        return "local"
+    async def scenario():
+        return await asyncio.gather(leader.do("q", boom), follower.do("q", work), return_exceptions=True)
+    first, second = asyncio.run(scenario())
+    assert isinstance(first, RuntimeError)
+    assert second == "local"
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Point, box
+
+from app.core.features import score_feature_matrix
+from app.core.point_set import PointSet
+from app.core.points_engine import LocalMetric
+from app.core.scoring_model import compute_score
+from app.core.site_search import grid_points, search_sites, select_spaced
+
+REGION = box(-46.66, -23.58, -46.63, -23.55)
+
+
+def _layers(seed=0):
+    rng = np.random.default_rng(seed)
+
+    def cluster(n, lon, lat, spread, key=None, value=None):
+        data = {key: pd.Categorical([value] * n)} if key else {}
+        return PointSet(lon + rng.normal(0, spread, n), lat + rng.normal(0, spread, n), data=data)
+
+    # escritórios e transporte concentrados no nordeste; concorrência no sudoeste
+    poi = PointSet.concat([cluster(300, -46.636, -23.554, 0.002, "office", "company"),
+                           cluster(40, -46.65, -23.57, 0.01, "amenity", "school")])
+    transit = cluster(60, -46.636, -23.554, 0.003)
+    comp = cluster(80, -46.655, -23.575, 0.003)
+    return comp, poi, transit
+
+
+def test_grid_points_inside_polygon():
+    """Test that the coarse grid stays inside the polygon at the requested spacing"""
+    metric = LocalMetric(-23.565, -46.645)
+    pts = grid_points(REGION, metric, 200)
+    assert len(pts) > 100
+    assert all(REGION.contains(Point(x, y)) for x, y in zip(pts.lon, pts.lat))
+    xy = metric.project(pts.lon, pts.lat)
+    assert np.allclose(np.diff(np.unique(np.round(xy[:, 0], 6))), 200)
+
+
+def test_select_spaced_respects_spacing():
+    """Test greedy top-k selection with a minimum spacing"""
+    xy = np.array([[0, 0], [50, 0], [300, 0], [0, 400], [310, 10]], dtype=float)
+    scores = np.array([90, 89, 80, 70, 85])
+    assert select_spaced(xy, scores, 3, 100) == [0, 4, 3]
+    assert select_spaced(xy, scores, 10, 0) == [0, 1, 4, 2, 3]
+
+
+def test_search_sites_ranks_spaced_candidates():
+    """Test that search returns spaced, ranked candidates whose scores match compute_score at the point"""
+    comp, poi, transit = _layers()
+    result = search_sites(REGION, "restaurante", comp, poi, transit, k=5, grid_m=200, min_spacing_m=300)
+    cands = result["candidates"]
+    assert len(cands) == 5 and result["evaluated"]["refined"] > 0
+    scores = [c["score"] for c in cands]
+    assert scores == sorted(scores, reverse=True)
+    metric = LocalMetric(-23.565, -46.645)
+    xy = metric.project([c["lon"] for c in cands], [c["lat"] for c in cands])
+    d = np.hypot(*(xy[:, None, :] - xy[None]).transpose(2, 0, 1))
+    assert d[np.triu_indices(5, 1)].min() >= 300
+    assert all(REGION.contains(Point(c["lon"], c["lat"])) for c in cands)
+    # o melhor ponto fica no núcleo de escritórios/transporte, longe da concorrência
+    assert cands[0]["lon"] > -46.645 and cands[0]["lat"] > -23.565
+
+    best = cands[0]
+    feats = {k: v[0].item() for k, v in score_feature_matrix(comp, poi, transit, best["lon"], best["lat"]).items()}
+    assert best["score"] == pytest.approx(compute_score("restaurante", feats, explain=False)[0])
+    assert best["features"]["offices"] == feats["offices"]
+
+
+def test_search_sites_tiny_polygon():
+    """Test that a polygon smaller than one grid cell still yields a candidate"""
+    comp, poi, transit = _layers()
+    tiny = Point(-46.64, -23.56).buffer(0.0002)
+    cands = search_sites(tiny, "academia", comp, poi, transit, k=3, grid_m=200)["candidates"]
+    assert 1 <= len(cands) <= 3
+    assert all(tiny.contains(Point(c["lon"], c["lat"])) for c in cands)
@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+
+from app.core.features import street_connectivity
+from app.core.street_network import StreetNetwork, StreetSkeleton, build_skeleton_query, fetch_street_skeleton
+from app.core.points_engine import M_PER_DEG
+from shapely.geometry import Point
+import geopandas as gpd
+
+D = 0.001  # ~111 m
+
+
+def _grid_data():
+    """Cruz (+) com centro em (0, 0), mais uma way em L pendurada na ponta leste."""
+    nodes = {1: (0, 0), 2: (-D, 0), 3: (D, 0), 4: (0, -D), 5: (0, D), 6: (2 * D, 0), 7: (2 * D, D)}
+    elements = [{"type": "node", "id": i, "lon": x, "lat": y} for i, (x, y) in nodes.items()]
+    elements += [
+        {"type": "way", "id": 10, "nodes": [2, 1, 3]},
+        {"type": "way", "id": 11, "nodes": [4, 1, 5]},
+        {"type": "way", "id": 12, "nodes": [3, 6, 7]},
+    ]
+    return {"elements": elements}
+
+
+def test_node_degree_and_blocks():
+    """Test node degrees, intersections, dead ends and block lengths from the way skeleton"""
+    net = StreetNetwork(StreetSkeleton.from_overpass(_grid_data()))
+    degree = dict(zip(net.skeleton.node_ids.tolist(), net.degree.tolist()))
+    assert degree == {1: 4, 2: 1, 3: 2, 4: 1, 5: 1, 6: 2, 7: 1}
+    stats = net.stats(0.0, 0.0, 150)
+    assert stats["intersections"] == 1
+    assert stats["dead_ends"] == 3
+    assert stats["dead_end_ratio"] == 0.75
+    # quadras: 1-2, 1-4, 1-5 (~111 m) e 1-3-6-7 (~333 m) partindo do cruzamento
+    lengths = sorted(np.round(net.block_lengths / (D * M_PER_DEG), 2).tolist())
+    assert lengths == [1.0, 1.0, 1.0, 3.0]
+    assert abs(net.intersection_density([0.0], [0.0], 150)[0] - 1 / (np.pi * 0.15 ** 2)) < 1e-9
+
+
+def test_skeleton_tiles_roundtrip_and_concat():
+    """Test tile split, binary round trip and de-duplicating concat of skeletons"""
+    sk = StreetSkeleton.from_overpass(_grid_data())
+    tiles = {t: sk.for_tile(t, size=D * 1.5) for t in [(-1, 0), (0, 0), (1, 0), (0, -1)]}
+    assert tiles[(-1, 0)].way_ids.tolist() == [10]
+    assert tiles[(-1, 0)].node_ids.tolist() == [1, 2, 3]
+    restored = StreetSkeleton.from_bytes(tiles[(1, 0)].to_bytes())
+    assert restored.way_ids.tolist() == [12]
+    merged = StreetSkeleton.concat([tiles[(-1, 0)], restored, tiles[(0, -1)], StreetSkeleton.empty()])
+    assert sorted(merged.way_ids.tolist()) == [10, 11, 12]
+    assert merged.node_ids.tolist() == sk.node_ids.tolist()
+    assert (StreetNetwork(merged).degree == StreetNetwork(sk).degree).all()
+
+
+def test_fetch_skeleton_without_cache_and_connectivity():
+    """Test the skeleton query and that street_connectivity uses real intersections"""
+    queries = []
+
+    async def fake_fetch(q):
+        queries.append(q)
+        return _grid_data()
+
+    sk = asyncio.run(fetch_street_skeleton((-0.01, -0.01, 0.01, 0.01), fetch=fake_fetch))
+    assert "out skel qt" in queries[0] and "residential" in build_skeleton_query((0, 0, 1, 1))
+    net = StreetNetwork(sk)
+    # lâmpadas e pontos de ônibus com tag highway não contam como cruzamento
+    lamps = gpd.GeoDataFrame({"highway": ["street_lamp"] * 5}, geometry=[Point(0, 0)] * 5, crs=4326)
+    assert street_connectivity(lamps, Point(0, 0), 150, streets=net) == net.intersection_density([0], [0], 150)[0]
+    assert street_connectivity(lamps, Point(0, 0), 150) > street_connectivity(lamps, Point(0, 0), 150, streets=net)
+
+def test_street_bbox_covers_stats_radius():
+    """Test that the skeleton bbox covers the 500 m stats circle plus margin in both axes, even for small radii"""
+    from app.api.v1.endpoints.advanced_analysis import STREET_MARGIN_M, STREET_STATS_RADIUS_M, street_bbox
+    lon, lat = -46.63, -23.55
+    S, W, N, E = street_bbox(lon, lat, 200)
+    kx = M_PER_DEG * np.cos(np.radians(lat))
+    need = STREET_STATS_RADIUS_M + STREET_MARGIN_M
+    assert (lon - W) * kx >= need * 0.99 and (E - lon) * kx >= need * 0.99
+    assert (lat - S) * M_PER_DEG >= need * 0.99 and (N - lat) * M_PER_DEG >= need * 0.99
+    assert street_bbox(lon, lat, 2000)[2] - lat > N - lat
@@ -0,0 +1,43 @@
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Point
+from app.core.features import to_geodf, filter_by_tag, amenity_diversity, public_space_ratio
+from app.core.osm_columns import OSMColumns
+from app.core.tag_index import tag_columns, tag_mask, INDEXED_KEYS
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": -23.550, "lon": -46.630, "tags": {"amenity": "cafe", "name": "A"}},
+    {"type": "node", "id": 2, "lat": -23.551, "lon": -46.631, "tags": {"shop": "bakery"}},
+    {"type": "node", "id": 3, "lat": -23.552, "lon": -46.632, "tags": {"leisure": "park", "foo": "bar"}},
+    {"type": "node", "id": 4, "lat": -23.553, "lon": -46.633, "tags": {"amenity": "community_centre"}},
+    {"type": "node", "id": 5, "lat": -23.554, "lon": -46.634, "tags": {"office": ""}},
+]
+
+def test_tag_columns_are_categorical():
+    """Test that indexed keys become categorical columns instead of tag dicts"""
+    gdf = to_geodf(OSMColumns.from_elements(ELEMENTS))
+    assert "tags" not in gdf.columns
+    assert isinstance(gdf["amenity"].dtype, pd.CategoricalDtype)
+    assert gdf["amenity"].iloc[0] == "cafe" and pd.isna(gdf["amenity"].iloc[1])
+    assert "foo" not in gdf.columns and "foo" not in INDEXED_KEYS
+    assert set(tag_columns(OSMColumns.from_elements(ELEMENTS), ["shop"])) == {"shop"}
+
+def test_tag_mask_matches_dict_filtering():
+    """Test that column masks match the legacy dict-based filtering"""
+    indexed = to_geodf(OSMColumns.from_elements(ELEMENTS))
+    legacy = gpd.GeoDataFrame({"tags": [e["tags"] for e in ELEMENTS]},
+                              geometry=[Point(e["lon"], e["lat"]) for e in ELEMENTS], crs=4326)
+    for key, values in [("amenity", None), ("amenity", ["cafe"]), ("office", None), ("shop", "bakery"), ("lit", None)]:
+        assert tag_mask(indexed, key, values).tolist() == tag_mask(legacy, key, values).tolist()
+        assert len(filter_by_tag(indexed, key, values)) == len(filter_by_tag(legacy, key, values))
+    point = Point(-46.632, -23.552)
+    assert amenity_diversity(indexed, point, 1000) == amenity_diversity(legacy, point, 1000)
+    assert public_space_ratio(indexed, point, 1000) == public_space_ratio(legacy, point, 1000) == 0.2
+
+def test_to_geodf_concat_keeps_tag_columns():
+    """Test that frames with different categories can still be combined and filtered"""
+    a = to_geodf(OSMColumns.from_elements(ELEMENTS[:2]))
+    b = to_geodf(OSMColumns.from_elements(ELEMENTS[2:]))
+    both = gpd.GeoDataFrame(pd.concat([a, b], ignore_index=True))
+    assert len(filter_by_tag(both, "amenity")) == 2
+    assert len(filter_by_tag(both, "leisure", ["park"])) == 1
@@ -0,0 +1,132 @@
+import asyncio
+from app.core.tile_cache import (
+    tiles_for_bbox, tile_bbox, tiles_envelope, tile_key, tags_signature,
+    bucket_columns, clip_columns, fetch_tiled, fetch_tiled_many
+)
+from app.core.osm_columns import OSMColumns
+
+def test_tiles_for_bbox_grid_aligned():
+    """Test that a bbox is covered by grid-aligned tiles"""
+    bbox = (-23.555, -46.637, -23.545, -46.628)  # S, W, N, E
+    tiles = tiles_for_bbox(bbox, size=0.01)
+    assert len(tiles) == 4
+    for t in tiles:
+        S, W, N, E = tile_bbox(t, size=0.01)
+        assert abs((N - S) - 0.01) < 1e-9
+        assert abs((E - W) - 0.01) < 1e-9
+
+def test_tiles_envelope_covers_tiles():
+    """Test envelope of a set of tiles"""
+    env = tiles_envelope([(-4664, -2356), (-4663, -2355)], size=0.01)
+    assert env == tile_bbox((-4664, -2356), 0.01)[:2] + tile_bbox((-4663, -2355), 0.01)[2:]
+
+def test_tags_signature_order_independent():
+    """Test that tag signature does not depend on tag order"""
+    a = [('amenity', 'cafe'), ('shop', None)]
+    b = [('shop', None), ('amenity', 'cafe')]
+    assert tags_signature(a) == tags_signature(b)
+    assert tags_signature(a) != tags_signature([('amenity', 'cafe')])
+    assert tile_key(tags_signature(a), (1, 2), 0.01) == f"ovp:{tags_signature(a)}:0.01:1:2"
+
+def test_bucket_and_clip_columns():
+    """Test routing elements to tiles and clipping to the requested bbox"""
+    cols = OSMColumns.from_elements([
+        {"type": "node", "id": 1, "lat": 0.005, "lon": 0.005},
+        {"type": "way", "id": 2, "center": {"lat": 0.015, "lon": 0.005}},
+        {"type": "node", "id": 3, "lat": 0.5, "lon": 0.5},
+        {"type": "relation", "id": 4},  # sem coordenadas
+    ])
+    assert len(cols) == 3
+    buckets = bucket_columns(cols, [(0, 0), (0, 1)], size=0.01)
+    assert buckets[(0, 0)].ids.tolist() == [1]
+    assert buckets[(0, 1)].ids.tolist() == [2]
+
+    doubled = OSMColumns.concat([cols, cols.take([0])])
+    assert clip_columns(doubled, (0.0, 0.0, 0.01, 0.01)).ids.tolist() == [1]
+
+def test_fetch_tiled_without_db_clips_result():
+    """Test that fetch_tiled falls back to a direct fetch without a DB session"""
+    queries = []
+    async def fake_fetch(q):
+        queries.append(q)
+        return OSMColumns.from_elements([
+            {"type": "node", "id": 1, "lat": -23.55, "lon": -46.63},
+            {"type": "node", "id": 2, "lat": -23.40, "lon": -46.63},
+        ])
+    data = asyncio.run(fetch_tiled((-23.56, -46.64, -23.54, -46.62), [('shop', None)], db=None, fetch=fake_fetch))
+    assert len(queries) == 1
+    assert data.ids.tolist() == [1]
+
+def test_fetch_tiled_many_single_round_trip():
+    """Test that several tag sets are fetched with one multi-set query"""
+    queries = []
+    async def fake_fetch(q):
+        queries.append(q)
+        return OSMColumns.from_elements([
+            {"type": "sitescore_set", "id": 1, "tags": {"name": "competition"}},
+            {"type": "node", "id": 10, "lat": -23.55, "lon": -46.63, "tags": {"amenity": "cafe"}},
+            {"type": "sitescore_set", "id": 2, "tags": {"name": "transit"}},
+            {"type": "node", "id": 20, "lat": -23.551, "lon": -46.631, "tags": {"highway": "bus_stop"}},
+        ])
+    sets = {"competition": [('amenity', 'cafe')], "transit": [('highway', 'bus_stop')]}
+    data = asyncio.run(fetch_tiled_many((-23.56, -46.64, -23.54, -46.62), sets, db=None, fetch=fake_fetch))
+    assert len(queries) == 1
+    assert "->.competition;" in queries[0] and "->.transit;" in queries[0]
+    assert data["competition"].ids.tolist() == [10]
+    assert data["transit"].ids.tolist() == [20]
+    assert data["transit"].tags_at(0) == {"highway": "bus_stop"}
+
+def test_business_types_of_tag_sets():
+    """Test recognizing business types from competition tag sets for demand tracking"""
+    from app.core.overpass_client import BUSINESS_TAGS, TRANSIT_TAGS
+    from app.core.tile_cache import business_types_of
+    sets = {"competition": list(reversed(BUSINESS_TAGS["farmacia"])), "transit": TRANSIT_TAGS}
+    assert business_types_of(sets) == ["farmacia"]
+    assert business_types_of({"transit": TRANSIT_TAGS}) == []
+
+def _spy_store(monkeypatch):
+    import app.core.tile_cache as tile_cache
+    stored = []
+    monkeypatch.setattr(tile_cache, "_load_tiles", lambda db, keys: {})
+    monkeypatch.setattr(tile_cache, "_store_tiles", lambda db, entries, ttl: stored.append(entries))
+    monkeypatch.setattr(tile_cache, "record_demand", lambda *a, **kw: None)
+    return stored
+
+def test_failed_fetch_stores_no_tiles(monkeypatch):
+    """Test that a fetch error (e.g. a runtime-error remark) leaves no tile row behind"""
+    import pytest
+    from app.core.overpass_client import OverpassServerError
+    stored = _spy_store(monkeypatch)
+    async def failing_fetch(q):
+        raise OverpassServerError("Resultado Overpass incompleto: runtime error: Query timed out")
+    sets = {"competition": [('amenity', 'cafe')], "transit": [('highway', 'bus_stop')]}
+    with pytest.raises(OverpassServerError):
+        asyncio.run(fetch_tiled_many((-23.56, -46.64, -23.54, -46.62), sets, db=object(), fetch=failing_fetch))
+    assert stored == []
+
+def test_truncated_multi_set_response_stores_no_tiles(monkeypatch):
+    """Test that a multi-set response missing a set marker is treated as partial and not cached"""
+    import pytest
+    from app.core.overpass_client import OverpassServerError
+    stored = _spy_store(monkeypatch)
+    async def truncated_fetch(q):
+        return OSMColumns.from_elements([
+            {"type": "sitescore_set", "id": 1, "tags": {"name": "competition"}},
+            {"type": "node", "id": 10, "lat": -23.55, "lon": -46.63, "tags": {"amenity": "cafe"}},
+        ])
+    sets = {"competition": [('amenity', 'cafe')], "transit": [('highway', 'bus_stop')]}
+    with pytest.raises(OverpassServerError):
+        asyncio.run(fetch_tiled_many((-23.56, -46.64, -23.54, -46.62), sets, db=object(), fetch=truncated_fetch))
+    assert stored == []
+
+def test_complete_fetch_is_stored(monkeypatch):
+    """Test that a complete multi-set response is stored for every requested tile and set"""
+    stored = _spy_store(monkeypatch)
+    async def fetch(q):
+        return OSMColumns.from_elements([
+            {"type": "sitescore_set", "id": 1, "tags": {"name": "competition"}},
+            {"type": "sitescore_set", "id": 2, "tags": {"name": "transit"}},
+        ])
+    sets = {"competition": [('amenity', 'cafe')], "transit": [('highway', 'bus_stop')]}
+    asyncio.run(fetch_tiled_many((-23.555, -46.635, -23.545, -46.625), sets, db=object(), fetch=fetch))
+    assert len(stored) == 1 and len(stored[0]) == 2 * 4